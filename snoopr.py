@@ -21,22 +21,35 @@ import asyncio
 import base64
 import csv
 import hashlib
+import heapq
 import hmac
 import html
+import importlib.util
 import json
 import logging
+import mmap
+import multiprocessing
 import os
 import re
+import shutil
 import socket
 import sqlite3
 import struct
+import sys
+import tempfile
 import threading
 import time
+import zipfile
+import zlib
+from array import array
+from bisect import bisect_left
 from collections import OrderedDict, defaultdict, deque
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from math import atan2, cos, degrees, exp, radians, sin, sqrt
+from itertools import islice
+from math import atan2, cos, degrees, exp, isfinite, radians, sin, sqrt
 from threading import Lock
+from urllib.parse import quote, urlsplit
 
 import requests
 
@@ -44,7 +57,7 @@ import requests
 import pwnagotchi
 import pwnagotchi.plugins as plugins
 import pwnagotchi.ui.fonts as fonts
-from flask import Response, abort, jsonify, render_template_string, stream_with_context
+from flask import Response, abort, render_template_string, stream_with_context
 from pwnagotchi.ui.components import LabeledValue
 from pwnagotchi.ui.view import BLACK
 
@@ -68,10 +81,27 @@ try:
 except ImportError:
     HAS_SCIPY = False
 
-SCHEMA_VERSION = 7
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+SCHEMA_VERSION = 13
 EARTH_R = 6371000.0
 METERS_PER_MILE = 1609.344
 MPS_TO_MPH = 2.236936
+# Web-Mercator ground resolution at zoom 0 on the equator (metres per 256px-tile pixel).
+METERS_PER_PIXEL_Z0 = 156543.03392
+# SQL twin of valid_coords() for pre-v11 detections partitions, which store coordinates
+# as text; the detections view applies it so readers only ever see REAL or NULL.
+VALID_FIX_SQL = ("TRIM(latitude) NOT IN ('-', '') AND TRIM(longitude) NOT IN ('-', '') "
+                 "AND TRIM(latitude) NOT GLOB '*[^0-9.eE+-]*' "
+                 "AND TRIM(longitude) NOT GLOB '*[^0-9.eE+-]*' "
+                 "AND CAST(latitude AS REAL) BETWEEN -90 AND 90 "
+                 "AND CAST(longitude AS REAL) BETWEEN -180 AND 180 "
+                 "AND (ABS(CAST(latitude AS REAL)) >= 1e-6 "
+                 "OR ABS(CAST(longitude AS REAL)) >= 1e-6)")
 LOG = logging.getLogger(__name__)
 
 
@@ -124,6 +154,11 @@ def cutoff_ts(days):
     return fmt_ts(utcnow() - timedelta(days=days))
 
 
+def cutoff_epoch(days):
+    """cutoff_ts() for detections.timestamp, which holds epoch seconds since schema 11."""
+    return int(time.time() - days * 86400)
+
+
 # ---------------------------------------------------------------------
 # Geometry helpers
 # ---------------------------------------------------------------------
@@ -176,18 +211,86 @@ def convex_hull(points):
     return lower[:-1] + upper[:-1]
 
 
+def hull_diameter_pair(hull):
+    """Rotating calipers: indices of the farthest pair of an ordered convex polygon in
+    O(h). Orientation does not matter; only the magnitude of the triangle areas is used."""
+    n = len(hull)
+    if n < 3:
+        return (0, n - 1)
+
+    def dist2(a, b):
+        return (a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2
+
+    best, pair = -1.0, (0, 1)
+    j = 1
+    for i in range(n):
+        ni = (i + 1) % n
+        while (abs(cross(hull[i], hull[ni], hull[(j + 1) % n]))
+               > abs(cross(hull[i], hull[ni], hull[j]))):
+            j = (j + 1) % n
+        for a in (i, ni):
+            d = dist2(hull[a], hull[j])
+            if d > best:
+                best, pair = d, (a, j)
+    return pair
+
+
 def polygon_diameter(points):
-    """Max pairwise distance (metres) over the convex hull of (lat, lon) points."""
+    """Max pairwise distance (metres) over the convex hull of (lat, lon) points.
+
+    The equirectangular projection is affine, so the (lat, lon) hull is also the hull on
+    the metre plane; the farthest pair is found there with rotating calipers and only
+    that pair is measured with haversine. The 6.x version compared all hull pairs."""
     hull = convex_hull(points) or list(points)
     if len(hull) < 2:
         return 0.0
-    best = 0.0
-    for i in range(len(hull)):
-        for j in range(i + 1, len(hull)):
-            d = haversine(hull[i][0], hull[i][1], hull[j][0], hull[j][1])
-            if d > best:
-                best = d
-    return best
+    lat0, lon0 = hull[0]
+    plane = [project(lat, lon, lat0, lon0) for lat, lon in hull]
+    i, j = hull_diameter_pair(plane)
+    return haversine(hull[i][0], hull[i][1], hull[j][0], hull[j][1])
+
+
+def zoom_tolerance(zoom, pixels):
+    """Ground distance (metres) of `pixels` screen pixels at a Leaflet zoom level. Taken at
+    the equator, so it errs towards keeping points everywhere else."""
+    return pixels * METERS_PER_PIXEL_Z0 / (2 ** zoom)
+
+
+def simplify_path(path, tolerance):
+    """Douglas-Peucker on the local metre plane: drop every trail point that lies within
+    `tolerance` metres of the line its kept neighbours draw. `path` is a list of dicts
+    with latitude/longitude; the kept dicts are returned as-is, endpoints always kept.
+    Iterative, so a long straight trail cannot hit the recursion limit."""
+    n = len(path)
+    if n < 3 or tolerance <= 0:
+        return path
+    lat0, lon0 = path[0]['latitude'], path[0]['longitude']
+    plane = [project(p['latitude'], p['longitude'], lat0, lon0) for p in path]
+    keep = [False] * n
+    keep[0] = keep[-1] = True
+    limit = tolerance * tolerance
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        ax, ay = plane[first]
+        dx, dy = plane[last][0] - ax, plane[last][1] - ay
+        seg = dx * dx + dy * dy
+        worst, index = limit, None
+        for i in range(first + 1, last):
+            px, py = plane[i][0] - ax, plane[i][1] - ay
+            if seg > 0.0:
+                t = (px * dx + py * dy) / seg
+                t = 0.0 if t < 0.0 else 1.0 if t > 1.0 else t
+                px -= t * dx
+                py -= t * dy
+            dist = px * px + py * py
+            if dist > worst:
+                worst, index = dist, i
+        if index is not None:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    return [p for p, kept in zip(path, keep) if kept]
 
 
 def point_in_polygon(lat, lon, polygon):
@@ -257,44 +360,177 @@ class LRUDict(OrderedDict):
         return default
 
 
-class KalmanFilter:
-    """Simple scalar Kalman filter for RSSI smoothing."""
-
-    def __init__(self, process_noise=0.008, measurement_noise=1.0,
-                 initial_estimate=None, initial_certainty=1.0):
-        self.mu = initial_estimate if initial_estimate is not None else -70.0
-        self.sigma = initial_certainty
-        self.R = process_noise
-        self.Q = measurement_noise
-        self.mu_bar = self.mu
-        self.sigma_bar = self.sigma
-        self.initialized = initial_estimate is not None
-        self.last_used = time.time()
-
-    def initialize(self, measurement):
-        self.mu = float(measurement)
-        self.sigma = 1.0
-        self.initialized = True
-
-    def predict(self):
-        self.mu_bar = self.mu
-        self.sigma_bar = self.sigma + self.R
-
-    def update(self, measurement):
-        K = self.sigma_bar / (self.sigma_bar + self.Q)
-        self.mu = self.mu_bar + K * (float(measurement) - self.mu_bar)
-        self.sigma = self.sigma_bar - K * self.sigma_bar
-
-    def filter(self, measurement):
-        self.last_used = time.time()
-        if measurement is None:
-            return self.mu
-        if not self.initialized:
-            self.initialize(measurement)
-            return self.mu
-        self.predict()
-        self.update(measurement)
-        return self.mu
+class ProfileCache:
+    """Per-device fields derived from what never changes between sweeps: the MAC and
+    what the device advertises (vendor, randomised bit, rogue heuristic, BLE
+    classification). bettercap hands back its whole AP list and bleak every
+    advertisement on each sweep, so recomputing them made sweep CPU follow the number
+    of visible devices instead of new ones.
+
+    Entries are keyed by (kind, normalised MAC) and carry the inputs they were derived
+    from; different inputs (an SSID change, new manufacturer data) count as a miss and
+    replace the entry."""
+
+    def __init__(self, maxsize=8192):
+        self.entries = LRUDict(maxsize=maxsize)
+        self.hits = 0
+        self.misses = 0
+        # Used from bettercap callbacks and the BLE loop thread.
+        self.lock = Lock()
+
+    def get(self, key, inputs, build):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == inputs:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        profile = build()
+        with self.lock:
+            self.entries[key] = (inputs, profile)
+        return profile
+
+    def clear(self):
+        """After a vendor database (re)load, whose answers the entries embed."""
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            hits, misses, size = self.hits, self.misses, len(self.entries)
+        total = hits + misses
+        return {'hits': hits, 'misses': misses, 'size': size,
+                'maxsize': self.entries.maxsize,
+                'hit_rate': round(hits / total, 3) if total else None}
+
+
+# Scalar Kalman RSSI smoothing. (The historic names: "process" noise is added to the
+# variance each step, "measurement" noise sets the gain.)
+KALMAN_PROCESS_NOISE = 0.008
+KALMAN_MEASUREMENT_NOISE = 1.0
+KALMAN_INITIAL = -70.0
+# Runs at least this long take the numpy path in kalman_run; below it the setup
+# costs more than the loop it replaces.
+KALMAN_VECTOR_MIN = 1024
+KALMAN_BLOCK = 1024
+
+
+def kalman_run(measurements, state=None):
+    """Filter a chronological run of RSSI measurements. `state` is the [mu, sigma] the
+    previous run ended on (None starts from the first measurement); returns the
+    filtered values and the state to resume from.
+
+    The gain does not depend on the measurements and reaches a fixed point within a
+    couple of hundred steps, after which the estimate is an exponential moving average.
+    Long runs -- a device's first backfill -- compute that tail with numpy as blocked
+    cumulative sums (the block keeps the powers of 1 - gain far from underflow)."""
+    filtered = []
+    if not measurements:
+        return filtered, state
+    if state:
+        mu, sigma = state
+        i = 0
+    else:
+        mu, sigma = float(measurements[0]), 1.0
+        filtered.append(mu)
+        i = 1
+    count = len(measurements)
+    vector = HAS_NUMPY and count - i >= KALMAN_VECTOR_MIN
+    gain = None
+    while i < count:
+        sigma_bar = sigma + KALMAN_PROCESS_NOISE
+        gain = sigma_bar / (sigma_bar + KALMAN_MEASUREMENT_NOISE)
+        mu = mu + gain * (measurements[i] - mu)
+        settled = sigma_bar - gain * sigma_bar == sigma
+        sigma = sigma_bar - gain * sigma_bar
+        filtered.append(mu)
+        i += 1
+        if vector and settled:
+            break
+    if i < count:
+        keep = 1.0 - gain
+        rest = np.asarray(measurements[i:], dtype=float)
+        for lo in range(0, len(rest), KALMAN_BLOCK):
+            block = rest[lo:lo + KALMAN_BLOCK]
+            powers = keep ** np.arange(1, len(block) + 1)
+            run = powers * (mu + np.cumsum(gain * block / powers))
+            filtered.extend(run.tolist())
+            mu = float(run[-1])
+    return filtered, [mu, sigma]
+
+
+class KalmanBank:
+    """Live RSSI filters for the scan loops: one slot per active device in flat arrays,
+    instead of a filter object (and its __dict__) per MAC ever heard. Slots are
+    kept in least-recently-used order; past `capacity` devices the oldest slot is
+    recycled, and evict_idle frees the slots of devices not heard from since a cutoff.
+    The BLE loop and the bettercap callback run on different threads, hence the lock."""
+
+    __slots__ = ('capacity', '_mu', '_sigma', '_used', '_slots', '_free', '_lock')
+
+    def __init__(self, capacity=8192):
+        self.capacity = max(1, int(capacity))
+        self._mu = array('d')
+        self._sigma = array('d')
+        self._used = array('d')
+        self._slots = OrderedDict()  # key -> slot, least recently used first
+        self._free = []
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._slots)
+
+    def filter(self, key, measurement):
+        """Feed one measurement for `key` and return its estimate; the same recursion
+        as kalman_run. None returns the current estimate."""
+        now = time.time()
+        with self._lock:
+            slot = self._slots.get(key)
+            if slot is not None:
+                self._slots.move_to_end(key)
+                self._used[slot] = now
+            if measurement is None:
+                return self._mu[slot] if slot is not None else KALMAN_INITIAL
+            if slot is None:
+                slot = self._allocate(key, now)
+                self._mu[slot] = float(measurement)
+                self._sigma[slot] = 1.0
+                return self._mu[slot]
+            sigma_bar = self._sigma[slot] + KALMAN_PROCESS_NOISE
+            gain = sigma_bar / (sigma_bar + KALMAN_MEASUREMENT_NOISE)
+            mu = self._mu[slot]
+            self._mu[slot] = mu + gain * (measurement - mu)
+            self._sigma[slot] = sigma_bar - gain * sigma_bar
+            return self._mu[slot]
+
+    def _allocate(self, key, now):
+        """Caller holds _lock."""
+        if len(self._slots) >= self.capacity:
+            _, slot = self._slots.popitem(last=False)
+        elif self._free:
+            slot = self._free.pop()
+        else:
+            slot = len(self._mu)
+            self._mu.append(0.0)
+            self._sigma.append(0.0)
+            self._used.append(0.0)
+        self._slots[key] = slot
+        self._used[slot] = now
+        return slot
+
+    def evict_idle(self, cutoff):
+        """Free the slots of devices last filtered before `cutoff`; returns how many.
+        LRU order is last-use order, so this stops at the first recent device."""
+        evicted = 0
+        with self._lock:
+            while self._slots:
+                key, slot = next(iter(self._slots.items()))
+                if self._used[slot] >= cutoff:
+                    break
+                del self._slots[key]
+                self._free.append(slot)
+                evicted += 1
+        return evicted
 
 
 def xml_escape(text):
@@ -390,20 +626,77 @@ class Database:
     """SQLite wrapper. Every public method takes the lock for its own operation only;
     callers must never hold db_lock across long computations."""
 
-    def __init__(self, path):
+    # Counters kept in network_counts by triggers on networks; {r} is NEW/OLD/n.
+    # high_persistence compares against the threshold stored in meta.
+    COUNTERS = (
+        ('total', '1'),
+        ('wifi', "{r}.device_type = 'wifi'"),
+        ('bluetooth', "{r}.device_type = 'bluetooth'"),
+        ('aircraft', "{r}.device_type = 'aircraft'"),
+        ('snoopers', '{r}.is_snooper = 1'),
+        ('high_persistence', "{r}.persistence_score >= "
+                             "(SELECT CAST(value AS REAL) FROM meta WHERE key = 'count_threshold')"),
+        ('anomalous_aircraft', "{r}.device_type = 'aircraft' AND {r}.anomalies NOT IN ('', 'None')"),
+        ('clients', "{r}.type = 'wi-fi client'"),
+        ('anomalies', "{r}.anomalies NOT IN ('', 'None')"),
+        ('randomized', '{r}.is_randomized = 1'),
+    )
+    COUNTER_COLUMNS = ('device_type', 'type', 'is_snooper', 'persistence_score', 'anomalies',
+                       'is_randomized')
+    # Column order of the detections view; pre-v10 tables grew some of these by ALTER,
+    # so every partition is selected through this list rather than with *.
+    DETECTION_COLUMNS = ('id', 'session_id', 'network_id', 'encryption', 'signal_strength',
+                         'latitude', 'longitude', 'altitude', 'channel', 'auth_mode',
+                         'timestamp', 'filtered_signal_strength')
+    LEGACY_DETECTION_COLUMNS = {
+        'latitude': 'CASE WHEN %s THEN CAST(latitude AS REAL) END AS latitude' % VALID_FIX_SQL,
+        'longitude': 'CASE WHEN %s THEN CAST(longitude AS REAL) END AS longitude' % VALID_FIX_SQL,
+        'altitude': "CASE WHEN TRIM(altitude) NOT IN ('-', '') "
+                    "AND TRIM(altitude) NOT GLOB '*[^0-9.eE+-]*' "
+                    "THEN CAST(altitude AS REAL) END AS altitude",
+        'timestamp': "CAST(strftime('%s', timestamp) AS INTEGER) AS timestamp",
+    }
+    # Freed pages handed back to the filesystem per db_lock hold.
+    VACUUM_STEP_PAGES = 1024
+
+    def __init__(self, path, id_cache_size=8192, persistence_threshold=0.85,
+                 partition_days=7):
         self._path = path
+        self.partition_days = max(1, int(partition_days))
+        # [(first_id, name, ends, typed)] oldest first, mirroring detection_partitions.
+        self._partitions = []
+        self.count_threshold = float(persistence_threshold)
         self._connection = None
         self.db_lock = threading.RLock()
+        self.write_stats = {'batches': 0, 'rows': 0, 'seconds': 0.0, 'last_rows': 0,
+                            'last_ms': None, 'last_rows_per_s': None}
+        # (mac, device_type) -> networks.id for the write path. Ids never change once
+        # assigned; only prune_old_data deletes networks, and it clears the cache.
+        self.id_cache = LRUDict(maxsize=id_cache_size)
+        self.id_cache_hits = 0
+        self.id_cache_misses = 0
+        # (network_id, tolerance, path_limit) -> (hits, simplified trail or None). A
+        # network's hit count moves with every detection written or pruned, so it tells
+        # a stale trail apart without touching detections.
+        self.path_cache = LRUDict(maxsize=2048)
+        # Bumped (under db_lock) by every committed write that can change what the
+        # dashboard shows, so readers can tell "nothing new" without a query.
+        self.data_version = 0
+        self.has_fts = False
         self._connect()
 
     # -- setup ---------------------------------------------------------
     def _connect(self):
         try:
             self._connection = sqlite3.connect(self._path, check_same_thread=False, timeout=30)
+            # Only takes effect on a new file, so it has to precede the WAL switch;
+            # older databases are converted once by reclaim_space().
+            self._connection.execute('PRAGMA auto_vacuum=INCREMENTAL')
             self._connection.execute('PRAGMA journal_mode=WAL')
             self._connection.execute('PRAGMA synchronous=NORMAL')
             self._connection.execute('PRAGMA busy_timeout=30000')
             self._connection.execute('PRAGMA foreign_keys=ON')
+            self._connection.execute('PRAGMA temp_store=MEMORY')
             self._create_tables()
         except sqlite3.Error as exc:
             LOG.error('[SnoopR] DB connection failed: %s', exc)
@@ -449,23 +742,29 @@ class Database:
                     last_seen TEXT,
                     UNIQUE(mac, device_type)
                 )''')
+            # detections is a view over time partitions (see _ensure_partition), so
+            # pruning drops whole tables instead of deleting rows one index entry at a
+            # time. first_id is one below the partition's lowest id: ids keep growing
+            # across partitions, which lets id lookups go straight to one table.
             self._connection.execute('''
-                CREATE TABLE IF NOT EXISTS detections (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    session_id INTEGER NOT NULL,
-                    network_id INTEGER NOT NULL,
-                    encryption TEXT,
-                    signal_strength INTEGER,
-                    latitude TEXT,
-                    longitude TEXT,
-                    altitude TEXT DEFAULT '-',
-                    channel INTEGER,
-                    auth_mode TEXT,
-                    timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
-                    filtered_signal_strength REAL,
-                    FOREIGN KEY(session_id) REFERENCES sessions(id),
-                    FOREIGN KEY(network_id) REFERENCES networks(id)
+                CREATE TABLE IF NOT EXISTS detection_partitions (
+                    name TEXT PRIMARY KEY,
+                    first_id INTEGER NOT NULL,
+                    starts REAL NOT NULL,
+                    ends REAL NOT NULL,
+                    typed INTEGER NOT NULL DEFAULT 0
                 )''')
+            # Reference counts: detections per (partition, network, session), maintained
+            # by add_detection_batch. Dropping a partition subtracts its rows here and
+            # whatever network or session is left unreferenced is garbage.
+            self._connection.execute('''
+                CREATE TABLE IF NOT EXISTS detection_refs (
+                    part TEXT NOT NULL,
+                    network_id INTEGER NOT NULL,
+                    session_id INTEGER NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (part, network_id, session_id)
+                ) WITHOUT ROWID''')
             self._connection.execute('''
                 CREATE TABLE IF NOT EXISTS aircraft_info (
                     icao24 TEXT PRIMARY KEY,
@@ -475,16 +774,186 @@ class Database:
                     status TEXT DEFAULT 'ok',
                     last_updated TEXT
                 )''')
+            # WiGLE answers per SSID, written by WigleWorker: a position ('ok') or
+            # 'notfound', each valid until `expires` (epoch seconds).
+            self._connection.execute('''
+                CREATE TABLE IF NOT EXISTS wigle_cache (
+                    ssid TEXT PRIMARY KEY,
+                    latitude REAL,
+                    longitude REAL,
+                    status TEXT NOT NULL,
+                    expires REAL NOT NULL
+                )''')
+            # Devices with detections the analyzer has not folded in yet. Keyed by
+            # network id; detection_id is the newest row that made it dirty, so a pass
+            # only clears the entry if nothing newer arrived while it was running.
+            self._connection.execute('''
+                CREATE TABLE IF NOT EXISTS dirty_devices (
+                    network_id INTEGER PRIMARY KEY,
+                    detection_id INTEGER NOT NULL DEFAULT 0
+                )''')
+            self._connection.execute('''
+                CREATE TABLE IF NOT EXISTS device_state (
+                    network_id INTEGER PRIMARY KEY,
+                    last_detection_id INTEGER NOT NULL DEFAULT 0,
+                    state TEXT,
+                    updated_at TEXT,
+                    started_at REAL
+                )''')
+            self._connection.execute('''
+                CREATE TABLE IF NOT EXISTS network_counts (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL DEFAULT 0
+                )''')
+            # Per-network detection aggregates, kept current by add_detection_batch so
+            # the dashboard never has to GROUP BY the whole detections table.
+            self._connection.execute('''
+                CREATE TABLE IF NOT EXISTS network_summary (
+                    network_id INTEGER PRIMARY KEY,
+                    first_ts TEXT,
+                    last_ts TEXT,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    sessions_count INTEGER NOT NULL DEFAULT 0,
+                    last_session_id INTEGER,
+                    last_lat REAL,
+                    last_lon REAL,
+                    last_rssi INTEGER
+                )''')
             for stmt in (
-                'CREATE INDEX IF NOT EXISTS idx_det_net_ts ON detections(network_id, timestamp)',
-                'CREATE INDEX IF NOT EXISTS idx_det_ts ON detections(timestamp)',
-                'CREATE INDEX IF NOT EXISTS idx_det_session ON detections(session_id)',
+                'CREATE INDEX IF NOT EXISTS idx_refs_net ON detection_refs(network_id)',
+                'CREATE INDEX IF NOT EXISTS idx_refs_session ON detection_refs(session_id)',
                 'CREATE INDEX IF NOT EXISTS idx_net_mac ON networks(mac)',
                 'CREATE INDEX IF NOT EXISTS idx_net_last_seen ON networks(last_seen)',
                 'CREATE INDEX IF NOT EXISTS idx_net_dtype ON networks(device_type)',
+                # Persistence windows slide with the clock, so a device that hit any
+                # window last pass must be rescored even without new detections.
+                'CREATE INDEX IF NOT EXISTS idx_net_windows ON networks(windows_hit) '
+                'WHERE windows_hit > 0',
+                # Keyset pages walk these in order (see SORT_KEYS); device_type and
+                # mac are served by the indexes above.
+                'CREATE INDEX IF NOT EXISTS idx_net_sort_snooper '
+                'ON networks(COALESCE(is_snooper, 0))',
+                'CREATE INDEX IF NOT EXISTS idx_net_sort_persistence '
+                'ON networks(COALESCE(persistence_score, 0.0))',
+                'CREATE INDEX IF NOT EXISTS idx_net_sort_velocity '
+                'ON networks(COALESCE(max_velocity, -1.0))',
+                "CREATE INDEX IF NOT EXISTS idx_net_sort_name ON networks(COALESCE(name, ''))",
+                "CREATE INDEX IF NOT EXISTS idx_net_sort_last_seen "
+                "ON networks(COALESCE(last_seen, ''))",
+                'CREATE INDEX IF NOT EXISTS idx_net_sort_rssi ON networks(COALESCE(best_rssi, -999))',
             ):
                 self._connection.execute(stmt)
+            self._create_count_triggers()
+            self._create_search_index()
+            # Staging area for add_detection_batch; lives only on this connection.
+            self._connection.execute('''
+                CREATE TEMP TABLE IF NOT EXISTS batch_networks (
+                    mac TEXT, type TEXT, name TEXT, device_type TEXT, vendor TEXT,
+                    classification TEXT, is_rogue INTEGER, is_mesh INTEGER,
+                    is_randomized INTEGER, vulnerabilities TEXT, anomalies TEXT,
+                    best_rssi INTEGER, network_id INTEGER
+                )''')
+            self._connection.execute(
+                'CREATE TEMP TABLE IF NOT EXISTS prune_networks (id INTEGER PRIMARY KEY)')
+            self._connection.execute(
+                'CREATE TEMP TABLE IF NOT EXISTS prune_sessions (id INTEGER PRIMARY KEY)')
         self._migrate()
+        self.set_count_threshold(self.count_threshold)
+
+    def _counter_delta(self, add_new, sub_old):
+        """CASE expression adding each counter's predicate for NEW and/or subtracting OLD."""
+        parts = []
+        for name, pred in self.COUNTERS:
+            expr = ''
+            if add_new:
+                expr += ' + (CASE WHEN %s THEN 1 ELSE 0 END)' % pred.format(r='NEW')
+            if sub_old:
+                expr += ' - (CASE WHEN %s THEN 1 ELSE 0 END)' % pred.format(r='OLD')
+            parts.append("WHEN '%s' THEN 0%s" % (name, expr))
+        return 'value + CASE name %s ELSE 0 END' % ' '.join(parts)
+
+    def _create_count_triggers(self):
+        """(Re)create the triggers so they always match COUNTERS in this version. Every
+        writer -- batch upserts, analysis updates, prune -- keeps the counters exact
+        inside its own transaction."""
+        watched = ' OR '.join('OLD.%s IS NOT NEW.%s' % (c, c) for c in self.COUNTER_COLUMNS)
+        for name, event, when, delta in (
+            ('trg_net_counts_ins', 'INSERT', '', self._counter_delta(True, False)),
+            ('trg_net_counts_del', 'DELETE', '', self._counter_delta(False, True)),
+            ('trg_net_counts_upd', 'UPDATE', ' WHEN ' + watched,
+             self._counter_delta(True, True)),
+        ):
+            self._connection.execute('DROP TRIGGER IF EXISTS %s' % name)
+            self._connection.execute(
+                'CREATE TRIGGER %s AFTER %s ON networks FOR EACH ROW%s BEGIN '
+                'UPDATE network_counts SET value = %s; END' % (name, event, when, delta))
+
+    FTS_COLUMNS = ('mac', 'name', 'vendor', 'anomalies')
+    FTS_TRIGGERS = ('trg_net_fts_ins', 'trg_net_fts_del', 'trg_net_fts_upd')
+
+    def _create_search_index(self):
+        """Trigram FTS5 index over the searched networks columns, so a substring search
+        is an index lookup instead of four LIKE scans. It is an external-content table
+        kept in sync by triggers and rebuilt from networks whenever they are missing:
+        on a new or upgraded database, or after a run on an SQLite without FTS5, which
+        drops them so that writes to networks keep working."""
+        cur = self._connection
+        try:
+            cur.execute("CREATE VIRTUAL TABLE temp.fts_probe USING fts5(x, tokenize='trigram')")
+            cur.execute('DROP TABLE temp.fts_probe')
+        except sqlite3.OperationalError:
+            self.has_fts = False
+            for name in self.FTS_TRIGGERS:
+                cur.execute('DROP TRIGGER IF EXISTS %s' % name)
+            LOG.info('[SnoopR] SQLite lacks FTS5 trigram support; search uses LIKE')
+            return
+        cur.execute("CREATE VIRTUAL TABLE IF NOT EXISTS network_fts USING fts5(%s, "
+                    "content='networks', content_rowid='id', tokenize='trigram')"
+                    % ', '.join(self.FTS_COLUMNS))
+        present = {row[0] for row in cur.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name IN (?, ?, ?)",
+            self.FTS_TRIGGERS)}
+        if present != set(self.FTS_TRIGGERS):
+            cols = ', '.join(self.FTS_COLUMNS)
+            old = ', '.join('OLD.' + c for c in self.FTS_COLUMNS)
+            new = ', '.join('NEW.' + c for c in self.FTS_COLUMNS)
+            insert = 'INSERT INTO network_fts (rowid, %s) VALUES (NEW.id, %s);' % (cols, new)
+            delete = ("INSERT INTO network_fts (network_fts, rowid, %s) "
+                      "VALUES ('delete', OLD.id, %s);" % (cols, old))
+            changed = ' OR '.join('OLD.%s IS NOT NEW.%s' % (c, c) for c in self.FTS_COLUMNS)
+            for name in self.FTS_TRIGGERS:
+                cur.execute('DROP TRIGGER IF EXISTS %s' % name)
+            cur.execute('CREATE TRIGGER trg_net_fts_ins AFTER INSERT ON networks '
+                        'FOR EACH ROW BEGIN %s END' % insert)
+            cur.execute('CREATE TRIGGER trg_net_fts_del AFTER DELETE ON networks '
+                        'FOR EACH ROW BEGIN %s END' % delete)
+            cur.execute('CREATE TRIGGER trg_net_fts_upd AFTER UPDATE OF %s ON networks '
+                        'FOR EACH ROW WHEN %s BEGIN %s %s END' % (cols, changed, delete, insert))
+            cur.execute("INSERT INTO network_fts (network_fts) VALUES ('rebuild')")
+            LOG.info('[SnoopR] built the network search index')
+        self.has_fts = True
+
+    def set_count_threshold(self, threshold):
+        """Store the high_persistence threshold and recount everything in one grouped
+        pass. Runs at startup (so counters can never drift across versions) and
+        whenever the threshold changes."""
+        with self.db_lock:
+            try:
+                with self._connection:
+                    self._connection.execute(
+                        'INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                        ('count_threshold', repr(float(threshold))))
+                    sums = ', '.join('COALESCE(SUM(CASE WHEN %s THEN 1 ELSE 0 END), 0)'
+                                     % pred.format(r='n') for _, pred in self.COUNTERS)
+                    values = self._connection.execute(
+                        'SELECT %s FROM networks n' % sums).fetchone()
+                    self._connection.execute('DELETE FROM network_counts')
+                    self._connection.executemany(
+                        'INSERT INTO network_counts (name, value) VALUES (?, ?)',
+                        zip([name for name, _ in self.COUNTERS], values))
+                self.count_threshold = float(threshold)
+            except sqlite3.Error as exc:
+                LOG.error('[SnoopR] set_count_threshold error: %s', exc)
 
     def _migrate(self):
         cursor = self._connection.cursor()
@@ -531,6 +1000,20 @@ class Database:
                 cursor.execute("ALTER TABLE aircraft_info ADD COLUMN status TEXT DEFAULT 'ok'")
             except sqlite3.OperationalError:
                 pass
+            # Lets the bulk analysis reader decide state freshness in SQL; rows from
+            # before it existed read as stale and are rebuilt once.
+            try:
+                cursor.execute('ALTER TABLE device_state ADD COLUMN started_at REAL')
+            except sqlite3.OperationalError:
+                pass
+            # Partitions from before schema 11 keep their text columns until they age out.
+            try:
+                cursor.execute('ALTER TABLE detection_partitions '
+                               'ADD COLUMN typed INTEGER NOT NULL DEFAULT 0')
+            except sqlite3.OperationalError:
+                pass
+            self._adopt_legacy_detections(cursor)
+            self._ensure_partition(cursor, time.time())
 
             # Older schemas allowed duplicate (mac, device_type) rows; enforce it now.
             try:
@@ -543,17 +1026,27 @@ class Database:
             cursor.execute('SELECT value FROM meta WHERE key = ?', ('schema_version',))
             row = cursor.fetchone()
             previous = int(row[0]) if row and str(row[0]).isdigit() else 0
-            if previous < SCHEMA_VERSION:
+            if previous < 7:
                 # Backfill last_seen/first_seen for pre-v7 rows so the recent-device
                 # query does not skip them on the first run after upgrade.
                 cursor.execute('''
                     UPDATE networks SET last_seen = (
-                        SELECT MAX(d.timestamp) FROM detections d WHERE d.network_id = networks.id
+                        SELECT datetime(MAX(d.timestamp), 'unixepoch') FROM detections d
+                        WHERE d.network_id = networks.id
                     ) WHERE last_seen IS NULL''')
                 cursor.execute('''
                     UPDATE networks SET first_seen = (
-                        SELECT MIN(d.timestamp) FROM detections d WHERE d.network_id = networks.id
+                        SELECT datetime(MIN(d.timestamp), 'unixepoch') FROM detections d
+                        WHERE d.network_id = networks.id
                     ) WHERE first_seen IS NULL''')
+            if previous < 8:
+                # Analysis became incremental; every existing device starts dirty so
+                # its running aggregates are built once from history.
+                cursor.execute("INSERT OR IGNORE INTO dirty_devices (network_id, detection_id) "
+                               "SELECT id, 0 FROM networks WHERE device_type != 'aircraft'")
+            if previous < 9:
+                self._fill_network_summary(cursor)
+            if previous < SCHEMA_VERSION:
                 cursor.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
                                ('schema_version', str(SCHEMA_VERSION)))
                 LOG.info('[SnoopR] schema migrated %s -> %s', previous, SCHEMA_VERSION)
@@ -561,6 +1054,143 @@ class Database:
         finally:
             cursor.close()
 
+    def _fill_network_summary(self, cursor):
+        """Build summary rows from detections for every network that has none.
+        Used once on upgrade."""
+        cursor.execute('''
+            INSERT INTO network_summary
+                (network_id, first_ts, last_ts, hits, sessions_count, last_session_id,
+                 last_lat, last_lon, last_rssi)
+            SELECT a.network_id, a.first_ts, a.last_ts, a.hits, a.sessions_count,
+                   a.last_session_id, l.lat, l.lon, l.rssi
+            FROM (
+                SELECT network_id, datetime(MIN(timestamp), 'unixepoch') AS first_ts,
+                       datetime(MAX(timestamp), 'unixepoch') AS last_ts,
+                       COUNT(*) AS hits, COUNT(DISTINCT session_id) AS sessions_count,
+                       MAX(session_id) AS last_session_id
+                FROM detections WHERE network_id IN (%(missing)s)
+                GROUP BY network_id
+            ) a
+            LEFT JOIN (
+                SELECT network_id, latitude AS lat, longitude AS lon, signal_strength AS rssi,
+                       ROW_NUMBER() OVER (PARTITION BY network_id
+                                          ORDER BY timestamp DESC, id DESC) AS rn
+                FROM detections WHERE network_id IN (%(missing)s) AND latitude IS NOT NULL
+            ) l ON l.network_id = a.network_id AND l.rn = 1''' % {
+            'missing': 'SELECT id FROM networks WHERE id NOT IN '
+                       '(SELECT network_id FROM network_summary)',
+        })
+
+    # -- detection partitions ------------------------------------------
+    def _load_partitions(self, cursor):
+        self._partitions = cursor.execute(
+            'SELECT first_id, name, ends, typed FROM detection_partitions '
+            'ORDER BY first_id, starts').fetchall()
+
+    def _rebuild_detections_view(self, cursor):
+        """Partitions from before schema 11 are converted on the fly, so every reader
+        gets REAL coordinates (NULL without a valid fix) and epoch-second timestamps."""
+        columns = ', '.join(self.DETECTION_COLUMNS)
+        legacy = ', '.join(self.LEGACY_DETECTION_COLUMNS.get(c, c)
+                           for c in self.DETECTION_COLUMNS)
+        cursor.execute('DROP VIEW IF EXISTS detections')
+        if self._partitions:
+            cursor.execute('CREATE VIEW detections AS ' + ' UNION ALL '.join(
+                'SELECT %s FROM %s' % (columns if typed else legacy, name)
+                for _, name, _, typed in self._partitions))
+
+    def _id_high_water(self, cursor):
+        """Largest detection id ever handed out, surviving the drop of its partition."""
+        seq = cursor.execute('SELECT MAX(seq) FROM sqlite_sequence WHERE name IN '
+                             '(SELECT name FROM detection_partitions)').fetchone()[0]
+        stored = cursor.execute("SELECT value FROM meta WHERE key = 'detection_id_high_water'"
+                                ).fetchone()
+        return max(int(seq or 0), int(stored[0]) if stored else 0)
+
+    def _ensure_partition(self, cursor, now):
+        """Name of the partition rows written at `now` go to. Writes always land in the
+        newest partition, so ids only ever grow from one partition to the next; a new
+        one is opened (seeded past every id handed out so far) once its period ends, or
+        straight away if the newest one still has pre-v11 text columns."""
+        if not self._partitions:
+            self._load_partitions(cursor)
+        if self._partitions and self._partitions[-1][3] and now < self._partitions[-1][2]:
+            return self._partitions[-1][1]
+        day = int(now // 86400)
+        day -= day % self.partition_days
+        name = 'detections_%s' % time.strftime('%Y%m%d', time.gmtime(day * 86400))
+        first_id = self._id_high_water(cursor)
+        if any(name == p[1] for p in self._partitions):
+            # Replacing a text partition, or partition_days changed mid-period; a fresh
+            # table keeps ids monotonic.
+            name = '%s_%d' % (name, first_id)
+        cursor.execute('''
+            CREATE TABLE %s (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id INTEGER NOT NULL,
+                network_id INTEGER NOT NULL,
+                encryption TEXT,
+                signal_strength INTEGER,
+                latitude REAL,
+                longitude REAL,
+                altitude REAL,
+                channel INTEGER,
+                auth_mode TEXT,
+                timestamp INTEGER NOT NULL DEFAULT (CAST(strftime('%%s', 'now') AS INTEGER)),
+                filtered_signal_strength REAL,
+                FOREIGN KEY(session_id) REFERENCES sessions(id),
+                FOREIGN KEY(network_id) REFERENCES networks(id)
+            )''' % name)
+        # No timestamp or session index: retention and garbage collection no longer
+        # search detections. Trails only want rows with a fix (NULL latitude), so they
+        # get their own partial index.
+        cursor.execute('CREATE INDEX idx_%s_net_ts ON %s(network_id, timestamp)' % (name, name))
+        cursor.execute('CREATE INDEX idx_%s_fix ON %s(network_id, timestamp) '
+                       'WHERE latitude IS NOT NULL' % (name, name))
+        cursor.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)', (name, first_id))
+        cursor.execute('INSERT INTO detection_partitions (name, first_id, starts, ends, typed) '
+                       'VALUES (?, ?, ?, ?, 1)',
+                       (name, first_id, day * 86400.0, (day + self.partition_days) * 86400.0))
+        self._load_partitions(cursor)
+        self._rebuild_detections_view(cursor)
+        LOG.info('[SnoopR] opened detections partition %s', name)
+        return name
+
+    def _adopt_legacy_detections(self, cursor):
+        """Pre-v10 databases have one detections table. It becomes the oldest partition
+        as-is (no copying) and is dropped whole once its newest row ages out."""
+        row = cursor.execute("SELECT type FROM sqlite_master WHERE name = 'detections'").fetchone()
+        if not row or row[0] != 'table':
+            return
+        name = 'detections_legacy'
+        cursor.execute('ALTER TABLE detections RENAME TO %s' % name)
+        for index in ('idx_det_ts', 'idx_det_session'):
+            cursor.execute('DROP INDEX IF EXISTS %s' % index)
+        starts, ends = cursor.execute(
+            "SELECT CAST(strftime('%%s', MIN(timestamp)) AS REAL), "
+            "CAST(strftime('%%s', MAX(timestamp)) AS REAL) + 1 FROM %s" % name).fetchone()
+        cursor.execute('INSERT INTO detection_partitions (name, first_id, starts, ends) '
+                       'VALUES (?, 0, ?, ?)', (name, starts or 0.0, ends or 0.0))
+        cursor.execute('INSERT INTO detection_refs (part, network_id, session_id, hits) '
+                       'SELECT ?, network_id, session_id, COUNT(*) FROM %s '
+                       'GROUP BY network_id, session_id' % name, (name,))
+        self._load_partitions(cursor)
+        self._rebuild_detections_view(cursor)
+        LOG.info('[SnoopR] detections table adopted as partition %s', name)
+
+    def _update_filtered_rssi(self, cursor, pairs):
+        """pairs: [(filtered_rssi, detection_id), ...], routed to the partition that
+        holds each id by its first_id."""
+        starts = [p[0] for p in self._partitions]
+        routed = defaultdict(list)
+        for pair in pairs:
+            index = bisect_left(starts, pair[1]) - 1
+            if index >= 0:
+                routed[self._partitions[index][1]].append(pair)
+        for name, rows in routed.items():
+            cursor.executemany('UPDATE %s SET filtered_signal_strength = ? WHERE id = ?' % name,
+                               rows)
+
     def disconnect(self):
         with self.db_lock:
             if self._connection:
@@ -581,79 +1211,200 @@ class Database:
                 cursor.close()
 
     def add_detection_batch(self, detections):
-        """detections: iterable of Detection tuples (see Detection._fields)."""
+        """detections: iterable of Detection tuples (see Detection._fields).
+
+        Set-based: the batch is folded to one row per (mac, device_type) in Python, staged
+        in a temp table and upserted with a single INSERT ... SELECT, and network ids come
+        back from one join. The per-network upsert + SELECT and per-detection best_rssi
+        UPDATE it replaces cost ~1000 round trips under db_lock for a busy AP list."""
         if not detections:
             return
+        started = time.time()
+        staged = {}
+        for det in detections:
+            key = (det[0], det[3])
+            entry = staged.get(key)
+            if entry is None:
+                # First sighting in the batch supplies the attributes, as before.
+                staged[key] = list(det[:11]) + [det[12], None]
+            elif det[12] is not None and (entry[11] is None or det[12] > entry[11]):
+                entry[11] = det[12]
         with self.db_lock:
+            try:
+                with self._connection:
+                    part = self._ensure_partition(self._connection, time.time())
+            except sqlite3.Error as exc:
+                LOG.error('[SnoopR] add_detection_batch error: %s', exc)
+                return
+            net_map = {}
+            for key, entry in staged.items():
+                net_id = self.id_cache.get(key)
+                if net_id is not None:
+                    net_map[key] = entry[12] = net_id
+            hits = len(net_map)
             try:
                 with self._connection:
                     cursor = self._connection.cursor()
                     try:
-                        net_map = {}
-                        for det in detections:
-                            key = (det[0], det[3])
-                            if key in net_map:
-                                continue
-                            cursor.execute('''
-                                INSERT INTO networks
-                                    (mac, type, name, device_type, vendor, classification,
-                                     is_rogue, is_mesh, is_randomized, vulnerabilities, anomalies,
-                                     first_seen, last_seen)
-                                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?,
-                                        CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-                                ON CONFLICT(mac, device_type) DO UPDATE SET
-                                    name = COALESCE(NULLIF(excluded.name, ''), networks.name),
-                                    vendor = CASE WHEN excluded.vendor != 'Unknown'
-                                                  THEN excluded.vendor ELSE networks.vendor END,
-                                    classification = excluded.classification,
-                                    is_rogue = excluded.is_rogue,
-                                    is_mesh = excluded.is_mesh,
-                                    is_randomized = excluded.is_randomized,
-                                    vulnerabilities = excluded.vulnerabilities,
-                                    anomalies = excluded.anomalies,
-                                    last_seen = CURRENT_TIMESTAMP
-                            ''', (det[0], det[1], det[2], det[3], det[4], det[5],
-                                  det[6], det[7], det[8], det[9], det[10]))
-                            cursor.execute(
-                                'SELECT id FROM networks WHERE mac = ? AND device_type = ?', key)
-                            row = cursor.fetchone()
-                            if row:
-                                net_map[key] = row[0]
+                        cursor.execute('DELETE FROM temp.batch_networks')
+                        cursor.executemany('''
+                            INSERT INTO temp.batch_networks
+                                (mac, type, name, device_type, vendor, classification,
+                                 is_rogue, is_mesh, is_randomized, vulnerabilities, anomalies,
+                                 best_rssi, network_id)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', staged.values())
+                        # Track the strongest RSSI ever seen; used to separate a device
+                        # that follows you from one you merely drove past.
+                        cursor.execute('''
+                            INSERT INTO networks
+                                (mac, type, name, device_type, vendor, classification,
+                                 is_rogue, is_mesh, is_randomized, vulnerabilities, anomalies,
+                                 best_rssi, first_seen, last_seen)
+                            SELECT mac, type, name, device_type, vendor, classification,
+                                   is_rogue, is_mesh, is_randomized, vulnerabilities, anomalies,
+                                   best_rssi, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP
+                            FROM temp.batch_networks WHERE 1
+                            ON CONFLICT(mac, device_type) DO UPDATE SET
+                                name = COALESCE(NULLIF(excluded.name, ''), networks.name),
+                                vendor = CASE WHEN excluded.vendor != 'Unknown'
+                                              THEN excluded.vendor ELSE networks.vendor END,
+                                classification = excluded.classification,
+                                is_rogue = excluded.is_rogue,
+                                is_mesh = excluded.is_mesh,
+                                is_randomized = excluded.is_randomized,
+                                vulnerabilities = excluded.vulnerabilities,
+                                anomalies = excluded.anomalies,
+                                best_rssi = CASE WHEN excluded.best_rssi IS NULL
+                                                 THEN networks.best_rssi
+                                                 ELSE MAX(COALESCE(networks.best_rssi, -127),
+                                                          excluded.best_rssi) END,
+                                last_seen = CURRENT_TIMESTAMP''')
+                        if hits < len(staged):
+                            # Only devices the id cache has not seen need resolving.
+                            net_map.update(((mac, dtype), net_id) for net_id, mac, dtype in
+                                           cursor.execute('''
+                                SELECT n.id, n.mac, n.device_type
+                                FROM temp.batch_networks b
+                                JOIN networks n ON n.mac = b.mac
+                                               AND n.device_type = b.device_type
+                                WHERE b.network_id IS NULL'''))
 
                         rows = []
+                        summary = {}
+                        refs = defaultdict(int)
                         for det in detections:
                             net_id = net_map.get((det[0], det[3]))
                             if net_id is None:
                                 continue
-                            rows.append((det[18], net_id, det[11], det[12], det[13], det[14],
-                                         det[17], det[15], det[16], det[19]))
+                            # Parsed once here; detections store REAL/NULL, never '-'.
+                            coords = valid_coords(det[13], det[14]) or (None, None)
+                            rows.append((det[18], net_id, det[11], det[12], coords[0], coords[1],
+                                         safe_float(det[17]), det[15], det[16], det[19]))
+                            refs[(net_id, det[18])] += 1
+                            agg = summary.get(net_id)
+                            if agg is None:
+                                agg = summary[net_id] = [0, set(), None, None, None]
+                            agg[0] += 1
+                            agg[1].add(det[18])
+                            if coords[0] is not None:
+                                agg[2], agg[3], agg[4] = coords[0], coords[1], det[12]
+                        floor = cursor.execute('SELECT seq FROM sqlite_sequence WHERE name = ?',
+                                               (part,)).fetchone()[0]
                         cursor.executemany('''
-                            INSERT INTO detections
+                            INSERT INTO %s
                                 (session_id, network_id, encryption, signal_strength,
                                  latitude, longitude, altitude, channel, auth_mode,
                                  filtered_signal_strength)
-                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', rows)
-
-                        # Track the strongest RSSI ever seen; used to separate a device
-                        # that follows you from one you merely drove past.
-                        for det in detections:
-                            rssi = det[12]
-                            if rssi is None:
-                                continue
-                            cursor.execute('''
-                                UPDATE networks SET best_rssi = MAX(COALESCE(best_rssi, -127), ?)
-                                WHERE mac = ? AND device_type = ?''', (rssi, det[0], det[3]))
-                        LOG.debug('[SnoopR] batch stored %d detections', len(rows))
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''' % part, rows)
+                        cursor.executemany('''
+                            INSERT INTO detection_refs (part, network_id, session_id, hits)
+                            VALUES (?, ?, ?, ?)
+                            ON CONFLICT(part, network_id, session_id) DO UPDATE SET
+                                hits = hits + excluded.hits''',
+                            [(part, net_id, session_id, count)
+                             for (net_id, session_id), count in refs.items()])
+
+                        # Queue the touched devices for the next analysis pass.
+                        cursor.execute('''
+                            INSERT INTO dirty_devices (network_id, detection_id)
+                            SELECT d.network_id, MAX(d.id) FROM %s d
+                            JOIN networks n ON n.id = d.network_id
+                            WHERE d.id > ? AND n.device_type != 'aircraft'
+                            GROUP BY d.network_id
+                            ON CONFLICT(network_id) DO UPDATE SET
+                                detection_id = MAX(dirty_devices.detection_id,
+                                                   excluded.detection_id)''' % part, (floor,))
+
+                        # Sessions only grow, so a batch overlaps the stored count by at
+                        # most the summary's newest session.
+                        cursor.executemany('''
+                            INSERT INTO network_summary
+                                (network_id, first_ts, last_ts, hits, sessions_count,
+                                 last_session_id, last_lat, last_lon, last_rssi)
+                            VALUES (?1, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP, ?2, ?3, ?5,
+                                    ?6, ?7, ?8)
+                            ON CONFLICT(network_id) DO UPDATE SET
+                                last_ts = excluded.last_ts,
+                                hits = network_summary.hits + excluded.hits,
+                                sessions_count = network_summary.sessions_count
+                                    + excluded.sessions_count
+                                    - (?4 <= COALESCE(network_summary.last_session_id, -1)),
+                                last_session_id = MAX(
+                                    COALESCE(network_summary.last_session_id, -1),
+                                    excluded.last_session_id),
+                                last_lat = COALESCE(excluded.last_lat, network_summary.last_lat),
+                                last_lon = COALESCE(excluded.last_lon, network_summary.last_lon),
+                                last_rssi = CASE WHEN excluded.last_lat IS NULL
+                                                 THEN network_summary.last_rssi
+                                                 ELSE excluded.last_rssi END''',
+                            [(net_id, hits_, len(sessions), min(sessions), max(sessions),
+                              lat, lon, rssi)
+                             for net_id, (hits_, sessions, lat, lon, rssi) in summary.items()])
                     finally:
                         cursor.close()
+                for key, net_id in net_map.items():
+                    self.id_cache[key] = net_id
+                self.id_cache_hits += hits
+                self.id_cache_misses += len(staged) - hits
+                self._record_write(len(rows), len(staged), time.time() - started)
+                self.data_version += 1
             except sqlite3.Error as exc:
                 LOG.error('[SnoopR] add_detection_batch error: %s', exc)
 
+    def _record_write(self, rows, networks, seconds):
+        stats = self.write_stats
+        stats['batches'] += 1
+        stats['rows'] += rows
+        stats['seconds'] += seconds
+        stats['last_rows'] = rows
+        stats['last_ms'] = round(seconds * 1000.0, 1)
+        stats['last_rows_per_s'] = round(rows / seconds, 1) if seconds > 0 else None
+        LOG.debug('[SnoopR] batch stored %d detections for %d networks in %.1f ms '
+                  '(%.0f rows/s)', rows, networks, seconds * 1000.0,
+                  rows / seconds if seconds > 0 else 0.0)
+
+    def get_write_stats(self):
+        with self.db_lock:
+            stats = dict(self.write_stats)
+        stats['seconds'] = round(stats['seconds'], 3)
+        stats['rows_per_s'] = (round(stats['rows'] / stats['seconds'], 1)
+                               if stats['seconds'] > 0 else None)
+        return stats
+
+    def get_id_cache_stats(self):
+        with self.db_lock:
+            hits, misses, size = self.id_cache_hits, self.id_cache_misses, len(self.id_cache)
+        total = hits + misses
+        return {'hits': hits, 'misses': misses, 'size': size,
+                'maxsize': self.id_cache.maxsize,
+                'hit_rate': round(hits / total, 3) if total else None}
+
     def _update(self, sql, params):
         with self.db_lock:
             try:
                 with self._connection:
                     self._connection.execute(sql, params)
+                self.data_version += 1
             except sqlite3.Error as exc:
                 LOG.error('[SnoopR] update error (%s): %s', sql.split()[1:3], exc)
 
@@ -687,37 +1438,28 @@ class Database:
         with self.db_lock:
             try:
                 with self._connection:
-                    self._connection.executemany(
-                        'UPDATE detections SET filtered_signal_strength = ? WHERE id = ?', pairs)
+                    self._update_filtered_rssi(self._connection, pairs)
+                self.data_version += 1
             except sqlite3.Error as exc:
                 LOG.error('[SnoopR] update_filtered_rssi_batch error: %s', exc)
 
     # -- reads ---------------------------------------------------------
     def get_network_counts(self, persistence_threshold=0.85):
+        """O(1): reads the trigger-maintained counters instead of scanning networks."""
+        if float(persistence_threshold) != self.count_threshold:
+            self.set_count_threshold(persistence_threshold)
+        keys = ('wifi', 'bluetooth', 'aircraft', 'snoopers', 'high_persistence',
+                'anomalous_aircraft')
+        counts = dict.fromkeys(keys, 0)
         with self.db_lock:
             try:
-                cur = self._connection
-                counts = {
-                    'wifi': cur.execute(
-                        "SELECT COUNT(*) FROM networks WHERE device_type='wifi'").fetchone()[0],
-                    'bluetooth': cur.execute(
-                        "SELECT COUNT(*) FROM networks WHERE device_type='bluetooth'").fetchone()[0],
-                    'aircraft': cur.execute(
-                        "SELECT COUNT(*) FROM networks WHERE device_type='aircraft'").fetchone()[0],
-                    'snoopers': cur.execute(
-                        'SELECT COUNT(*) FROM networks WHERE is_snooper=1').fetchone()[0],
-                    'high_persistence': cur.execute(
-                        'SELECT COUNT(*) FROM networks WHERE persistence_score >= ?',
-                        (persistence_threshold,)).fetchone()[0],
-                    'anomalous_aircraft': cur.execute(
-                        "SELECT COUNT(*) FROM networks WHERE device_type='aircraft' "
-                        "AND anomalies NOT IN ('', 'None')").fetchone()[0],
-                }
-                return counts
+                for name, value in self._connection.execute(
+                        'SELECT name, value FROM network_counts'):
+                    if name in counts:
+                        counts[name] = value
             except sqlite3.Error as exc:
                 LOG.error('[SnoopR] get_network_counts error: %s', exc)
-                return {'wifi': 0, 'bluetooth': 0, 'aircraft': 0, 'snoopers': 0,
-                        'high_persistence': 0, 'anomalous_aircraft': 0}
+        return counts
 
     FILTERS = {
         'snoopers': 'n.is_snooper = 1',
@@ -728,85 +1470,145 @@ class Database:
         'anomalies': "n.anomalies NOT IN ('', 'None')",
         'randomized': 'n.is_randomized = 1',
     }
-    SORTS = {
-        'device_type': 'n.device_type ASC',
-        'is_snooper': 'n.is_snooper DESC',
-        'persistence': 'n.persistence_score DESC',
-        'velocity': 'n.max_velocity DESC',
-        'mac': 'n.mac ASC',
-        'name': 'n.name ASC',
-        'last_seen': 'n.last_seen DESC',
-        'rssi': 'n.best_rssi DESC',
+    # sort_by -> (key expression, direction). Keys are never NULL (a NULL gets a sentinel
+    # on the side it already sorted to), so (key, id) is a total order that a page can
+    # seek past; every key has an index.
+    SORT_KEYS = {
+        'device_type': ('n.device_type', 'ASC'),
+        'is_snooper': ('COALESCE(n.is_snooper, 0)', 'DESC'),
+        'persistence': ('COALESCE(n.persistence_score, 0.0)', 'DESC'),
+        'velocity': ('COALESCE(n.max_velocity, -1.0)', 'DESC'),
+        'mac': ('n.mac', 'ASC'),
+        'name': ("COALESCE(n.name, '')", 'ASC'),
+        'last_seen': ("COALESCE(n.last_seen, '')", 'DESC'),
+        'rssi': ('COALESCE(n.best_rssi, -999)', 'DESC'),
     }
 
     def count_networks(self, filter_by=None, persistence_threshold=0.85):
-        where = ''
-        params = []
-        if filter_by == 'high_persistence':
-            where = ' WHERE n.persistence_score >= ?'
-            params.append(persistence_threshold)
-        elif filter_by in self.FILTERS:
-            where = ' WHERE ' + self.FILTERS[filter_by]
+        if filter_by == 'high_persistence' and float(persistence_threshold) != self.count_threshold:
+            self.set_count_threshold(persistence_threshold)
+        name = filter_by if filter_by in self.FILTERS or filter_by == 'high_persistence' \
+            else 'total'
         with self.db_lock:
             try:
-                return self._connection.execute(
-                    'SELECT COUNT(*) FROM networks n' + where, params).fetchone()[0]
+                row = self._connection.execute(
+                    'SELECT value FROM network_counts WHERE name = ?', (name,)).fetchone()
+                return row[0] if row else 0
             except sqlite3.Error:
                 return 0
 
+    NETWORK_SELECT = '''
+        SELECT n.id, n.mac, n.type, n.name, n.device_type, n.vendor, n.classification,
+               datetime(s.first_ts, 'localtime'), datetime(s.last_ts, 'localtime'),
+               s.sessions_count, s.hits,
+               s.last_lat, s.last_lon,
+               n.is_snooper, n.snooper_reason,
+               n.triangulated_lat, n.triangulated_lon, n.triangulated_mse,
+               n.max_velocity, n.persistence_score, n.windows_hit, n.cluster_count,
+               n.anomalies, n.is_randomized, n.is_rogue, n.best_rssi,
+               ai.registration, ai.type, ai.owner
+        FROM networks n
+        JOIN network_summary s ON s.network_id = n.id
+        LEFT JOIN aircraft_info ai
+               ON n.device_type = 'aircraft' AND ai.icao24 = LOWER(n.mac)
+              AND ai.status = 'ok'
+        WHERE 1=1
+    '''
+
+    def _network_where(self, filter_by, persistence_threshold, search=None):
+        query, params = '', []
+        if filter_by == 'high_persistence':
+            query += ' AND n.persistence_score >= ?'
+            params.append(persistence_threshold)
+        elif filter_by in self.FILTERS:
+            query += ' AND ' + self.FILTERS[filter_by]
+        if search and self.has_fts and len(search) >= 3:
+            # A quoted phrase matches as a substring under the trigram tokenizer;
+            # shorter terms have no trigram to look up and take the LIKE path.
+            query += ' AND n.id IN (SELECT rowid FROM network_fts WHERE network_fts MATCH ?)'
+            params.append('"%s"' % search.replace('"', '""'))
+        elif search:
+            query += (' AND (n.mac LIKE ? OR n.name LIKE ? OR n.vendor LIKE ?'
+                      ' OR n.anomalies LIKE ?)')
+            like = '%%%s%%' % search
+            params.extend([like, like, like, like])
+        return query, params
+
+    @staticmethod
+    def _network_from_row(row):
+        (net_id, mac, type_, name, device_type, vendor, classification,
+         first_seen, last_seen, sessions_count, hits, last_lat, last_lon,
+         is_snooper, snooper_reason, tri_lat, tri_lon, tri_mse, max_velocity,
+         persistence, windows_hit, cluster_count, anomalies, is_randomized,
+         is_rogue, best_rssi, reg, ac_type, owner) = row
+        coords = valid_coords(tri_lat, tri_lon) or valid_coords(last_lat, last_lon)
+        return net_id, {
+            'mac': mac,
+            'type': type_,
+            'name': name or 'Hidden',
+            'device_type': device_type,
+            'vendor': vendor or 'Unknown',
+            'classification': classification or 'Unknown',
+            'first_seen': first_seen,
+            'last_seen': last_seen,
+            'sessions_count': sessions_count or 0,
+            'hits': hits or 0,
+            'latitude': coords[0] if coords else None,
+            'longitude': coords[1] if coords else None,
+            'triangulated': bool(coords and valid_coords(tri_lat, tri_lon)),
+            'is_snooper': bool(is_snooper),
+            'snooper_reason': snooper_reason or '',
+            'triangulated_mse': round(tri_mse, 1) if tri_mse is not None else None,
+            'max_velocity_mph': (round(max_velocity * MPS_TO_MPH, 1)
+                                 if max_velocity else None),
+            'persistence_score': round(float(persistence or 0.0), 3),
+            'windows_hit': windows_hit or 0,
+            'cluster_count': cluster_count or 0,
+            'anomalies': anomalies or 'None',
+            'is_randomized': bool(is_randomized),
+            'is_rogue': bool(is_rogue),
+            'best_rssi': best_rssi,
+            'registration': reg,
+            'aircraft_type': ac_type,
+            'owner': owner,
+        }
+
     def get_all_networks(self, sort_by=None, filter_by=None, include_paths=False,
                          limit=200, offset=0, persistence_threshold=0.85,
-                         path_limit=500, search=None):
-        """Single query, no N+1: latest fix comes from a window function and trails are
-        fetched in one extra query for the page's networks only."""
+                         path_limit=500, search=None, path_tolerance=None):
+        return self.get_network_page(
+            sort_by=sort_by, filter_by=filter_by, include_paths=include_paths, limit=limit,
+            offset=offset, persistence_threshold=persistence_threshold,
+            path_limit=path_limit, search=search, path_tolerance=path_tolerance)[0]
+
+    def get_network_page(self, sort_by=None, filter_by=None, include_paths=False,
+                         limit=200, offset=0, persistence_threshold=0.85,
+                         path_limit=500, search=None, path_tolerance=None, after=None):
+        """One page of networks and the cursor of the next one: (networks, (key, id))
+        when the page is full, else (networks, None). Passing that cursor back as
+        `after` seeks past it on the sort key's index instead of counting off `offset`
+        rows, so deep pages cost the same as the first.
+
+        Single query, no N+1: hit counts and the latest fix come from network_summary
+        (a primary-key join, independent of detection count) and trails are fetched in
+        one extra query for the page's networks only.
+
+        With path_tolerance (metres) trails are simplified with simplify_path and kept
+        in path_cache until the network's hit count changes; only networks without a
+        current entry are read from detections."""
         with self.db_lock:
             try:
-                query = '''
-                    WITH latest AS (
-                        SELECT network_id, latitude, longitude, signal_strength, timestamp,
-                               ROW_NUMBER() OVER (PARTITION BY network_id
-                                                  ORDER BY timestamp DESC) AS rn
-                        FROM detections
-                        WHERE latitude IS NOT NULL AND latitude != '-'
-                          AND longitude IS NOT NULL AND longitude != '-'
-                    ),
-                    agg AS (
-                        SELECT network_id,
-                               MIN(timestamp) AS first_ts,
-                               MAX(timestamp) AS last_ts,
-                               COUNT(DISTINCT session_id) AS sessions_count,
-                               COUNT(*) AS hits
-                        FROM detections GROUP BY network_id
-                    )
-                    SELECT n.id, n.mac, n.type, n.name, n.device_type, n.vendor, n.classification,
-                           datetime(a.first_ts, 'localtime'), datetime(a.last_ts, 'localtime'),
-                           a.sessions_count, a.hits,
-                           l.latitude, l.longitude,
-                           n.is_snooper, n.snooper_reason,
-                           n.triangulated_lat, n.triangulated_lon, n.triangulated_mse,
-                           n.max_velocity, n.persistence_score, n.windows_hit, n.cluster_count,
-                           n.anomalies, n.is_randomized, n.is_rogue, n.best_rssi,
-                           ai.registration, ai.type, ai.owner
-                    FROM networks n
-                    JOIN agg a ON a.network_id = n.id
-                    LEFT JOIN latest l ON l.network_id = n.id AND l.rn = 1
-                    LEFT JOIN aircraft_info ai
-                           ON n.device_type = 'aircraft' AND ai.icao24 = LOWER(n.mac)
-                          AND ai.status = 'ok'
-                    WHERE 1=1
-                '''
-                params = []
-                if filter_by == 'high_persistence':
-                    query += ' AND n.persistence_score >= ?'
-                    params.append(persistence_threshold)
-                elif filter_by in self.FILTERS:
-                    query += ' AND ' + self.FILTERS[filter_by]
-                if search:
-                    query += (' AND (n.mac LIKE ? OR n.name LIKE ? OR n.vendor LIKE ?'
-                              ' OR n.anomalies LIKE ?)')
-                    like = '%%%s%%' % search
-                    params.extend([like, like, like, like])
-                query += ' ORDER BY ' + self.SORTS.get(sort_by, 'n.persistence_score DESC')
+                where, params = self._network_where(filter_by, persistence_threshold, search)
+                key, direction = self.SORT_KEYS.get(sort_by, self.SORT_KEYS['persistence'])
+                if after is not None:
+                    # The plain bound gives the planner an index range; the row value
+                    # breaks ties on id.
+                    op = '<' if direction == 'DESC' else '>'
+                    where += ' AND {0} {1}= ? AND ({0}, n.id) {1} (?, ?)'.format(key, op)
+                    params.extend([after[0], after[0], int(after[1])])
+                    offset = 0
+                query = self.NETWORK_SELECT + where
+                query += ' ORDER BY {0} {1}, n.id {1}'.format(key, direction)
                 query += ' LIMIT ? OFFSET ?'
                 params.extend([int(limit), int(offset)])
 
@@ -814,73 +1616,138 @@ class Database:
                 networks = []
                 by_id = {}
                 for row in rows:
-                    (net_id, mac, type_, name, device_type, vendor, classification,
-                     first_seen, last_seen, sessions_count, hits, last_lat, last_lon,
-                     is_snooper, snooper_reason, tri_lat, tri_lon, tri_mse, max_velocity,
-                     persistence, windows_hit, cluster_count, anomalies, is_randomized,
-                     is_rogue, best_rssi, reg, ac_type, owner) = row
-                    coords = valid_coords(tri_lat, tri_lon) or valid_coords(last_lat, last_lon)
-                    net = {
-                        'mac': mac,
-                        'type': type_,
-                        'name': name or 'Hidden',
-                        'device_type': device_type,
-                        'vendor': vendor or 'Unknown',
-                        'classification': classification or 'Unknown',
-                        'first_seen': first_seen,
-                        'last_seen': last_seen,
-                        'sessions_count': sessions_count or 0,
-                        'hits': hits or 0,
-                        'latitude': coords[0] if coords else None,
-                        'longitude': coords[1] if coords else None,
-                        'triangulated': bool(coords and valid_coords(tri_lat, tri_lon)),
-                        'is_snooper': bool(is_snooper),
-                        'snooper_reason': snooper_reason or '',
-                        'triangulated_mse': round(tri_mse, 1) if tri_mse is not None else None,
-                        'max_velocity_mph': (round(max_velocity * MPS_TO_MPH, 1)
-                                             if max_velocity else None),
-                        'persistence_score': round(float(persistence or 0.0), 3),
-                        'windows_hit': windows_hit or 0,
-                        'cluster_count': cluster_count or 0,
-                        'anomalies': anomalies or 'None',
-                        'is_randomized': bool(is_randomized),
-                        'is_rogue': bool(is_rogue),
-                        'best_rssi': best_rssi,
-                        'registration': reg,
-                        'aircraft_type': ac_type,
-                        'owner': owner,
-                    }
+                    net_id, net = self._network_from_row(row)
                     networks.append(net)
                     by_id[net_id] = net
-
-                if include_paths and by_id:
-                    placeholders = ','.join('?' * len(by_id))
+                cursor = None
+                if rows and len(rows) == int(limit):
+                    last_id = rows[-1][0]
+                    cursor = (self._connection.execute(
+                        'SELECT %s FROM networks n WHERE n.id = ?' % key,
+                        (last_id,)).fetchone()[0], last_id)
+
+                wanted = by_id if include_paths else {}
+                if wanted and path_tolerance:
+                    wanted = {}
+                    for net_id, net in by_id.items():
+                        cached = self.path_cache.get((net_id, path_tolerance, path_limit))
+                        if cached is None or cached[0] != net['hits']:
+                            wanted[net_id] = net
+                        elif cached[1]:
+                            net['path'] = cached[1]
+                if wanted:
+                    placeholders = ','.join('?' * len(wanted))
                     path_rows = self._connection.execute('''
                         SELECT network_id, latitude, longitude,
-                               datetime(timestamp, 'localtime'), signal_strength
+                               datetime(timestamp, 'unixepoch', 'localtime'), signal_strength
                         FROM detections
-                        WHERE network_id IN (%s)
-                          AND latitude != '-' AND longitude != '-'
+                        WHERE network_id IN (%s) AND latitude IS NOT NULL
                         ORDER BY network_id, timestamp
-                    ''' % placeholders, list(by_id.keys())).fetchall()
+                    ''' % placeholders, list(wanted.keys())).fetchall()
                     grouped = defaultdict(list)
                     for net_id, lat, lon, ts, rssi in path_rows:
-                        coords = valid_coords(lat, lon)
-                        if not coords or len(grouped[net_id]) >= path_limit:
+                        if len(grouped[net_id]) >= path_limit:
                             continue
-                        grouped[net_id].append({'latitude': coords[0], 'longitude': coords[1],
+                        grouped[net_id].append({'latitude': lat, 'longitude': lon,
                                                 'timestamp': ts, 'signal_strength': rssi})
-                    for net_id, path in grouped.items():
+                    for net_id, net in wanted.items():
+                        path = grouped.get(net_id, [])
+                        if path_tolerance:
+                            path = simplify_path(path, path_tolerance)
+                            self.path_cache[(net_id, path_tolerance, path_limit)] = (
+                                net['hits'], path if len(path) > 1 else None)
                         if len(path) > 1:
-                            by_id[net_id]['path'] = path
-                return networks
+                            net['path'] = path
+                return networks, cursor
             except sqlite3.Error as exc:
-                LOG.error('[SnoopR] get_all_networks error: %s', exc)
-                return []
+                LOG.error('[SnoopR] get_network_page error: %s', exc)
+                return [], None
+
+    def iter_networks(self, filter_by=None, persistence_threshold=0.85, path_limit=500,
+                      path_min_score=None):
+        """Yield every matching network (same dicts as get_all_networks) in id order,
+        without a row cap, for exports. Memory is bounded by one network and its trail.
+
+        Reads go through a private read-only connection, so the WAL snapshot stays
+        consistent for the whole export while db_lock stays free for the writers.
+        Trails are attached only to networks with persistence_score > path_min_score or
+        flagged as snoopers (every network when path_min_score is None). detection_refs,
+        merge-joined against the network cursor, names the partitions holding each one;
+        each of those is read through its (network_id, timestamp) fix index, at most
+        path_limit rows, and the per-partition runs are merged with heapq.merge. Reading
+        the `detections` view in that order instead sorted every partition's rows in a
+        temporary B-tree and read past path_limit for busy networks."""
+        try:
+            conn = sqlite3.connect('file:%s?mode=ro' % quote(os.path.abspath(self._path)),
+                                   uri=True, timeout=30,
+                                   check_same_thread=False)
+        except sqlite3.Error as exc:
+            LOG.error('[SnoopR] iter_networks error: %s', exc)
+            return
+        try:
+            conn.execute('BEGIN')
+            trail_sql = {}
+            for name, typed in conn.execute('SELECT name, typed FROM detection_partitions'):
+                source = name
+                if not typed:
+                    source = '(SELECT network_id, signal_strength, %s, %s, %s FROM %s)' % (
+                        self.LEGACY_DETECTION_COLUMNS['latitude'],
+                        self.LEGACY_DETECTION_COLUMNS['longitude'],
+                        self.LEGACY_DETECTION_COLUMNS['timestamp'], name)
+                trail_sql[name] = '''
+                    SELECT timestamp, latitude, longitude,
+                           datetime(timestamp, 'unixepoch', 'localtime'), signal_strength
+                    FROM %s
+                    WHERE network_id = ? AND latitude IS NOT NULL
+                    ORDER BY timestamp LIMIT ?''' % source
+            where, params = self._network_where(filter_by, persistence_threshold)
+            networks = conn.execute(self.NETWORK_SELECT + where + ' ORDER BY n.id', params)
+            # A network without a last fix has nothing to draw.
+            trail_nets = ('SELECT s.network_id FROM network_summary s '
+                          'JOIN networks n ON n.id = s.network_id '
+                          'WHERE s.last_lat IS NOT NULL')
+            trail_params = []
+            if path_min_score is not None:
+                trail_nets += ' AND (n.persistence_score > ? OR n.is_snooper = 1)'
+                trail_params.append(path_min_score)
+            refs = conn.execute('SELECT network_id, part FROM detection_refs '
+                                'WHERE network_id IN (%s) ORDER BY network_id' % trail_nets,
+                                trail_params)
+            pending = next(refs, None)
+            for row in networks:
+                net_id, net = self._network_from_row(row)
+                parts = set()
+                while pending is not None and pending[0] <= net_id:
+                    if pending[0] == net_id and pending[1] in trail_sql:
+                        parts.add(pending[1])
+                    pending = next(refs, None)
+                path = self._read_trail(conn, [trail_sql[p] for p in sorted(parts)],
+                                        net_id, path_limit) if parts else []
+                if len(path) > 1:
+                    net['path'] = path
+                yield net
+        except sqlite3.Error as exc:
+            LOG.error('[SnoopR] iter_networks error: %s', exc)
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _read_trail(conn, queries, net_id, path_limit):
+        cursors = [conn.execute(query, (net_id, path_limit)) for query in queries]
+        try:
+            return [{'latitude': lat, 'longitude': lon, 'timestamp': stamp,
+                     'signal_strength': rssi}
+                    for _, lat, lon, stamp, rssi
+                    in islice(heapq.merge(*cursors, key=lambda row: row[0]), path_limit)]
+        finally:
+            for cursor in cursors:
+                cursor.close()
 
     def get_detections_for_network(self, mac, device_type, limit=5000, days=None,
-                                   ascending=True):
-        """Rows come back oldest-first by default -- the analysis code depends on it."""
+                                   ascending=True, after_id=0):
+        """Rows come back oldest-first by default -- the analysis code depends on it.
+        `after_id` skips rows an incremental analysis pass has already folded in.
+        timestamp is epoch seconds; lat/lon/alt are floats, or None without a fix."""
         with self.db_lock:
             try:
                 query = '''
@@ -891,9 +1758,12 @@ class Database:
                     WHERE n.mac = ? AND n.device_type = ?
                 '''
                 params = [mac, device_type]
+                if after_id:
+                    query += ' AND d.id > ?'
+                    params.append(int(after_id))
                 if days:
                     query += ' AND d.timestamp >= ?'
-                    params.append(cutoff_ts(days))
+                    params.append(cutoff_epoch(days))
                 # Take the most recent `limit` rows, then flip to chronological order.
                 query += ' ORDER BY d.timestamp DESC LIMIT ?'
                 params.append(int(limit))
@@ -919,11 +1789,135 @@ class Database:
                 LOG.error('[SnoopR] get_recent_devices error: %s', exc)
                 return []
 
+    def get_analysis_candidates(self, days=7):
+        """Devices an analysis pass has to look at: those with detections it has not
+        folded in yet, plus those whose persistence windows are still sliding.
+        Returns [(network_id, dirty), ...] in id order."""
+        with self.db_lock:
+            try:
+                return [(r[0], bool(r[1])) for r in self._connection.execute('''
+                    SELECT n.id, d.network_id IS NOT NULL
+                    FROM networks n
+                    LEFT JOIN dirty_devices d ON d.network_id = n.id
+                    WHERE n.last_seen >= ? AND n.device_type != 'aircraft'
+                      AND (d.network_id IS NOT NULL OR n.windows_hit > 0)
+                    ORDER BY n.id
+                ''', (cutoff_ts(days),)).fetchall()]
+            except sqlite3.Error as exc:
+                LOG.error('[SnoopR] get_analysis_candidates error: %s', exc)
+                return []
+
+    def iter_analysis_rows(self, network_ids, days=7, limit=4000, fresh_since=0.0,
+                           chunk=64):
+        """Yield (meta, state_text, rows) per device for the analysis pass.
+
+        Per chunk of network ids there are two queries under one db_lock: metadata joined
+        with the stored DeviceState, and every detection the devices still need in a
+        single scan ordered by (network_id, timestamp). A state whose started_at is older
+        than fresh_since comes back as None and the device is re-read from the whole
+        window. rows keep get_detections_for_network's shape: the newest `limit` rows
+        after the state's last_detection_id, oldest first."""
+        cutoff = cutoff_epoch(days)
+        for offset in range(0, len(network_ids), chunk):
+            ids = list(network_ids[offset:offset + chunk])
+            with self.db_lock:
+                try:
+                    metas = self._connection.execute('''
+                        SELECT n.id, n.mac, n.device_type, n.is_randomized, n.best_rssi,
+                               n.is_snooper, n.name, n.vendor,
+                               CASE WHEN s.started_at >= ? THEN s.state END,
+                               CASE WHEN s.started_at >= ? THEN s.last_detection_id ELSE 0 END
+                        FROM networks n
+                        LEFT JOIN device_state s ON s.network_id = n.id
+                        WHERE n.id IN (%s) ORDER BY n.id
+                    ''' % ','.join('?' * len(ids)), [fresh_since, fresh_since] + ids).fetchall()
+                    if not metas:
+                        continue
+                    params = []
+                    for meta in metas:
+                        params.extend((meta[0], meta[9]))
+                    params.append(cutoff)
+                    # A per-device LIMIT needs ROW_NUMBER() and two extra sorts, several
+                    # times slower than this single ordered pass; the cap is applied
+                    # while grouping instead, keeping only the newest `limit` rows.
+                    cursor = self._connection.execute('''
+                        WITH a(network_id, after_id) AS (VALUES %s)
+                        SELECT d.network_id, d.id, d.signal_strength, d.latitude,
+                               d.longitude, d.altitude, d.timestamp,
+                               d.filtered_signal_strength, d.session_id
+                        FROM a JOIN detections d
+                             ON d.network_id = a.network_id AND d.id > a.after_id
+                        WHERE d.timestamp >= ?
+                        ORDER BY d.network_id, d.timestamp, d.id
+                    ''' % ','.join(['(?, ?)'] * len(metas)), params)
+                    grouped = {}
+                    for r in cursor:
+                        group = grouped.get(r[0])
+                        if group is None:
+                            group = grouped[r[0]] = deque(maxlen=limit)
+                        group.append(r)
+                except sqlite3.Error as exc:
+                    LOG.error('[SnoopR] iter_analysis_rows error: %s', exc)
+                    continue
+            for meta in metas:
+                yield ({'id': meta[0], 'mac': meta[1], 'device_type': meta[2],
+                        'is_randomized': bool(meta[3]), 'best_rssi': meta[4],
+                        'is_snooper': bool(meta[5]), 'name': meta[6], 'vendor': meta[7]},
+                       meta[8],
+                       [{'id': r[1], 'rssi': r[2], 'lat': r[3], 'lon': r[4], 'alt': r[5],
+                         'timestamp': r[6], 'filtered_rssi': r[7], 'session': r[8]}
+                        for r in grouped.get(meta[0], ())])
+
+    def store_analysis_results(self, results):
+        """Write back a chunk of analyse_device() results in one transaction: scores,
+        snooper verdicts, positions, filtered RSSI and the device states themselves.
+        Per-device updates used to cost five or six committed statements each."""
+        if not results:
+            return
+        scores, verdicts, positions, filtered, states, clean = [], [], [], [], [], []
+        stamp = fmt_ts()
+        for result in results:
+            net_id = result['network_id']
+            verdict = result['verdict']
+            if verdict:
+                score, windows_hit, cluster_count, is_snooper, reason = verdict
+                scores.append((score, windows_hit, cluster_count, result['max_velocity'],
+                               net_id))
+                if is_snooper or result['was_snooper']:
+                    verdicts.append((int(is_snooper), reason, net_id))
+                filtered.extend(result['filtered'])
+            if result['position']:
+                lat, lon, mse = result['position']
+                positions.append((str(lat), str(lon), mse, net_id))
+            states.append((net_id, int(result['last_id']), result['state'], stamp,
+                           result['started_at']))
+            clean.append((net_id, int(result['last_id'])))
+        with self.db_lock:
+            try:
+                with self._connection:
+                    cur = self._connection
+                    cur.executemany('UPDATE networks SET persistence_score = ?, windows_hit = ?, '
+                                    'cluster_count = ?, max_velocity = ? WHERE id = ?', scores)
+                    cur.executemany('UPDATE networks SET is_snooper = ?, snooper_reason = ? '
+                                    'WHERE id = ?', verdicts)
+                    cur.executemany('UPDATE networks SET triangulated_lat = ?, '
+                                    'triangulated_lon = ?, triangulated_mse = ? WHERE id = ?',
+                                    positions)
+                    self._update_filtered_rssi(cur, filtered)
+                    cur.executemany('INSERT OR REPLACE INTO device_state '
+                                    '(network_id, last_detection_id, state, updated_at, '
+                                    'started_at) VALUES (?, ?, ?, ?, ?)', states)
+                    cur.executemany('DELETE FROM dirty_devices '
+                                    'WHERE network_id = ? AND detection_id <= ?', clean)
+                self.data_version += 1
+            except sqlite3.Error as exc:
+                LOG.error('[SnoopR] store_analysis_results error: %s', exc)
+
     def get_network_meta(self, mac, device_type):
         with self.db_lock:
             try:
                 row = self._connection.execute(
-                    'SELECT is_randomized, best_rssi, is_snooper, name, vendor '
+                    'SELECT is_randomized, best_rssi, is_snooper, name, vendor, id '
                     'FROM networks WHERE mac = ? AND device_type = ?',
                     (mac, device_type)).fetchone()
             except sqlite3.Error as exc:
@@ -932,7 +1926,7 @@ class Database:
         if not row:
             return None
         return {'is_randomized': bool(row[0]), 'best_rssi': row[1],
-                'is_snooper': bool(row[2]), 'name': row[3], 'vendor': row[4]}
+                'is_snooper': bool(row[2]), 'name': row[3], 'vendor': row[4], 'id': row[5]}
 
     def get_aircraft_info(self, icao24):
         with self.db_lock:
@@ -954,31 +1948,173 @@ class Database:
                      (icao24.lower(), (info or {}).get('registration'), (info or {}).get('type'),
                       (info or {}).get('owner'), status, fmt_ts()))
 
-    def prune_old_data(self, days, vacuum=False):
+    def get_wigle_location(self, ssid, now=None):
+        """(coords or None) for an unexpired WiGLE answer, or False when there is none."""
+        with self.db_lock:
+            try:
+                row = self._connection.execute(
+                    'SELECT latitude, longitude, status FROM wigle_cache '
+                    'WHERE ssid = ? AND expires > ?',
+                    (ssid, time.time() if now is None else now)).fetchone()
+            except sqlite3.Error as exc:
+                LOG.error('[SnoopR] get_wigle_location error: %s', exc)
+                return False
+        if row is None:
+            return False
+        return valid_coords(row[0], row[1]) if row[2] == 'ok' else None
+
+    def store_wigle_location(self, ssid, coords, ttl):
+        """Not through _update: a cache row is not dashboard data, and bumping
+        data_version would invalidate every data.json ETag on each WiGLE answer."""
+        with self.db_lock:
+            try:
+                with self._connection:
+                    self._connection.execute(
+                        'INSERT OR REPLACE INTO wigle_cache '
+                        '(ssid, latitude, longitude, status, expires) VALUES (?, ?, ?, ?, ?)',
+                        (ssid, coords[0] if coords else None, coords[1] if coords else None,
+                         'ok' if coords else 'notfound', time.time() + ttl))
+            except sqlite3.Error as exc:
+                LOG.error('[SnoopR] store_wigle_location error: %s', exc)
+
+    def prune_old_data(self, days):
+        """Drop every detections partition that ended more than `days` ago. Retention is
+        therefore partition-granular: rows live between `days` and `days` plus one
+        partition period. Networks and sessions no detection refers to any more are
+        found through detection_refs, so nothing here scans or deletes detections."""
         if days is None or days < 1:
             LOG.warning('[SnoopR] prune_days=%s is invalid; skipping prune', days)
             return
         with self.db_lock:
             try:
-                cutoff = cutoff_ts(days)
+                now = time.time()
+                cutoff = now - days * 86400
                 with self._connection:
-                    self._connection.execute('DELETE FROM detections WHERE timestamp < ?',
-                                             (cutoff,))
-                    self._connection.execute(
-                        'DELETE FROM networks WHERE id NOT IN '
-                        '(SELECT DISTINCT network_id FROM detections)')
-                    self._connection.execute(
-                        'DELETE FROM sessions WHERE id NOT IN '
-                        '(SELECT DISTINCT session_id FROM detections)')
-                    self._connection.execute(
+                    cur = self._connection
+                    expired = [p[1] for p in self._partitions if p[2] <= cutoff]
+                    cur.execute('DELETE FROM temp.prune_networks')
+                    cur.execute('DELETE FROM temp.prune_sessions')
+                    if expired:
+                        # Later partitions are seeded from this once the last holder of
+                        # the highest id is gone.
+                        cur.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                                    ('detection_id_high_water', str(self._id_high_water(cur))))
+                        marks = ','.join('?' * len(expired))
+                        cur.execute('INSERT OR IGNORE INTO temp.prune_networks (id) SELECT '
+                                    'network_id FROM detection_refs WHERE part IN (%s)' % marks,
+                                    expired)
+                        cur.execute('INSERT OR IGNORE INTO temp.prune_sessions (id) SELECT '
+                                    'session_id FROM detection_refs WHERE part IN (%s)' % marks,
+                                    expired)
+                        cur.execute('DELETE FROM detection_refs WHERE part IN (%s)' % marks,
+                                    expired)
+                        cur.execute('DELETE FROM detection_partitions WHERE name IN (%s)' % marks,
+                                    expired)
+                        self._partitions = [p for p in self._partitions if p[1] not in expired]
+                        self._rebuild_detections_view(cur)
+                        for name in expired:
+                            cur.execute('DROP TABLE %s' % name)
+                        self._ensure_partition(cur, now)
+                        cur.execute('DELETE FROM networks WHERE id IN '
+                                    '(SELECT id FROM temp.prune_networks) AND NOT EXISTS '
+                                    '(SELECT 1 FROM detection_refs r WHERE r.network_id = networks.id)')
+                        cur.execute('DELETE FROM sessions WHERE id IN '
+                                    '(SELECT id FROM temp.prune_sessions) AND NOT EXISTS '
+                                    '(SELECT 1 FROM detection_refs r WHERE r.session_id = sessions.id)')
+                        for table in ('dirty_devices', 'device_state', 'network_summary'):
+                            cur.execute('DELETE FROM %s WHERE network_id IN '
+                                        '(SELECT id FROM temp.prune_networks) AND NOT EXISTS '
+                                        '(SELECT 1 FROM networks n WHERE n.id = %s.network_id)'
+                                        % (table, table))
+                        self._trim_network_summary(cur)
+                    cur.execute(
                         "DELETE FROM aircraft_info WHERE status = 'notfound' AND last_updated < ?",
                         (cutoff_ts(7),))
-                if vacuum:
+                    # Expiry is what bounds wigle_cache: inserts are capped by the
+                    # worker's request budget.
+                    cur.execute('DELETE FROM wigle_cache WHERE expires <= ?', (now,))
+                self.data_version += 1
+                if expired:
+                    # Pruned networks may be re-created under new ids.
+                    self.id_cache.clear()
+                LOG.info('[SnoopR] pruned data older than %s days (%d partitions dropped)',
+                         days, len(expired))
+            except sqlite3.Error as exc:
+                self._load_partitions(self._connection)
+                LOG.error('[SnoopR] prune error: %s', exc)
+
+    def _trim_network_summary(self, cur):
+        """Correct the summaries of networks that lost their oldest rows. Counts come
+        from detection_refs; first_ts is one index probe into the oldest partition
+        still holding the network. The newest rows are never pruned, so last_ts and
+        last_session_id stay as they are, but the last fix may have been: a device seen
+        only without GPS since then falls back to its newest surviving fix, or none."""
+        cur.execute('''
+            UPDATE network_summary SET
+                hits = (SELECT SUM(r.hits) FROM detection_refs r
+                        WHERE r.network_id = network_summary.network_id),
+                sessions_count = (SELECT COUNT(DISTINCT r.session_id) FROM detection_refs r
+                                  WHERE r.network_id = network_summary.network_id),
+                (last_lat, last_lon, last_rssi) = (
+                    SELECT d.latitude, d.longitude, d.signal_strength FROM detections d
+                    WHERE d.network_id = network_summary.network_id
+                      AND d.latitude IS NOT NULL
+                    ORDER BY d.timestamp DESC, d.id DESC LIMIT 1)
+            WHERE network_id IN (SELECT id FROM temp.prune_networks)''')
+        oldest = {}
+        for net_id, name in cur.execute('''
+                SELECT r.network_id, p.name FROM detection_refs r
+                JOIN detection_partitions p ON p.name = r.part
+                WHERE r.network_id IN (SELECT id FROM temp.prune_networks)
+                ORDER BY p.first_id DESC''').fetchall():
+            oldest[net_id] = name
+        by_partition = defaultdict(list)
+        for net_id, name in oldest.items():
+            by_partition[name].append((net_id,))
+        typed = {p[1]: p[3] for p in self._partitions}
+        for name, ids in by_partition.items():
+            first = ("datetime(MIN(d.timestamp), 'unixepoch')" if typed.get(name)
+                     else 'MIN(d.timestamp)')
+            cur.executemany('UPDATE network_summary SET first_ts = (SELECT %s '
+                            'FROM %s d WHERE d.network_id = network_summary.network_id) '
+                            'WHERE network_id = ?' % (first, name), ids)
+
+    def reclaim_space(self, convert=False):
+        """Give pages freed by dropped partitions back to the filesystem a step at a time,
+        releasing db_lock between steps; this replaces the full VACUUM that used to stall
+        every writer for minutes. Databases created before incremental auto-vacuum need
+        one full VACUUM to switch over, which only runs when `convert` is set."""
+        with self.db_lock:
+            try:
+                mode = self._connection.execute('PRAGMA auto_vacuum').fetchone()[0]
+                if mode != 2:
+                    if not convert:
+                        return 0
+                    LOG.info('[SnoopR] converting database to incremental auto-vacuum')
+                    self._connection.execute('PRAGMA auto_vacuum=INCREMENTAL')
                     # VACUUM cannot run inside a transaction.
                     self._connection.execute('VACUUM')
-                LOG.info('[SnoopR] pruned data older than %s days (vacuum=%s)', days, vacuum)
+                    return 0
             except sqlite3.Error as exc:
-                LOG.error('[SnoopR] prune error: %s', exc)
+                LOG.error('[SnoopR] reclaim_space error: %s', exc)
+                return 0
+        released = 0
+        while True:
+            with self.db_lock:
+                try:
+                    free = self._connection.execute('PRAGMA freelist_count').fetchone()[0]
+                    if not free:
+                        break
+                    step = min(free, self.VACUUM_STEP_PAGES)
+                    # executescript: a plain execute() frees a single page per call.
+                    self._connection.executescript('PRAGMA incremental_vacuum(%d);' % step)
+                    released += step
+                except sqlite3.Error as exc:
+                    LOG.error('[SnoopR] reclaim_space error: %s', exc)
+                    break
+        if released:
+            LOG.info('[SnoopR] released %d free pages', released)
+        return released
 
 
 # ---------------------------------------------------------------------
@@ -1009,6 +2145,178 @@ def make_detection(mac, type_, name, device_type, vendor='Unknown', classificati
 
 MESH_MAGIC = b'SNP7'
 MESH_MAX_SKEW = 120  # seconds
+MESH_MAX_FRAME = 60000  # bytes, sealed
+MESH_FRAME_RECORDS = 200  # parse_frame ignores anything past this per frame
+
+# Compact payload (what the AES-GCM/HMAC envelope carries when mesh_wire_format is
+# "compact"). JSON payloads start with '[' or '{', so the first byte tells them apart:
+#   marker 0xC7, version, flags (bit 0: body is zlib), body
+#   body: u16 string count, strings as u8 length + UTF-8 (the per-frame intern table),
+#         u16 record count, records
+#   record: u8 kind (bits 0-1 device type, 0x04 MAC in table, 0x08 rssi, 0x10 fix),
+#           6-byte MAC or u16 string index, [i8 rssi], [i32 lat, i32 lon in 1e-6 deg],
+#           u16 channel, u16 x6 string indices (type, name, vendor, encryption,
+#           auth_mode, altitude)
+MESH_COMPACT_MARKER = 0xC7
+MESH_COMPACT_VERSION = 1
+MESH_COMPACT_ZLIB = 0x01
+MESH_DEVICE_TYPES = ('wifi', 'bluetooth', 'aircraft')
+MESH_STRING_FIELDS = ('type', 'name', 'vendor', 'encryption', 'auth_mode', 'altitude')
+MESH_COORD_SCALE = 1e6
+MESH_MAX_PAYLOAD = 1 << 20  # decompression limit
+
+_MESH_MAC_RE = re.compile(r'^[0-9A-F]{2}(?::[0-9A-F]{2}){5}$')
+_MESH_TAIL = struct.Struct('!H6H')
+_MESH_FIX = struct.Struct('!ii')
+
+
+def encode_mesh_payload(items, compress=True):
+    """Pack broadcast dicts (the keys flush_detection_buffer sends) into the compact
+    format. Every key name and repeated vendor/SSID string cost bytes in each JSON
+    record; here they are interned once per frame."""
+    strings, index = [], {}
+
+    def intern(value):
+        value = '' if value is None else str(value)
+        slot = index.get(value)
+        if slot is None:
+            slot = index[value] = len(strings)
+            raw = value.encode('utf-8')
+            if len(raw) > 255:
+                # Cut on a character boundary; a split sequence would be lost on decode.
+                raw = raw[:255].decode('utf-8', 'ignore').encode('utf-8')
+            strings.append(raw)
+        return slot
+
+    records = []
+    for item in items:
+        device_type = item.get('device_type')
+        if device_type not in MESH_DEVICE_TYPES:
+            continue
+        kind = MESH_DEVICE_TYPES.index(device_type)
+        mac = norm_mac(item.get('mac'))
+        if _MESH_MAC_RE.match(mac):
+            part = bytes.fromhex(mac.replace(':', ''))
+        else:
+            kind |= 0x04
+            part = struct.pack('!H', intern(str(item.get('mac', ''))[:32]))
+        rssi = safe_float(item.get('signal_strength'))
+        if rssi is not None and isfinite(rssi):
+            kind |= 0x08
+            part += struct.pack('!b', max(-127, min(0, int(rssi))))
+        coords = valid_coords(item.get('latitude'), item.get('longitude'))
+        if coords:
+            kind |= 0x10
+            part += _MESH_FIX.pack(int(round(coords[0] * MESH_COORD_SCALE)),
+                                   int(round(coords[1] * MESH_COORD_SCALE)))
+        try:
+            channel = max(0, min(0xFFFF, int(item.get('channel') or 0)))
+        except (TypeError, ValueError):
+            channel = 0
+        part += _MESH_TAIL.pack(channel, *[intern(item.get(k, '')) for k in MESH_STRING_FIELDS])
+        records.append(bytes((kind,)) + part)
+    if len(strings) > 0xFFFF:
+        raise ValueError('too many distinct strings for one frame')
+    body = b''.join([struct.pack('!H', len(strings))]
+                    + [bytes((len(raw),)) + raw for raw in strings]
+                    + [struct.pack('!H', len(records))] + records)
+    flags = 0
+    if compress and len(body) > 256:
+        packed = zlib.compress(body, 6)
+        if len(packed) < len(body):
+            body, flags = packed, MESH_COMPACT_ZLIB
+    return bytes((MESH_COMPACT_MARKER, MESH_COMPACT_VERSION, flags)) + body
+
+
+def decode_mesh_payload(payload):
+    """Inverse of encode_mesh_payload, and the JSON frames older peers send. Returns a
+    list of dicts for MeshNetwork._validate; malformed input raises ValueError."""
+    if payload[:1] != bytes((MESH_COMPACT_MARKER,)):
+        data = json.loads(payload.decode('utf-8'))
+        return data if isinstance(data, list) else [data]
+    if len(payload) < 3 or payload[1] != MESH_COMPACT_VERSION:
+        raise ValueError('unsupported compact mesh version')
+    body = payload[3:]
+    if payload[2] & MESH_COMPACT_ZLIB:
+        inflater = zlib.decompressobj()
+        try:
+            body = inflater.decompress(body, MESH_MAX_PAYLOAD)
+        except zlib.error as exc:
+            raise ValueError('bad zlib body: %s' % exc)
+        if inflater.unconsumed_tail:
+            raise ValueError('compact mesh body too large')
+    try:
+        count, = struct.unpack_from('!H', body, 0)
+        pos, strings = 2, []
+        for _ in range(count):
+            size = body[pos]
+            strings.append(body[pos + 1:pos + 1 + size].decode('utf-8', 'ignore'))
+            pos += 1 + size
+        count, = struct.unpack_from('!H', body, pos)
+        pos += 2
+        items = []
+        for _ in range(count):
+            kind = body[pos]
+            pos += 1
+            if kind & 0x04:
+                mac = strings[struct.unpack_from('!H', body, pos)[0]]
+                pos += 2
+            else:
+                mac = ':'.join('%02X' % b for b in body[pos:pos + 6])
+                pos += 6
+            item = {'mac': mac, 'device_type': MESH_DEVICE_TYPES[kind & 0x03],
+                    'signal_strength': None, 'latitude': '-', 'longitude': '-'}
+            if kind & 0x08:
+                item['signal_strength'] = struct.unpack_from('!b', body, pos)[0]
+                pos += 1
+            if kind & 0x10:
+                lat, lon = _MESH_FIX.unpack_from(body, pos)
+                item['latitude'] = lat / MESH_COORD_SCALE
+                item['longitude'] = lon / MESH_COORD_SCALE
+                pos += _MESH_FIX.size
+            tail = _MESH_TAIL.unpack_from(body, pos)
+            pos += _MESH_TAIL.size
+            item['channel'] = tail[0]
+            for name, slot in zip(MESH_STRING_FIELDS, tail[1:]):
+                item[name] = strings[slot]
+            items.append(item)
+    except (struct.error, IndexError) as exc:
+        raise ValueError('truncated compact mesh payload: %s' % exc)
+    if pos != len(body):
+        raise ValueError('trailing bytes after compact mesh payload')
+    return items
+
+
+class NonceWindow:
+    """Replay cache for mesh nonces, one set per `bucket` seconds of send time.
+
+    A frame is only accepted within MESH_MAX_SKEW of its authenticated send time, and a
+    replay carries the same send time, so a nonce only has to be looked up in its own
+    bucket and a bucket can go once it is older than the skew. The fixed 4096-entry
+    deque this replaced forgot nonces still inside the window above ~34 frames/s;
+    memory now follows the actual frame rate."""
+
+    def __init__(self, horizon=MESH_MAX_SKEW, bucket=5):
+        self.horizon = horizon
+        self.bucket = bucket
+        self.buckets = {}
+        self.pruned_at = 0.0
+
+    def __len__(self):
+        return sum(len(seen) for seen in self.buckets.values())
+
+    def add(self, nonce, sent_at, now):
+        """Remember the nonce; False when it was already seen (a replay)."""
+        if now - self.pruned_at >= self.bucket:
+            self.pruned_at = now
+            oldest = int((now - self.horizon) // self.bucket)
+            for key in [k for k in self.buckets if k < oldest]:
+                del self.buckets[key]
+        seen = self.buckets.setdefault(int(sent_at // self.bucket), set())
+        if nonce in seen:
+            return False
+        seen.add(nonce)
+        return True
 
 
 class MeshNetwork:
@@ -1016,7 +2324,8 @@ class MeshNetwork:
     and, when `cryptography` is present, AES-GCM encrypted. Unauthenticated frames used to
     be inserted straight into the database."""
 
-    def __init__(self, host_ip, port, peers, shared_key, has_crypto, allow_plaintext=False):
+    def __init__(self, host_ip, port, peers, shared_key, has_crypto, allow_plaintext=False,
+                 wire_format='compact', resend_after=300, delta_rssi=3):
         if not shared_key:
             raise ValueError('mesh_key is required when mesh_enabled = true')
         self.host_ip = host_ip
@@ -1034,15 +2343,25 @@ class MeshNetwork:
                                    'authenticated but not encrypted)')
             LOG.warning('[SnoopR] mesh payloads are authenticated but NOT encrypted '
                         '(cryptography missing)')
-        self._seen_nonces = deque(maxlen=4096)
-        self._seen_set = set()
+        self.compact = wire_format != 'json'
+        self.resend_after = float(resend_after)
+        self.delta_rssi = int(delta_rssi)
+        # Per peer: (mac, device_type) -> (name, rssi, lat, lon, sent_at) last broadcast.
+        self._sent = {peer: LRUDict(8192) for peer in self.peers}
+        self._sent_lock = Lock()
+        self._nonces = NonceWindow()
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.socket.bind((host_ip, self.port))
-        self.socket.settimeout(1.0)
+        # MeshReceiver hands this socket to an asyncio datagram endpoint, and sends go
+        # through that endpoint too (see `sender`).
+        self.socket.setblocking(False)
+        # Set by MeshReceiver while its transport is up: takes [(frame, addr), ...] and
+        # returns False when it cannot, in which case nothing is marked as sent.
+        self.sender = None
 
     # -- framing -------------------------------------------------------
-    def _seal(self, plaintext):
+    def _seal(self, plaintext, now=None):
         if self.has_crypto:
             iv = os.urandom(12)
             cipher = Cipher(algorithms.AES(self.cipher_key), modes.GCM(iv), backend=self.backend)
@@ -1051,11 +2370,12 @@ class MeshNetwork:
             payload = b'\x01' + iv + enc.tag + body
         else:
             payload = b'\x00' + plaintext
-        header = MESH_MAGIC + struct.pack('!d', time.time()) + os.urandom(8)
+        sent_at = time.time() if now is None else now
+        header = MESH_MAGIC + struct.pack('!d', sent_at) + os.urandom(8)
         frame = header + payload
         return frame + hmac.new(self.digest_key, frame, hashlib.sha256).digest()[:16]
 
-    def _open(self, frame):
+    def _open(self, frame, now=None):
         if len(frame) < 4 + 8 + 8 + 1 + 16:
             raise ValueError('frame too short')
         body, tag = frame[:-16], frame[-16:]
@@ -1065,15 +2385,12 @@ class MeshNetwork:
         if body[:4] != MESH_MAGIC:
             raise ValueError('bad magic')
         sent_at = struct.unpack('!d', body[4:12])[0]
-        if abs(time.time() - sent_at) > MESH_MAX_SKEW:
+        if now is None:
+            now = time.time()
+        if abs(now - sent_at) > MESH_MAX_SKEW:
             raise ValueError('stale frame')
-        nonce = body[12:20]
-        if nonce in self._seen_set:
+        if not self._nonces.add(body[12:20], sent_at, now):
             raise ValueError('replayed frame')
-        if len(self._seen_nonces) == self._seen_nonces.maxlen:
-            self._seen_set.discard(self._seen_nonces[0])
-        self._seen_nonces.append(nonce)
-        self._seen_set.add(nonce)
         payload = body[20:]
         if payload[:1] == b'\x01':
             if not self.has_crypto:
@@ -1088,22 +2405,84 @@ class MeshNetwork:
         return payload[1:]
 
     # -- io ------------------------------------------------------------
+    def _signature(self, item):
+        rssi = safe_float(item.get('signal_strength'))
+        if rssi is not None and not isfinite(rssi):
+            rssi = None
+        coords = valid_coords(item.get('latitude'), item.get('longitude'))
+        # ~11 m: closer than GPS noise, so a parked device is not resent every flush.
+        return (item.get('name'), None if rssi is None else int(rssi),
+                round(coords[0], 4) if coords else None,
+                round(coords[1], 4) if coords else None)
+
+    def _unchanged(self, previous, signature, now):
+        if previous is None or now - previous[4] >= self.resend_after:
+            return False
+        if previous[0] != signature[0] or previous[2:4] != signature[2:4]:
+            return False
+        if (previous[1] is None) != (signature[1] is None):
+            return False
+        return previous[1] is None or abs(previous[1] - signature[1]) < self.delta_rssi
+
+    def _frames(self, items):
+        """Sealed frames of at most MESH_FRAME_RECORDS items; a frame that still seals
+        over MESH_MAX_FRAME is split rather than dropped."""
+        for offset in range(0, len(items), MESH_FRAME_RECORDS):
+            todo = [items[offset:offset + MESH_FRAME_RECORDS]]
+            while todo:
+                chunk = todo.pop()
+                if self.compact:
+                    payload = encode_mesh_payload(chunk)
+                else:
+                    payload = json.dumps(chunk, separators=(',', ':')).encode('utf-8')
+                frame = self._seal(payload)
+                if len(frame) <= MESH_MAX_FRAME:
+                    yield frame
+                elif len(chunk) > 1:
+                    half = len(chunk) // 2
+                    todo.extend((chunk[half:], chunk[:half]))
+                else:
+                    LOG.debug('[SnoopR] mesh record too large (%d bytes), skipping',
+                              len(frame))
+
     def broadcast_detections(self, detections):
+        """Send each peer the detections it has not already been sent with the same
+        name, position and (within delta_rssi) signal; everything is resent after
+        resend_after seconds so a peer that restarted catches up."""
         if not self.peers or not detections:
             return
-        try:
-            frame = self._seal(json.dumps(detections, separators=(',', ':')).encode('utf-8'))
-        except Exception as exc:  # noqa: BLE001 - never let mesh break scanning
-            LOG.error('[SnoopR] mesh seal failed: %s', exc)
-            return
-        if len(frame) > 60000:
-            LOG.debug('[SnoopR] mesh frame too large (%d bytes), skipping', len(frame))
-            return
-        for peer in self.peers:
+        now = time.time()
+        signatures = [self._signature(item) for item in detections]
+        keys = [(item.get('mac'), item.get('device_type')) for item in detections]
+        targets = defaultdict(list)
+        with self._sent_lock:
+            for peer in self.peers:
+                sent = self._sent[peer]
+                wanted = tuple(i for i, key in enumerate(keys)
+                               if not self._unchanged(sent.get(key), signatures[i], now))
+                if wanted:
+                    targets[wanted].append(peer)
+        # Peers normally want the same records, so each distinct set is sealed once.
+        for wanted, peers in targets.items():
             try:
-                self.socket.sendto(frame, (peer, self.port))
-            except OSError as exc:
-                LOG.debug('[SnoopR] mesh send to %s failed: %s', peer, exc)
+                frames = list(self._frames([detections[i] for i in wanted]))
+            except Exception as exc:  # noqa: BLE001 - never let mesh break scanning
+                LOG.error('[SnoopR] mesh seal failed: %s', exc)
+                continue
+            for peer in peers:
+                # A direct sendto on the non-blocking socket failed with EAGAIN once a
+                # flush filled the send buffer and gave up on the peer's other frames;
+                # the event loop's transport queues them instead.
+                sender = self.sender
+                if sender is None or not sender([(frame, (peer, self.port))
+                                                 for frame in frames]):
+                    LOG.debug('[SnoopR] mesh receiver not running; %d frame(s) for %s '
+                              'held back', len(frames), peer)
+                    continue
+                with self._sent_lock:
+                    sent = self._sent[peer]
+                    for i in wanted:
+                        sent[keys[i]] = signatures[i] + (now,)
 
     REQUIRED = ('mac', 'device_type')
 
@@ -1136,27 +2515,16 @@ class MeshNetwork:
             auth_mode=str(item.get('auth_mode', ''))[:32],
             altitude=str(item.get('altitude', '-'))[:16])
 
-    def receive_once(self, db, session_id):
-        try:
-            frame, addr = self.socket.recvfrom(65535)
-        except (socket.timeout, BlockingIOError):
-            return 0
-        except OSError:
-            return 0
-        try:
-            payload = json.loads(self._open(frame).decode('utf-8'))
-        except Exception as exc:  # noqa: BLE001
-            LOG.debug('[SnoopR] mesh frame from %s rejected: %s', addr[0], exc)
-            return 0
-        items = payload if isinstance(payload, list) else [payload]
+    def parse_frame(self, frame, session_id):
+        """Authenticate, decrypt and validate one datagram into detection tuples stamped
+        with our session. Raises ValueError (or a crypto error) for a frame to reject."""
+        items = decode_mesh_payload(self._open(frame))
         batch = []
-        for item in items[:200]:
+        for item in items[:MESH_FRAME_RECORDS]:
             det = self._validate(item)
             if det:
                 batch.append(det[:18] + (session_id, det[19]))
-        if batch:
-            db.add_detection_batch(batch)
-        return len(batch)
+        return batch
 
     def close(self):
         try:
@@ -1165,20 +2533,150 @@ class MeshNetwork:
             pass
 
 
+class MeshProtocol(asyncio.DatagramProtocol):
+    """Only queues datagrams; opening and writing happen off the event loop."""
+
+    def __init__(self, receiver):
+        self.receiver = receiver
+
+    def datagram_received(self, data, addr):
+        self.receiver.enqueue(data, addr)
+
+    def error_received(self, exc):
+        LOG.debug('[SnoopR] mesh socket error: %s', exc)
+
+
 class MeshReceiver(threading.Thread):
-    """The 6.x code had a receive method that was never called."""
+    """Runs an asyncio loop around the mesh socket. The polling loop it replaced woke
+    once a second, handled a single datagram per wake-up and wrote every frame in its
+    own transaction. Now every datagram is queued as it arrives, queued frames are
+    authenticated, decrypted and validated together on a worker thread, and the
+    detections of all frames in a flush interval reach the database as one batch."""
 
-    def __init__(self, plugin):
+    MAX_PENDING = 4096  # frames waiting to be opened; more than this are dropped
+
+    def __init__(self, plugin, flush_interval=1.0):
         super().__init__(daemon=True, name='snoopr-mesh')
         self.plugin = plugin
+        self.flush_interval = flush_interval
+        self.loop = None
+        self.pending = deque()
+        self.detections = []
+        self.stats = {'frames': 0, 'rejects': 0, 'dropped': 0, 'detections': 0,
+                      'batches': 0}
+        self._samples = deque(maxlen=10)
+        self._open_task = None
+        self.transport = None
+        # A single worker: _open's nonce bookkeeping is not thread-safe, and HMAC and
+        # AES-GCM release the GIL, so one thread is enough to keep up.
+        self.executor = ThreadPoolExecutor(max_workers=1,
+                                           thread_name_prefix='snoopr-mesh-open')
+
+    # -- event loop ----------------------------------------------------
+    def enqueue(self, data, addr):
+        if len(self.pending) >= self.MAX_PENDING:
+            self.stats['dropped'] += 1
+            return
+        self.pending.append((data, addr))
+        if self._open_task is None:
+            self._open_task = self.loop.create_task(self._open_pending())
 
-    def run(self):
-        while not self.plugin.stop_event.is_set():
+    async def _open_pending(self):
+        try:
+            while self.pending:
+                frames = list(self.pending)
+                self.pending.clear()
+                batch, rejects = await self.loop.run_in_executor(
+                    self.executor, self._open_frames, frames)
+                self.detections.extend(batch)
+                self.stats['frames'] += len(frames)
+                self.stats['rejects'] += rejects
+        except Exception as exc:  # noqa: BLE001
+            LOG.error('[SnoopR] mesh open error: %s', exc)
+        finally:
+            self._open_task = None
+
+    async def _flush(self):
+        if not self.detections:
+            return
+        batch, self.detections = self.detections, []
+        await self.loop.run_in_executor(None, self.plugin.db.add_detection_batch, batch)
+        self.stats['detections'] += len(batch)
+        self.stats['batches'] += 1
+
+    def send(self, datagrams):
+        """MeshNetwork.sender, called from the flusher thread. The datagram transport
+        buffers whatever the socket cannot take yet."""
+        loop = self.loop
+        if self.transport is None or loop is None:
+            return False
+        try:
+            loop.call_soon_threadsafe(self._send, datagrams)
+        except RuntimeError:  # loop closed in the meantime
+            return False
+        return True
+
+    def _send(self, datagrams):
+        transport = self.transport
+        if transport is None or transport.is_closing():
+            return
+        for frame, addr in datagrams:
+            transport.sendto(frame, addr)
+
+    async def _serve(self):
+        transport, _ = await self.loop.create_datagram_endpoint(
+            lambda: MeshProtocol(self), sock=self.plugin.mesh.socket)
+        self.transport = transport
+        self.plugin.mesh.sender = self.send
+        try:
+            while not self.plugin.stop_event.is_set():
+                await asyncio.sleep(self.flush_interval)
+                self._samples.append((time.time(), self.stats['frames']))
+                try:
+                    await self._flush()
+                except Exception as exc:  # noqa: BLE001
+                    LOG.error('[SnoopR] mesh write error: %s', exc)
+            if self._open_task is not None:
+                await self._open_task
+            await self._flush()
+        finally:
+            self.plugin.mesh.sender = None
+            self.transport = None
+            transport.close()
+
+    # -- worker thread -------------------------------------------------
+    def _open_frames(self, frames):
+        mesh, session_id = self.plugin.mesh, self.plugin.session_id
+        batch, rejects = [], 0
+        for frame, addr in frames:
             try:
-                self.plugin.mesh.receive_once(self.plugin.db, self.plugin.session_id)
+                batch.extend(mesh.parse_frame(frame, session_id))
             except Exception as exc:  # noqa: BLE001
-                LOG.error('[SnoopR] mesh receiver error: %s', exc)
-                self.plugin.stop_event.wait(1.0)
+                rejects += 1
+                LOG.debug('[SnoopR] mesh frame from %s rejected: %s', addr[0], exc)
+        return batch, rejects
+
+    # -- thread --------------------------------------------------------
+    def run(self):
+        self.loop = asyncio.new_event_loop()
+        try:
+            self.loop.run_until_complete(self._serve())
+        except Exception as exc:  # noqa: BLE001
+            LOG.error('[SnoopR] mesh receiver error: %s', exc)
+        finally:
+            self.executor.shutdown(wait=False)
+            self.loop.close()
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        samples = list(self._samples)
+        rate = None
+        if len(samples) > 1 and samples[-1][0] > samples[0][0]:
+            rate = round((samples[-1][1] - samples[0][1]) / (samples[-1][0] - samples[0][0]), 1)
+        stats['frames_per_s'] = rate
+        stats['queued_frames'] = len(self.pending)
+        stats['queued_detections'] = len(self.detections)
+        return stats
 
 
 # ---------------------------------------------------------------------
@@ -1281,43 +2779,400 @@ class OpenSkyClient:
 
 class LocalAircraftDB:
     """Offline fallback: a CSV with icao24,registration,typecode,owner-ish columns
-    (the standard crowd-sourced aircraft database export)."""
-
-    def __init__(self, path):
+    (the standard crowd-sourced aircraft database export).
+
+    The CSV is converted once into a sorted binary index that lookups binary-search
+    through mmap. Loading the ~500k-row export into a dict of dicts used to take well
+    over 150 MB and tens of seconds on a Pi Zero 2; now startup reads nothing and only
+    the pages a lookup touches become resident. Index layout (big-endian):
+        header  4s magic, B version, 3x, I count, q source size, q source mtime_ns
+        keys    count x 3-byte ICAO, ascending
+        offsets (count + 1) x I into the blob
+        blob    registration US type US owner, UTF-8, per record
+    The CSV is stat()ed again at most every CHECK_INTERVAL seconds, and the index is
+    rebuilt when its size or mtime no longer match the header."""
+
+    MAGIC = b'SNPA'
+    VERSION = 1
+    HEADER = struct.Struct('!4sB3xIqq')
+    SEPARATOR = b'\x1f'
+    CHECK_INTERVAL = 300
+    # Rows sorted in memory per run during conversion; runs are merged from disk.
+    SORT_RUN = 50000
+    RUN_RECORD = struct.Struct('!3sI')
+
+    def __init__(self, path, cache_dir=None):
         self.path = path
-        self.rows = {}
-        self.load()
+        self.index_path = os.path.join(cache_dir or os.path.dirname(os.path.abspath(path)),
+                                       os.path.basename(path) + '.idx')
+        self.count = 0
+        self._map = None
+        self._source = None
+        self._lock = Lock()
+        self._loading = False
+        self._next_check = 0.0
 
     def load(self):
+        """Open the index, converting the CSV first if the index is missing or stale.
+        Runs on a lookup (a metadata worker thread), not at plugin load, and without
+        self._lock held: lookups keep using the previous index while a new one is built."""
         if not self.path or not os.path.exists(self.path):
             return
         try:
-            with open(self.path, 'r', encoding='utf-8', errors='ignore', newline='') as handle:
-                reader = csv.DictReader(handle)
-                for row in reader:
-                    key = (row.get('icao24') or row.get('icao') or row.get('ModeS') or '').lower()
-                    if not key:
-                        continue
-                    self.rows[key.strip("'").strip()] = {
-                        'registration': (row.get('registration') or row.get('Registration')
-                                         or '').strip(),
-                        'type': (row.get('typecode') or row.get('ICAOTypeCode')
-                                 or row.get('model') or '').strip(),
-                        'owner': (row.get('owner') or row.get('operator')
-                                  or row.get('RegisteredOwners') or '').strip(),
-                    }
-            LOG.info('[SnoopR] loaded %d local aircraft records', len(self.rows))
-        except (OSError, csv.Error) as exc:
-            LOG.error('[SnoopR] aircraft CSV load failed: %s', exc)
+            st = os.stat(self.path)
+            if self._source == (st.st_size, st.st_mtime_ns):
+                return
+            if not self._open_index(st):
+                started = time.time()
+                count = self._convert(st)
+                LOG.info('[SnoopR] indexed %d local aircraft records in %.1fs (%s)',
+                         count, time.time() - started, self.index_path)
+                self._open_index(st)
+        except (OSError, csv.Error, ValueError) as exc:
+            LOG.error('[SnoopR] aircraft CSV index failed: %s', exc)
+
+    def _open_index(self, st):
+        try:
+            with open(self.index_path, 'rb') as handle:
+                mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return False
+        if len(mapped) < self.HEADER.size:
+            mapped.close()
+            return False
+        magic, version, count, size, mtime_ns = self.HEADER.unpack_from(mapped, 0)
+        if (magic != self.MAGIC or version != self.VERSION or size != st.st_size
+                or mtime_ns != st.st_mtime_ns
+                or len(mapped) < self.HEADER.size + count * 7 + 4):
+            mapped.close()
+            return False
+        # The old map is not closed here: a lookup may still be searching it, and it
+        # is unmapped once the last reference goes.
+        with self._lock:
+            self._map, self.count = mapped, count
+            self._source = (size, mtime_ns)
+        return True
+
+    def _rows(self):
+        """(3-byte key, record) per usable CSV row, in file order."""
+        with open(self.path, 'r', encoding='utf-8', errors='ignore', newline='') as handle:
+            for row in csv.DictReader(handle):
+                key = (row.get('icao24') or row.get('icao') or row.get('ModeS') or '')
+                key = key.lower().strip("'").strip()
+                if not re.match(r'^[0-9a-f]{6}$', key):
+                    continue
+                fields = (
+                    (row.get('registration') or row.get('Registration') or '').strip(),
+                    (row.get('typecode') or row.get('ICAOTypeCode') or row.get('model')
+                     or '').strip(),
+                    (row.get('owner') or row.get('operator') or row.get('RegisteredOwners')
+                     or '').strip(),
+                )
+                yield bytes.fromhex(key), self.SEPARATOR.join(
+                    f.replace('\x1f', ' ').encode('utf-8') for f in fields)
+
+    def _write_run(self, rows, directory):
+        # Stable sort, so a key repeated within the run keeps its file order.
+        rows.sort(key=lambda row: row[0])
+        run = tempfile.TemporaryFile(dir=directory)
+        for key, record in rows:
+            run.write(self.RUN_RECORD.pack(key, len(record)))
+            run.write(record)
+        run.seek(0)
+        return run
+
+    def _read_run(self, run):
+        size = self.RUN_RECORD.size
+        while True:
+            head = run.read(size)
+            if len(head) < size:
+                return
+            key, length = self.RUN_RECORD.unpack(head)
+            yield key, run.read(length)
+
+    def _convert(self, st):
+        """Sort the CSV in runs of SORT_RUN rows spilled to temporary files, then merge
+        the runs straight into the index. Only one run and the key and offset arrays
+        (about 7 bytes per aircraft) are ever in memory. As with a dict, the last row
+        for a repeated ICAO wins."""
+        directory = os.path.dirname(self.index_path)
+        runs, rows = [], []
+        try:
+            for row in self._rows():
+                rows.append(row)
+                if len(rows) >= self.SORT_RUN:
+                    runs.append(self._write_run(rows, directory))
+                    rows = []
+            runs.append(self._write_run(rows, directory))
+            del rows
+            keys, offsets, position = bytearray(), array('I'), 0
+            with tempfile.TemporaryFile(dir=directory) as blob:
+                # heapq.merge is stable across runs, so equal keys arrive in file order.
+                last_key, last_record = None, None
+                merged = heapq.merge(*(self._read_run(run) for run in runs),
+                                     key=lambda row: row[0])
+                for key, record in merged:
+                    if key != last_key and last_key is not None:
+                        keys += last_key
+                        offsets.append(position)
+                        blob.write(last_record)
+                        position += len(last_record)
+                    last_key, last_record = key, record
+                if last_key is not None:
+                    keys += last_key
+                    offsets.append(position)
+                    blob.write(last_record)
+                    position += len(last_record)
+                offsets.append(position)
+                if sys.byteorder == 'little':
+                    offsets.byteswap()
+                count = len(keys) // 3
+                tmp = self.index_path + '.tmp'
+                with open(tmp, 'wb') as out:
+                    out.write(self.HEADER.pack(self.MAGIC, self.VERSION, count, st.st_size,
+                                               st.st_mtime_ns))
+                    out.write(keys)
+                    out.write(offsets.tobytes())
+                    blob.seek(0)
+                    shutil.copyfileobj(blob, out)
+                os.replace(tmp, self.index_path)
+            return count
+        finally:
+            for run in runs:
+                run.close()
 
     def lookup(self, icao24):
-        return self.rows.get(icao24.lower())
+        now = time.time()
+        with self._lock:
+            due = not self._loading and now >= self._next_check
+            if due:
+                self._loading = True
+                self._next_check = now + self.CHECK_INTERVAL
+        if due:
+            try:
+                self.load()
+            finally:
+                with self._lock:
+                    self._loading = False
+        with self._lock:
+            mapped, count = self._map, self.count
+        if mapped is None:
+            return None
+        try:
+            needle = int(str(icao24).strip().lstrip('~'), 16).to_bytes(3, 'big')
+        except (ValueError, OverflowError):
+            return None
+        base = self.HEADER.size
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if mapped[base + 3 * mid:base + 3 * mid + 3] < needle:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == count or mapped[base + 3 * lo:base + 3 * lo + 3] != needle:
+            return None
+        table = base + 3 * count
+        start, end = struct.unpack_from('!II', mapped, table + 4 * lo)
+        blob = table + 4 * (count + 1)
+        parts = mapped[blob + start:blob + end].decode('utf-8', 'ignore').split('\x1f')
+        if len(parts) != 3:
+            return None
+        return {'registration': parts[0], 'type': parts[1], 'owner': parts[2]}
+
+
+# ---------------------------------------------------------------------
+# OUI vendor index
+# ---------------------------------------------------------------------
+
+class OuiIndex:
+    """MAC prefix -> vendor, from the Wireshark `manuf` file or IEEE `oui.txt`.
+
+    Prefixes are integers in one sorted array per mask length (24, 28, 36 bits) with a
+    parallel array of indices into an interned vendor table. The arrays are cached in
+    a binary file in base_dir and reused until the source file's size or mtime
+    changes; parsing the ~50k-line manuf text on every plugin load was most of
+    SnoopR's startup on a Pi Zero. Lookups go through int-keyed dicts built from the
+    arrays in one pass; /28 and /36 entries are only probed for the few /24 blocks
+    that have any, so a typical MAC costs one int() and one or two dict probes.
+    Cache layout (big-endian header, native arrays):
+        header  4s magic, B version, B byte order, 2x, q source size, q source mtime_ns,
+                I vendor count, 3 x I entries per mask
+        arrays  per mask: entries x Q prefix, entries x I vendor index
+        vendors vendor count x (H length, UTF-8)"""
+
+    MASKS = (36, 28, 24)  # longest match first
+    MAGIC = b'SNPO'
+    VERSION = 1
+    HEADER = struct.Struct('!4sBB2xqqI3I')
+
+    def __init__(self):
+        self.vendors = []
+        self.prefixes = {bits: array('Q') for bits in self.MASKS}
+        self.slots = {bits: array('I') for bits in self.MASKS}
+        self.tables = {bits: {} for bits in self.MASKS}
+        self.refined = frozenset()
+
+    def _build_tables(self):
+        self.tables = {bits: dict(zip(self.prefixes[bits], self.slots[bits]))
+                       for bits in self.MASKS}
+        self.refined = frozenset(
+            [p >> 4 for p in self.prefixes[28]] + [p >> 12 for p in self.prefixes[36]])
+        return self
+
+    def __len__(self):
+        return sum(len(keys) for keys in self.prefixes.values())
+
+    @classmethod
+    def load(cls, path, cache_path=None):
+        """Cached tables when they match `path`, else parse it and refresh the cache."""
+        st = os.stat(path)
+        if cache_path:
+            index = cls.read_cache(cache_path, st)
+            if index is not None:
+                return index
+        index = cls.parse(path)
+        if cache_path:
+            try:
+                index.write_cache(cache_path, st)
+            except OSError as exc:
+                LOG.debug('[SnoopR] OUI cache not written: %s', exc)
+        return index
+
+    @classmethod
+    def parse(cls, path):
+        """Understands both the Wireshark `manuf` format and IEEE `oui.txt`.
+        The 6.x parser only handled `oui.txt`, so against the documented
+        wireshark-common path it loaded zero entries."""
+        tables = {bits: {} for bits in cls.MASKS}
+        with open(path, 'r', encoding='utf-8', errors='ignore') as handle:
+            for line in handle:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                if '(hex)' in line:  # IEEE oui.txt
+                    head, _, tail = line.partition('(hex)')
+                    prefix = head.strip().replace('-', '').replace(':', '')
+                    vendor = tail.strip()
+                    bits = 24
+                else:
+                    parts = line.split('\t')
+                    if len(parts) < 2:
+                        parts = line.split(None, 2)
+                    if len(parts) < 2:
+                        continue
+                    prefix, _, mask = parts[0].partition('/')
+                    prefix = prefix.replace(':', '').replace('-', '').replace('.', '')
+                    vendor = (parts[2].strip() if len(parts) > 2 and parts[2].strip()
+                              else parts[1].strip())
+                    bits = int(mask) if mask.isdigit() else 24
+                    bits = 36 if bits >= 36 else (28 if bits >= 28 else 24)
+                nibbles = bits // 4
+                if not vendor or len(prefix) < nibbles:
+                    continue
+                try:
+                    tables[bits][int(prefix[:nibbles], 16)] = vendor
+                except ValueError:
+                    continue
+        index = cls()
+        interned = {}
+        for bits, table in tables.items():
+            for prefix in sorted(table):
+                vendor = table[prefix]
+                slot = interned.get(vendor)
+                if slot is None:
+                    slot = interned[vendor] = len(index.vendors)
+                    index.vendors.append(vendor)
+                index.prefixes[bits].append(prefix)
+                index.slots[bits].append(slot)
+        return index._build_tables()
+
+    @classmethod
+    def read_cache(cls, cache_path, st):
+        try:
+            with open(cache_path, 'rb') as handle:
+                data = handle.read()
+        except OSError:
+            return None
+        if len(data) < cls.HEADER.size:
+            return None
+        (magic, version, order, size, mtime_ns, vendor_count,
+         *counts) = cls.HEADER.unpack_from(data, 0)
+        if (magic != cls.MAGIC or version != cls.VERSION
+                or order != (sys.byteorder == 'little')
+                or size != st.st_size or mtime_ns != st.st_mtime_ns):
+            return None
+        index = cls()
+        pos = cls.HEADER.size
+        try:
+            for bits, count in zip(cls.MASKS, counts):
+                for table, width in ((index.prefixes[bits], 8), (index.slots[bits], 4)):
+                    table.frombytes(data[pos:pos + count * width])
+                    pos += count * width
+                    if len(table) != count:
+                        return None
+            for _ in range(vendor_count):
+                length, = struct.unpack_from('!H', data, pos)
+                pos += 2
+                if pos + length > len(data):
+                    return None
+                index.vendors.append(data[pos:pos + length].decode('utf-8'))
+                pos += length
+        except (struct.error, UnicodeDecodeError, ValueError):
+            return None
+        if pos != len(data):
+            return None
+        if any(slots and max(slots) >= vendor_count for slots in index.slots.values()):
+            return None
+        return index._build_tables()
+
+    def write_cache(self, cache_path, st):
+        parts = [self.HEADER.pack(self.MAGIC, self.VERSION, sys.byteorder == 'little',
+                                  st.st_size, st.st_mtime_ns, len(self.vendors),
+                                  *[len(self.prefixes[bits]) for bits in self.MASKS])]
+        for bits in self.MASKS:
+            parts.append(self.prefixes[bits].tobytes())
+            parts.append(self.slots[bits].tobytes())
+        for vendor in self.vendors:
+            raw = vendor.encode('utf-8')[:0xFFFF]
+            parts.append(struct.pack('!H', len(raw)) + raw)
+        tmp = cache_path + '.tmp'
+        with open(tmp, 'wb') as out:
+            out.write(b''.join(parts))
+        os.replace(tmp, cache_path)
+
+    def lookup_int(self, value, known_bits=48):
+        """Vendor for a MAC as a 48-bit integer, or None. known_bits < 48 when only a
+        leading part of the address is real (the rest zero padding)."""
+        oui = value >> 24
+        if oui in self.refined:
+            for bits in (36, 28):
+                if bits <= known_bits:
+                    slot = self.tables[bits].get(value >> (48 - bits))
+                    if slot is not None:
+                        return self.vendors[slot]
+        slot = self.tables[24].get(oui)
+        return None if slot is None else self.vendors[slot]
+
+    def lookup(self, mac):
+        digits = mac_hex(mac)[:12]
+        if len(digits) < 6:
+            return None
+        try:
+            return self.lookup_int(int(digits.ljust(12, '0'), 16), len(digits) * 4)
+        except ValueError:
+            return None
 
 
 # ---------------------------------------------------------------------
 # Analysis helpers
 # ---------------------------------------------------------------------
 
+def grid_cell(lat, lon, lon_scale, cell_meters=100.0):
+    return (int((lat * 111320.0) // cell_meters),
+            int((lon * 111320.0 * lon_scale) // cell_meters))
+
+
 def grid_cluster_count(points, cell_meters=100.0):
     """O(n) spatial bucketing; the 6.x implementation was O(n^2) over every detection."""
     if not points:
@@ -1326,8 +3181,7 @@ def grid_cluster_count(points, cell_meters=100.0):
     lon_scale = max(cos(radians(lat0)), 1e-6)
     cells = {}
     for lat, lon in points:
-        key = (int((lat * 111320.0) // cell_meters),
-               int((lon * 111320.0 * lon_scale) // cell_meters))
+        key = grid_cell(lat, lon, lon_scale, cell_meters)
         bucket = cells.setdefault(key, [0, 0.0, 0.0])
         bucket[0] += 1
         bucket[1] += lat
@@ -1336,22 +3190,76 @@ def grid_cluster_count(points, cell_meters=100.0):
     return len(cells), centres
 
 
-def greedy_clusters(points, radius_m, min_points=1):
+class GridIndex:
+    """Uniform spatial hash on the local metre grid of grid_cell(). With cells at least
+    as wide as the search radius, everything within the radius of a point lies in its
+    own or one of the eight neighbouring cells, so a lookup touches O(1) buckets
+    instead of every item."""
+
+    def __init__(self, cell_meters, lat0):
+        self.cell_meters = float(cell_meters)
+        self.lon_scale = max(cos(radians(lat0)), 1e-6)
+        self.cells = {}
+
+    def key(self, lat, lon):
+        return grid_cell(lat, lon, self.lon_scale, self.cell_meters)
+
+    def add(self, item, lat, lon):
+        key = self.key(lat, lon)
+        self.cells.setdefault(key, []).append(item)
+        return key
+
+    def move(self, item, old_key, lat, lon):
+        key = self.key(lat, lon)
+        if key != old_key:
+            bucket = self.cells[old_key]
+            bucket.remove(item)
+            if not bucket:
+                del self.cells[old_key]
+            self.cells.setdefault(key, []).append(item)
+        return key
+
+    def near(self, lat, lon):
+        row, col = self.key(lat, lon)
+        for dr in (-1, 0, 1):
+            for dc in (-1, 0, 1):
+                for item in self.cells.get((row + dr, col + dc), ()):
+                    yield item
+
+
+def greedy_clusters(points, radius_m, min_points=1, clusters=None):
     """Distance-based clustering. Grid bucketing splits a stationary device across a cell
     border, which used to read as "seen in two different zones"; this merges anything
-    within radius_m and drops zones that only a stray fix or two landed in."""
-    clusters = []
+    within radius_m and drops zones that only a stray fix or two landed in.
+
+    Passing `clusters` continues an earlier run: new points are folded into that list
+    in place, which gives the same result as clustering the concatenated points.
+
+    Candidate clusters come from a GridIndex over the current centroids, and the
+    earliest-created one in range wins, exactly as the linear scan over all clusters
+    did; the margin on the cell size absorbs the projection's error against haversine."""
+    clusters = [] if clusters is None else clusters
+    points = list(points)
+    if not points:
+        return [c for c in clusters if c['n'] >= min_points]
+    index = GridIndex(max(radius_m, 1.0) * 1.25,
+                      clusters[0]['lat'] if clusters else points[0][0])
+    keys = [index.add(i, c['lat'], c['lon']) for i, c in enumerate(clusters)]
     for lat, lon in points:
-        placed = False
-        for cluster in clusters:
-            if haversine(cluster['lat'], cluster['lon'], lat, lon) <= radius_m:
-                cluster['n'] += 1
-                cluster['lat'] += (lat - cluster['lat']) / cluster['n']
-                cluster['lon'] += (lon - cluster['lon']) / cluster['n']
-                placed = True
-                break
-        if not placed:
+        best = None
+        for i in index.near(lat, lon):
+            if (best is None or i < best) and \
+                    haversine(clusters[i]['lat'], clusters[i]['lon'], lat, lon) <= radius_m:
+                best = i
+        if best is None:
             clusters.append({'lat': lat, 'lon': lon, 'n': 1})
+            keys.append(index.add(len(clusters) - 1, lat, lon))
+            continue
+        cluster = clusters[best]
+        cluster['n'] += 1
+        cluster['lat'] += (lat - cluster['lat']) / cluster['n']
+        cluster['lon'] += (lon - cluster['lon']) / cluster['n']
+        keys[best] = index.move(best, keys[best], cluster['lat'], cluster['lon'])
     return [c for c in clusters if c['n'] >= min_points]
 
 
@@ -1368,6 +3276,93 @@ def count_encounters(timestamps, gap_minutes):
     return encounters
 
 
+class DeviceState:
+    """Running analysis aggregates for one device, persisted in the device_state table.
+
+    A pass folds in only detections newer than `last_id`; windows, encounters, close-range
+    zones, contact runs and trilateration samples are carried forward here instead of
+    being rebuilt from the device's whole history every update_interval. Trilateration
+    keeps the newest analysis_row_limit samples, as many fixes as a full rescan of the
+    window could read."""
+
+    def __init__(self, started_at):
+        self.started_at = started_at   # epoch; state is rebuilt once it spans analysis_days
+        self.last_id = 0
+        self.rows = 0
+        self.fixes = 0
+        self.last_fix = None           # [lat, lon, epoch]
+        self.encounters = 0
+        self.max_velocity = 0.0
+        self.recent = []               # fix epochs still inside the persistence horizon
+        self.recent_rows = []          # row epochs, only used while a device has no fixes
+        self.cell_scale = None
+        self.cells = set()
+        self.clusters = []             # greedy_clusters() output over close-range fixes
+        self.close_count = 0
+        self.close_first = None
+        self.close_last = None
+        self.close_rssi = []           # first two distinct close-range readings
+        self.close_hull = []
+        self.run = None                # [hull, n, start, last] of the open contact run
+        self.best_run = [0.0, 0, 0.0]  # (miles, fixes, seconds)
+        self.kalman = None             # [mu, sigma] of the backfill filter
+        self.samples = []              # [lat, lon, distance_m, epoch]
+
+    FIELDS = ('started_at', 'last_id', 'rows', 'fixes', 'last_fix', 'encounters',
+              'max_velocity', 'recent', 'recent_rows', 'cell_scale', 'cells', 'clusters',
+              'close_count', 'close_first', 'close_last', 'close_rssi', 'close_hull', 'run',
+              'best_run', 'kalman', 'samples')
+
+    def dumps(self):
+        data = {name: getattr(self, name) for name in self.FIELDS}
+        data['cells'] = sorted(self.cells)
+        return json.dumps(data, separators=(',', ':'))
+
+    @classmethod
+    def loads(cls, text):
+        if not text:
+            return None
+        try:
+            data = json.loads(text)
+        except ValueError:
+            return None
+        if not isinstance(data, dict) or 'started_at' not in data:
+            return None
+        state = cls(data['started_at'])
+        for name in cls.FIELDS:
+            if name in data:
+                setattr(state, name, data[name])
+        state.cells = {tuple(c) for c in state.cells}
+        state.close_hull = [tuple(p) for p in state.close_hull]
+        if state.run:
+            state.run[0] = [tuple(p) for p in state.run[0]]
+        return state
+
+    def prune(self, now, horizon_s, max_age_s, max_samples):
+        self.recent = [t for t in self.recent if t >= now - horizon_s]
+        self.recent_rows = [t for t in self.recent_rows if t >= now - horizon_s]
+        self.samples = [s for s in self.samples if s[3] >= now - max_age_s][-max_samples:]
+
+    def zones(self, min_points):
+        return [c for c in self.clusters if c['n'] >= min_points]
+
+    def close_run(self):
+        """Fold the open contact run into best_run; called when the chain breaks."""
+        if self.run and self.run[1] >= 2:
+            miles = polygon_diameter(self.run[0]) / METERS_PER_MILE
+            if miles > self.best_run[0]:
+                self.best_run = [miles, self.run[1], self.run[3] - self.run[2]]
+        self.run = None
+
+    def longest_run(self):
+        best = tuple(self.best_run)
+        if self.run and self.run[1] >= 2:
+            miles = polygon_diameter(self.run[0]) / METERS_PER_MILE
+            if miles > best[0]:
+                best = (miles, self.run[1], self.run[3] - self.run[2])
+        return best
+
+
 def euclidean(x1, y1, x2, y2):
     return sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2)
 
@@ -1421,6 +3416,77 @@ def nelder_mead(f, x_start, step=1.0, no_improve_thr=1e-6, no_improv_break=20,
             item[1] = f(item[0])
 
 
+def linear_position(xy, dist, weight):
+    """Closed-form start for trilateration. Each circle |p - xi|^2 = di^2 is linear in
+    (x, y, |p|^2), so one weighted least-squares solve stands in for differencing the
+    equations against a reference. Collinear drives leave it ambiguous across the road;
+    lstsq then returns the minimum-norm point, which lm_refine can walk away from."""
+    sw = np.sqrt(weight)
+    a = np.column_stack((-2.0 * xy[:, 0], -2.0 * xy[:, 1], np.ones(len(dist)))) * sw[:, None]
+    b = (dist * dist - (xy * xy).sum(axis=1)) * sw
+    sol = np.linalg.lstsq(a, b, rcond=None)[0]
+    return sol[:2]
+
+
+def lm_refine(xy, dist, weight, start, max_iter=30, tol=0.01):
+    """Levenberg-Marquardt on the weighted range residuals. Returns (point, sse, iters)
+    where sse = sum(w * (|p - xi| - di)^2)."""
+    point = np.asarray(start, dtype=float)
+    lam = 1e-3
+
+    def sse_at(p):
+        return float((weight * (np.hypot(*(p - xy).T) - dist) ** 2).sum())
+
+    sse = sse_at(point)
+    iters = 0
+    for iters in range(1, max_iter + 1):
+        delta = point - xy
+        rng = np.maximum(np.hypot(delta[:, 0], delta[:, 1]), 1e-6)
+        jac = delta / rng[:, None]
+        resid = rng - dist
+        jtw = jac.T * weight
+        hess = jtw @ jac
+        grad = jtw @ resid
+        step = None
+        while lam < 1e9:
+            try:
+                step = np.linalg.solve(hess + lam * np.diag(np.diag(hess) + 1e-9), -grad)
+            except np.linalg.LinAlgError:
+                lam *= 10.0
+                continue
+            trial = point + step
+            trial_sse = sse_at(trial)
+            if trial_sse < sse:
+                point, sse = trial, trial_sse
+                lam = max(lam / 10.0, 1e-9)
+                break
+            lam *= 10.0
+            step = None
+        if step is None or float(np.hypot(*step)) < tol:
+            break
+    return point, sse, iters
+
+
+def solve_position(projected, guess):
+    """NumPy path for trilaterate: linear solve, then LM from both it and the
+    nearest-observation guess, keeping the better fit. Returns ([x, y], mse)."""
+    arr = np.asarray(projected, dtype=float)
+    xy, dist, weight = arr[:, :2], arr[:, 2], arr[:, 3]
+    total_w = float(weight.sum()) or 1.0
+    best, best_sse = None, None
+    starts = [np.asarray(guess, dtype=float)]
+    linear = linear_position(xy, dist, weight)
+    if np.all(np.isfinite(linear)):
+        starts.insert(0, linear)
+    for start in starts:
+        point, sse, _ = lm_refine(xy, dist, weight, start)
+        if np.all(np.isfinite(point)) and (best_sse is None or sse < best_sse):
+            best, best_sse = point, sse
+    if best is None:
+        raise ValueError('no finite solution')
+    return [float(best[0]), float(best[1])], best_sse / total_w
+
+
 def trilaterate(samples, mse_threshold_m2=2500.0):
     """samples: [(lat, lon, distance_m, weight), ...].
 
@@ -1451,15 +3517,20 @@ def trilaterate(samples, mse_threshold_m2=2500.0):
     guess = [sum(p[0] for p in nearest) / len(nearest),
              sum(p[1] for p in nearest) / len(nearest)]
 
-    if HAS_SCIPY:
+    best = None
+    if HAS_NUMPY:
+        try:
+            best, mse = solve_position(projected, guess)
+        except (ValueError, ArithmeticError, np.linalg.LinAlgError) as exc:
+            LOG.debug('[SnoopR] numpy trilateration failed (%s), falling back', exc)
+    if best is None and HAS_SCIPY:
         try:
             result = minimize(objective, guess, method='Nelder-Mead',
                               options={'xatol': 0.5, 'fatol': 0.5, 'maxiter': 800})
             best, mse = list(result.x), float(result.fun)
         except Exception as exc:  # noqa: BLE001
             LOG.debug('[SnoopR] scipy trilateration failed (%s), falling back', exc)
-            best, mse = nelder_mead(objective, guess, step=25.0)
-    else:
+    if best is None:
         best, mse = nelder_mead(objective, guess, step=25.0)
 
     if mse > mse_threshold_m2:
@@ -1477,6 +3548,327 @@ def trilaterate(samples, mse_threshold_m2=2500.0):
     return lat, lon, mse
 
 
+# ---------------------------------------------------------------------
+# Device analysis (pure: runs on the analyzer thread or in analysis_workers)
+# ---------------------------------------------------------------------
+
+class AnalysisSettings:
+    """Snapshot of the options the device analysis reads. Plain attributes only, so it
+    pickles into analysis_workers processes (as a WorkerRef rebuild); taken once per
+    pass, so a config reload applies from the next pass."""
+
+    FIELDS = ('time_threshold_minutes', 'encounter_gap_minutes', 'max_contact_gap_minutes',
+              'tx_power', 'path_loss_n', 'max_plausible_velocity_mph', 'min_rssi_for_movement',
+              'min_close_separation_m', 'min_zone_fixes', 'movement_threshold',
+              'min_close_fixes', 'persistence_window_minutes', 'persistence_windows',
+              'persistence_threshold', 'min_encounters', 'require_movement_for_snooper',
+              'flag_randomized_snoopers', 'snooper_debug', 'triangulation_min_points',
+              'mse_threshold_m2', 'ignore_frozen_rssi', 'analysis_days', 'analysis_row_limit')
+
+    def __init__(self, plugin):
+        for name in self.FIELDS:
+            setattr(self, name, getattr(plugin, name))
+        exempt = plugin.snooper_exempt_zones
+        self.exempt_fences = [f for f in plugin.geofences if f.name in exempt] if exempt else []
+
+    def __reduce__(self):
+        state = dict(self.__dict__)
+        state['exempt_fences'] = [f.to_json() for f in self.exempt_fences]
+        return WorkerRef('restore_analysis_settings'), (state,)
+
+
+def restore_analysis_settings(state):
+    """Inverse of AnalysisSettings.__reduce__, run in the worker."""
+    settings = AnalysisSettings.__new__(AnalysisSettings)
+    settings.__dict__.update(state)
+    settings.exempt_fences = [Geofence.from_config(e) for e in state['exempt_fences']]
+    return settings
+
+
+def fold_rows(settings, state, rows, device_type):
+    """Fold chronological detection rows into `state`. Returns the filtered-RSSI
+    backfill pairs and whether any trilateration sample was added."""
+    velocity_window = settings.time_threshold_minutes * 60
+    encounter_gap = settings.encounter_gap_minutes * 60
+    gap_limit = settings.max_contact_gap_minutes * 60
+    tx = settings.tx_power.get(device_type, -20.0)
+    loss = settings.path_loss_n.get(device_type, 2.7)
+    # Filtered RSSI for every row that gets one, in one run over the fresh rows only.
+    filtered_rssi, kalman = kalman_run(
+        [row['rssi'] for row in rows
+         if row['timestamp'] is not None and row['lat'] is not None
+         and row['lon'] is not None and row['rssi'] is not None
+         and -100 <= row['rssi'] <= -20], state.kalman)
+    filtered_rssi = iter(filtered_rssi)
+    close_points = []
+    filtered_updates = []
+    sampled = False
+    for row in rows:
+        state.rows += 1
+        state.last_id = max(state.last_id, row['id'])
+        ts = row['timestamp']
+        if ts is None:
+            continue
+        lat, lon = row['lat'], row['lon']
+        if lat is None or lon is None:
+            state.recent_rows.append(ts)
+            continue
+        rssi = row['rssi']
+        state.fixes += 1
+        state.recent.append(ts)
+
+        # --- movement / velocity (rows are chronological now) ---
+        previous = state.last_fix
+        if previous is None:
+            state.encounters = 1
+        else:
+            seconds = ts - previous[2]
+            if 0 < seconds <= velocity_window:
+                velocity = haversine(previous[0], previous[1], lat, lon) / seconds
+                if velocity * MPS_TO_MPH <= settings.max_plausible_velocity_mph:
+                    state.max_velocity = max(state.max_velocity, velocity)
+            if seconds > encounter_gap:
+                state.encounters += 1
+        state.last_fix = [lat, lon, ts]
+
+        if state.cell_scale is None:
+            state.cell_scale = max(cos(radians(lat)), 1e-6)
+        state.cells.add(grid_cell(lat, lon, state.cell_scale))
+
+        # --- close-range evidence ---
+        if rssi is not None and rssi >= settings.min_rssi_for_movement:
+            state.close_count += 1
+            if state.close_first is None:
+                state.close_first = ts
+            state.close_last = ts
+            if len(state.close_rssi) < 2 and rssi not in state.close_rssi:
+                state.close_rssi.append(rssi)
+            close_points.append((lat, lon))
+            if state.run and ts - state.run[3] > gap_limit:
+                state.close_run()
+            if state.run is None:
+                state.run = [[], 0, ts, ts]
+            state.run[0].append((lat, lon))
+            state.run[1] += 1
+            state.run[3] = ts
+
+        # --- filtered RSSI backfill + trilateration samples ---
+        if rssi is None or not (-100 <= rssi <= -20):
+            continue
+        filtered = next(filtered_rssi)
+        filtered_updates.append((round(filtered, 2), row['id']))
+        distance = 10 ** ((tx - filtered) / (10.0 * loss))
+        if 0.1 <= distance <= 2000:
+            state.samples.append([round(lat, 6), round(lon, 6), round(distance, 2), ts])
+            sampled = True
+
+    if close_points:
+        greedy_clusters(close_points, settings.min_close_separation_m, clusters=state.clusters)
+        state.close_hull = convex_hull(list(state.close_hull) + close_points)
+    if state.run:
+        state.run[0] = convex_hull(state.run[0])
+    if kalman:
+        state.kalman = kalman
+    return filtered_updates, sampled
+
+
+def score_device(settings, mac, device_type, meta, state, now, notes):
+    """Persistence score and snooper verdict from a device's aggregates. Returns
+    (score, windows_hit, cluster_count, is_snooper, reason)."""
+    # A device is "following" only if it was seen CLOSE (strong RSSI) in more
+    # than one well-populated place. Two extreme fixes are not evidence: one bad
+    # GPS sample or one stale cache entry can produce them, and that is what
+    # turned an ordinary drive into dozens of "snoopers".
+    zones = state.zones(settings.min_zone_fixes)
+    separation_miles = (polygon_diameter([(z['lat'], z['lon']) for z in zones])
+                        / METERS_PER_MILE)
+    followed = False
+    follow_kind = ''
+
+    # A cache artefact re-logs one frozen RSSI value at every new GPS position.
+    # A real radio never returns byte-identical signal over a mile of travel, so
+    # identical readings across separated zones are evidence of the bug, not a tail.
+    cached_rssi = looks_like_cached_rssi(settings, state, notes)
+
+    # (a) Dwell evidence: strong contact in two or more distinct places.
+    if not cached_rssi and len(zones) >= 2 and state.close_count >= settings.min_close_fixes:
+        span = state.close_last - state.close_first
+        if separation_miles >= settings.movement_threshold and span >= 300:
+            followed, follow_kind = True, '%d zones' % len(zones)
+
+    # (b) Continuous-contact evidence: an unbroken chain of strong fixes covering
+    # the distance. A tail on the road never dwells, so (a) alone would miss it --
+    # but an unbroken chain is exactly what a stale cache entry cannot fake.
+    if not followed and not cached_rssi:
+        run_miles, run_len, run_span = state.longest_run()
+        if (run_len >= settings.min_close_fixes and run_span >= 300
+                and run_miles >= settings.movement_threshold):
+            followed = True
+            follow_kind = 'unbroken contact over %d fixes' % run_len
+            separation_miles = max(separation_miles, run_miles)
+
+    # --- persistence score ---
+    timestamps = state.recent if state.fixes else state.recent_rows
+    weights = ([0.4, 0.3, 0.2, 0.1] if settings.persistence_windows == 4
+               else [1.0 / settings.persistence_windows] * settings.persistence_windows)
+    window = settings.persistence_window_minutes * 60
+    score = 0.0
+    windows_hit = 0
+    for index in range(settings.persistence_windows):
+        start = now - window * (index + 1)
+        end = now - window * index
+        if any(start <= ts < end for ts in timestamps):
+            score += weights[index]
+            windows_hit += 1
+    cluster_count = len(state.cells)
+    # Only well-populated close-range zones count towards the score.
+    close_clusters = len(zones)
+    encounters = state.encounters
+    score += 0.2 * max(0, windows_hit - 1)
+    score += 0.1 * max(0, close_clusters - 1)
+    score = min(1.0, score)
+
+    # Being visible for a long time is not evidence of surveillance: a stationary
+    # unit sees its own neighbourhood constantly. A tail is a device seen at close
+    # range in more than one place, or in more than one session.
+    reasons = []
+    if followed:
+        reasons.append('tracked across %.1f mi at >= %d dBm (%s)'
+                       % (separation_miles, settings.min_rssi_for_movement,
+                          follow_kind))
+    if (score >= settings.persistence_threshold and close_clusters >= 2
+            and encounters >= settings.min_encounters):
+        reasons.append('persistence %.2f across %d close-range zones / %d encounters'
+                       % (score, close_clusters, encounters))
+    if not settings.require_movement_for_snooper and score >= settings.persistence_threshold:
+        reasons.append('persistence %.2f' % score)
+    if meta.get('is_randomized') and not settings.flag_randomized_snoopers and not followed:
+        # Randomised BLE addresses rotate every ~15 min, so persistence alone is
+        # not evidence of anything.
+        reasons = []
+    if reasons and in_exempt_zone(settings, zones):
+        # Everything happened inside a zone you told SnoopR to ignore (home, work).
+        reasons = []
+    if settings.snooper_debug:
+        notes.append((logging.INFO, 'eval %s/%s fixes=%d close=%d zones=%d sep=%.2fmi '
+                      'score=%.2f windows=%d encounters=%d -> %s' % (
+                          mac, device_type, state.fixes, state.close_count, len(zones),
+                          separation_miles, score, windows_hit, encounters,
+                          '; '.join(reasons) or 'clear')))
+    return score, windows_hit, cluster_count, bool(reasons), '; '.join(reasons)
+
+
+def locate_device(settings, state, now):
+    """Trilaterated (lat, lon, mse) from the stored samples, or None."""
+    if len(state.samples) < settings.triangulation_min_points:
+        return None
+    samples = [(s[0], s[1], s[2],
+                exp(-max(0.0, (now - s[3]) / 3600.0) / 24.0) / max(s[2], 1.0))
+               for s in state.samples]
+    spread = polygon_diameter([(s[0], s[1]) for s in samples])
+    if spread < 10.0:
+        return None  # all observations from one spot: no geometry to solve
+    lat, lon, mse = trilaterate(samples, settings.mse_threshold_m2)
+    return (lat, lon, mse) if lat is not None else None
+
+
+def looks_like_cached_rssi(settings, state, notes):
+    if not settings.ignore_frozen_rssi or state.close_count < 6:
+        return False
+    if len(state.close_rssi) > 1:
+        return False
+    spread = polygon_diameter(state.close_hull)
+    if spread < settings.min_close_separation_m * 2:
+        return False  # sitting still: an unchanging reading is plausible
+    notes.append((logging.DEBUG, 'ignoring frozen RSSI %s across %.0f m -- looks like a '
+                  'stale cache entry rather than movement' % (state.close_rssi, spread)))
+    return True
+
+
+def in_exempt_zone(settings, zones):
+    """True when every close-range zone sits inside a geofence listed in
+    snooper_exempt_zones -- your own home and office should not be evidence."""
+    fences = settings.exempt_fences
+    if not fences or not zones:
+        return False
+    for zone in zones:
+        if not any(f.contains(zone['lat'], zone['lon']) for f in fences):
+            return False
+    return True
+
+
+def analyse_device(settings, job):
+    """job: (mac, device_type, meta, state_text, rows, now) as gathered by
+    SnoopR.iter_analysis_jobs. Everything here is CPU only -- no database, no plugin --
+    and the outcome comes back as a plain dict for SnoopR.apply_analysis_results to
+    write in one transaction."""
+    mac, device_type, meta, state_text, rows, now = job
+    state = DeviceState.loads(state_text)
+    if state is None or now - state.started_at > settings.analysis_days * 86400:
+        # Start over from the analysis window so evidence older than
+        # analysis_days ages out, as it did when every pass re-read history.
+        state = DeviceState(now)
+    notes = []
+    result = {'mac': mac, 'device_type': device_type, 'network_id': meta['id'],
+              'was_snooper': bool(meta.get('is_snooper')), 'name': meta.get('name'),
+              'verdict': None, 'filtered': [], 'position': None, 'notes': notes}
+    filtered_updates, sampled = fold_rows(settings, state, rows, device_type)
+    state.prune(now, settings.persistence_window_minutes * settings.persistence_windows * 60,
+                settings.analysis_days * 86400, max(1, settings.analysis_row_limit))
+    if state.rows >= 3:
+        result['verdict'] = score_device(settings, mac, device_type, meta, state, now, notes)
+        result['max_velocity'] = state.max_velocity
+        result['filtered'] = filtered_updates
+        if sampled:
+            result['position'] = locate_device(settings, state, now)
+    result['last_id'] = state.last_id
+    result['started_at'] = state.started_at
+    result['state'] = state.dumps()
+    return result
+
+
+# analysis_workers processes are started by forkserver/spawn, not forked from this
+# heavily threaded process, and load their own copy of this file under this name.
+# pwnagotchi does not put plugins in sys.modules, so nothing here is pickled by a
+# reference to this module: WorkerRef resolves in the worker's copy instead.
+ANALYSIS_WORKER_MODULE = '_snoopr_analysis_worker'
+ANALYSIS_WORKER_BOOTSTRAP = (
+    'import importlib.util, sys\n'
+    'spec = importlib.util.spec_from_file_location(name, path)\n'
+    'module = importlib.util.module_from_spec(spec)\n'
+    'sys.modules[name] = module\n'
+    'spec.loader.exec_module(module)\n')
+
+
+class WorkerRef:
+    """Calls `name` from this module; pickles as the same name looked up in the
+    analysis worker's copy of it (the module itself when name is None)."""
+
+    __slots__ = ('name',)
+
+    def __init__(self, name=None):
+        self.name = name
+
+    def __call__(self, *args):
+        return globals()[self.name](*args)
+
+    def __reduce__(self):
+        if self.name is None:
+            return importlib.import_module, (ANALYSIS_WORKER_MODULE,)
+        return getattr, (WorkerRef(), self.name)
+
+
+def analyse_batch(settings, jobs):
+    """Worker entry point: one pickled round trip per chunk of devices, not per device."""
+    results = []
+    for job in jobs:
+        try:
+            results.append(analyse_device(settings, job))
+        except Exception as exc:  # noqa: BLE001
+            results.append({'mac': job[0], 'device_type': job[1], 'error': repr(exc)})
+    return results
+
+
 # ---------------------------------------------------------------------
 # Aircraft feed normalisation
 # ---------------------------------------------------------------------
@@ -1540,6 +3932,253 @@ def iter_aircraft_payload(payload):
     return []
 
 
+# Raw fields normalise_aircraft_record reads, minus the ones (seen, seen_pos,
+# messages, rssi) that change on every dump1090 write even for an idle aircraft.
+AIRCRAFT_CONTENT_KEYS = (
+    'latitude', 'lat', 'longitude', 'lon', 'alt_baro', 'altitude', 'alt', 'alt_geom',
+    'geom_alt', 'on_ground', 'ground', 'callsign', 'flight', 'gs', 'speed', 'velocity',
+    'tas', 'track', 'heading', 'true_track', 'mag_heading', 'baro_rate', 'vert_rate',
+    'geom_rate', 'vertical_rate', 'squawk',
+)
+
+
+def aircraft_record_key(raw):
+    """(icao, content hash) of a raw feed record without normalising it, or None."""
+    if not isinstance(raw, dict):
+        return None
+    icao = raw.get('icao24') or raw.get('hex') or raw.get('icao') or raw.get('ModeS')
+    if not icao:
+        return None
+    try:
+        return str(icao), hash(tuple(raw.get(k) for k in AIRCRAFT_CONTENT_KEYS))
+    except TypeError:  # a list or dict where a scalar belongs; just don't skip it
+        return None
+
+
+# ---------------------------------------------------------------------
+# Aircraft feed sources
+# ---------------------------------------------------------------------
+
+class AircraftFeed:
+    """Where AircraftProcessor gets raw aircraft records. poll() returns the records
+    that arrived since the previous call, in any spelling normalise_aircraft_record
+    accepts."""
+
+    def poll(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class JsonSnapshotFeed(AircraftFeed):
+    """dump1090/readsb aircraft.json: the whole picture, rewritten in place. Parsed
+    again only when its mtime changes."""
+
+    def __init__(self, path):
+        self.path = path
+        self.last_mtime = 0.0
+        self.warned_missing = False
+
+    def poll(self):
+        if not self.path or not os.path.exists(self.path):
+            if not self.warned_missing:
+                LOG.warning('[SnoopR] aircraft file %s not present; aircraft tracking idle',
+                            self.path)
+                self.warned_missing = True
+            return []
+        self.warned_missing = False
+        try:
+            mtime = os.path.getmtime(self.path)
+            if mtime <= self.last_mtime:
+                return []
+            self.last_mtime = mtime
+            with open(self.path, 'r', encoding='utf-8', errors='ignore') as handle:
+                return iter_aircraft_payload(json.load(handle))
+        except (OSError, json.JSONDecodeError) as exc:
+            LOG.error('[SnoopR] aircraft file error: %s', exc)
+            return []
+
+
+class JsonLinesFeed(AircraftFeed):
+    """A file that grows by one JSON document per line (a single aircraft, or a
+    snapshot with an "aircraft" list). Followed like tail -f: only bytes appended
+    since the last poll are read, and a truncated or replaced file is read from the
+    start. After a read error the file is reopened where it was left, so lines
+    appended in between are not skipped."""
+
+    MAX_READ = 4 * 1024 * 1024  # per poll; the rest waits for the next one
+
+    def __init__(self, path):
+        self.path = path
+        self.handle = None
+        self.inode = None   # of the file being followed; kept across reopening
+        self.offset = 0     # bytes of it consumed, the partial line included
+        self.partial = b''
+        self.at_end = True  # only the first open skips what is already there
+
+    def _open(self):
+        handle = open(self.path, 'rb')
+        st = os.fstat(handle.fileno())
+        if self.at_end:
+            # History from before we started was never live; don't replay it.
+            self.offset, self.partial = st.st_size, b''
+        elif st.st_ino != self.inode or st.st_size < self.offset:
+            self.offset, self.partial = 0, b''
+        handle.seek(self.offset)
+        self.handle, self.inode, self.at_end = handle, st.st_ino, False
+
+    def poll(self):
+        try:
+            if self.handle is None:
+                if not os.path.exists(self.path):
+                    # A file created after we started is all live.
+                    self.at_end = False
+                    return []
+                self._open()
+            else:
+                st = os.stat(self.path)
+                if st.st_ino != self.inode or st.st_size < self.offset:
+                    self.close()
+                    self._open()
+            data = self.handle.read(self.MAX_READ)
+        except OSError as exc:
+            LOG.debug('[SnoopR] aircraft feed %s: %s', self.path, exc)
+            self.close()
+            return []
+        if not data:
+            return []
+        self.offset += len(data)
+        lines = (self.partial + data).split(b'\n')
+        self.partial = lines.pop()
+        records = []
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                doc = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(doc, dict) and isinstance(doc.get('aircraft'), list):
+                records.extend(doc['aircraft'])
+            else:
+                records.append(doc)
+        return records
+
+    def close(self):
+        if self.handle is not None:
+            try:
+                self.handle.close()
+            except OSError:
+                pass
+            self.handle = None
+
+
+class SbsFeed(AircraftFeed):
+    """readsb/dump1090 BaseStation (SBS-1) output, usually TCP port 30003. A reader
+    thread keeps the socket drained and merges each MSG line into the aircraft's
+    current record (SBS spreads callsign, position, velocity and squawk over separate
+    message types); poll() hands over the aircraft that changed since last time."""
+
+    # MSG field index -> the aircraft.json key normalise_aircraft_record reads.
+    FIELDS = ((10, 'flight'), (11, 'alt_baro'), (12, 'gs'), (13, 'track'), (14, 'lat'),
+              (15, 'lon'), (16, 'baro_rate'), (17, 'squawk'))
+
+    def __init__(self, host, port, timeout=30.0):
+        self.host = host
+        self.port = int(port)
+        self.timeout = timeout
+        self.records = LRUDict(maxsize=4096)
+        self.changed = set()
+        self.lock = Lock()
+        self.stop_event = threading.Event()
+        self.sock = None
+        self.thread = threading.Thread(target=self._run, daemon=True, name='snoopr-sbs')
+        self.thread.start()
+
+    def _run(self):
+        backoff = 5.0
+        while not self.stop_event.is_set():
+            try:
+                self.sock = socket.create_connection((self.host, self.port), timeout=10)
+                self.sock.settimeout(self.timeout)
+                LOG.info('[SnoopR] aircraft feed connected to %s:%d', self.host, self.port)
+                backoff = 5.0
+                with self.sock.makefile('rb') as stream:
+                    for line in stream:
+                        if self.stop_event.is_set():
+                            break
+                        self._merge(line)
+            except (OSError, ValueError) as exc:
+                if not self.stop_event.is_set():
+                    LOG.debug('[SnoopR] aircraft feed %s:%d: %s', self.host, self.port, exc)
+            finally:
+                self._close_socket()
+            self.stop_event.wait(backoff)
+            backoff = min(backoff * 2, 60.0)
+
+    def _merge(self, line):
+        fields = line.decode('ascii', 'ignore').rstrip('\r\n').split(',')
+        if len(fields) < 22 or fields[0] != 'MSG' or not fields[4]:
+            return
+        icao = fields[4].strip().lower()
+        with self.lock:
+            record = self.records.get(icao)
+            if record is None:
+                record = self.records[icao] = {'hex': icao}
+            for index, key in self.FIELDS:
+                value = fields[index].strip()
+                if value:
+                    record[key] = value
+            if fields[21]:
+                record['on_ground'] = fields[21].strip() == '-1'
+            self.changed.add(icao)
+
+    def poll(self):
+        with self.lock:
+            changed, self.changed = self.changed, set()
+            return [dict(self.records[icao]) for icao in changed if icao in self.records]
+
+    def _close_socket(self):
+        sock, self.sock = self.sock, None
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+    def close(self):
+        self.stop_event.set()
+        sock = self.sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+def open_aircraft_feed(source, aircraft_file):
+    """aircraft_source: "" (poll aircraft_file), "jsonl:///path" or "sbs://host[:port]".
+    A malformed source falls back to aircraft_file: it is an optional setting and must
+    not stop the plugin from loading."""
+    source = (source or '').strip()
+    if source.startswith('sbs://'):
+        try:
+            parts = urlsplit(source)
+            host, port = parts.hostname or '127.0.0.1', parts.port or 30003
+        except ValueError as exc:
+            LOG.warning('[SnoopR] bad aircraft_source %r (%s); polling %s',
+                        source, exc, aircraft_file)
+            return JsonSnapshotFeed(aircraft_file)
+        return SbsFeed(host, port)
+    if source.startswith('jsonl://'):
+        return JsonLinesFeed(source[len('jsonl://'):])
+    if source:
+        LOG.warning('[SnoopR] unknown aircraft_source %r; polling %s', source, aircraft_file)
+    return JsonSnapshotFeed(aircraft_file)
+
+
 # ---------------------------------------------------------------------
 # Background threads
 # ---------------------------------------------------------------------
@@ -1573,8 +4212,9 @@ class AircraftProcessor(StoppableThread):
         self.db = plugin.db
         self.cache_timeout = cache_timeout
         self.cache = LRUDict(maxsize=2048)
-        self.last_mtime = 0.0
-        self.warned_missing = False
+        # icao -> (content hash, normalised record) of the last record processed
+        self.seen = LRUDict(maxsize=4096)
+        self.feed = open_aircraft_feed(plugin.aircraft_source, plugin.aircraft_file)
         self.executor = ThreadPoolExecutor(max_workers=2,
                                            thread_name_prefix='snoopr-opensky')
         self.pending_lookups = set()
@@ -1582,6 +4222,7 @@ class AircraftProcessor(StoppableThread):
 
     def stop(self):
         super().stop()
+        self.feed.close()
         self.executor.shutdown(wait=False)
 
     # -- metadata ------------------------------------------------------
@@ -1625,28 +4266,26 @@ class AircraftProcessor(StoppableThread):
 
     # -- main loop -----------------------------------------------------
     def tick(self):
-        path = self.plugin.aircraft_file
-        if not path or not os.path.exists(path):
-            if not self.warned_missing:
-                LOG.warning('[SnoopR] aircraft file %s not present; aircraft tracking idle', path)
-                self.warned_missing = True
-            return
-        self.warned_missing = False
-        try:
-            mtime = os.path.getmtime(path)
-            if mtime <= self.last_mtime:
-                return
-            self.last_mtime = mtime
-            with open(path, 'r', encoding='utf-8', errors='ignore') as handle:
-                payload = json.load(handle)
-        except (OSError, json.JSONDecodeError) as exc:
-            LOG.error('[SnoopR] aircraft file error: %s', exc)
+        records = self.feed.poll()
+        if not records:
             return
-
         now = utcnow()
         batch = []
-        for raw in iter_aircraft_payload(payload):
-            plane = normalise_aircraft_record(raw)
+        skipped = 0
+        for raw in records:
+            # A record identical to the last one for its ICAO reuses that normalised
+            # record. It still goes through the tracker: a hovering or loitering
+            # aircraft reports the same position poll after poll, and only time passing
+            # in its track makes it circling. Storing is decided by the cache below.
+            key = aircraft_record_key(raw)
+            seen = self.seen.get(key[0]) if key is not None else None
+            if seen is not None and seen[0] == key[1]:
+                plane = seen[1]
+                skipped += 1
+            else:
+                plane = normalise_aircraft_record(raw)
+                if key is not None:
+                    self.seen[key[0]] = (key[1], plane)
             if not plane:
                 continue
             coords = valid_coords(plane['lat'], plane['lon'])
@@ -1704,27 +4343,119 @@ class AircraftProcessor(StoppableThread):
 
         if batch:
             self.db.add_detection_batch(batch)
-            LOG.info('[SnoopR] aircraft: stored %d position updates', len(batch))
+            LOG.info('[SnoopR] aircraft: stored %d position updates (%d records unchanged)',
+                     len(batch), skipped)
 
 
 class PersistenceAnalyzer(StoppableThread):
-    def __init__(self, plugin, interval=300, analysis_days=7):
+    """Works off the dirty-device queue that add_detection_batch maintains. Re-walking
+    every device seen in the last week took minutes per pass on a Pi Zero.
+
+    Devices are handled in chunks: the thread gathers a chunk's rows, analyse_batch
+    runs the pure analysis, and the results go back in one transaction. With
+    analysis_workers > 0 the analysis runs in a process pool, so it no longer competes
+    with bettercap event handling for the GIL; chunks stay bounded in flight."""
+
+    CHUNK = 64
+    # A pool that keeps dying is not rebuilt every pass forever.
+    MAX_POOL_FAILURES = 3
+
+    def __init__(self, plugin, interval=300, analysis_days=7, workers=0):
         super().__init__(plugin, interval, 'snoopr-analysis')
         self.analysis_days = analysis_days
+        self.workers = workers
+        self.pool = None
+        self.failures = 0
+
+    def stop(self):
+        super().stop()
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def _get_pool(self):
+        if self.workers > 0 and self.pool is None:
+            methods = multiprocessing.get_all_start_methods()
+            try:
+                self.pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(
+                        'forkserver' if 'forkserver' in methods else 'spawn'),
+                    initializer=exec,
+                    initargs=(ANALYSIS_WORKER_BOOTSTRAP,
+                              {'name': ANALYSIS_WORKER_MODULE, 'path': __file__}))
+            except (OSError, ValueError) as exc:
+                LOG.warning('[SnoopR] analysis_workers unavailable (%s); analysing in-thread',
+                            exc)
+                self.workers = 0
+        return self.pool
+
+    def _finish(self, future):
+        if future.cancelled():
+            return  # cancelled by an earlier failure's shutdown; stays dirty too
+        try:
+            results = future.result()
+        except Exception as exc:  # noqa: BLE001
+            # The chunk's devices stay dirty and are retried next pass.
+            LOG.error('[SnoopR] analysis worker failed: %s', exc)
+            if self.pool is not None:
+                self.pool.shutdown(wait=False, cancel_futures=True)
+                self.pool = None
+                self.failures += 1
+                if self.failures >= self.MAX_POOL_FAILURES:
+                    LOG.warning('[SnoopR] analysis workers failed %d passes in a row; '
+                                'analysing in-thread from now on', self.failures)
+                    self.workers = 0
+            return
+        self.failures = 0
+        self.plugin.apply_analysis_results(results)
+
+    def _dispatch(self, settings, jobs, pending):
+        """Hand a chunk to the pool, or analyse it in-thread when there is none. The
+        pool is re-read every time: _finish drops it when a worker fails, and the rest
+        of the pass must not submit to the shut-down executor."""
+        if self.pool is None:
+            self.plugin.apply_analysis_results(analyse_batch(settings, jobs))
+            return
+        pending.append(self.pool.submit(WorkerRef('analyse_batch'), settings, jobs))
+        while self.pool is not None and len(pending) > self.workers * 2:
+            self._finish(pending.popleft())
 
     def tick(self):
         started = time.time()
-        devices = self.plugin.db.get_recent_devices(days=self.analysis_days)
-        for mac, device_type in devices:
+        devices = self.plugin.db.get_analysis_candidates(days=self.analysis_days)
+        dirty = sum(1 for _, is_dirty in devices if is_dirty)
+        settings = AnalysisSettings(self.plugin)
+        pool = self._get_pool()
+        workers = self.workers
+        pending = deque()
+        size = self.CHUNK
+        if pool is not None:
+            # Small passes still spread over every worker.
+            size = max(8, min(self.CHUNK, -(-len(devices) // (workers * 2))))
+        jobs = []
+        for job in self.plugin.iter_analysis_jobs([net_id for net_id, _ in devices],
+                                                  chunk=size):
             if self.stop_event.is_set() or self.plugin.stop_event.is_set():
-                return
-            self.plugin.update_device_status(mac, device_type)
-        LOG.info('[SnoopR] analysis pass: %d devices in %.1fs', len(devices),
-                 time.time() - started)
+                jobs = []
+                break
+            jobs.append(job)
+            if len(jobs) < size:
+                continue
+            self._dispatch(settings, jobs, pending)
+            jobs = []
+        if jobs:
+            self._dispatch(settings, jobs, pending)
+        while pending:
+            self._finish(pending.popleft())
+        LOG.info('[SnoopR] analysis pass: %d devices (%d with new detections) in %.1fs%s',
+                 len(devices), dirty, time.time() - started,
+                 ' on %d workers' % workers if pool is not None else '')
 
 
 class MaintenanceThread(StoppableThread):
-    """Pruning used to happen only in on_unload, and VACUUM could hang shutdown."""
+    """Pruning used to happen only in on_unload, and VACUUM could hang shutdown. Space
+    freed by dropped partitions is now released incrementally every pass; the one
+    full VACUUM an old database needs to switch over waits for the 24th pass."""
 
     def __init__(self, plugin, interval=3600):
         super().__init__(plugin, interval, 'snoopr-maintenance')
@@ -1732,10 +4463,11 @@ class MaintenanceThread(StoppableThread):
 
     def tick(self):
         self.passes += 1
-        self.plugin.db.prune_old_data(self.plugin.prune_days, vacuum=(self.passes % 24 == 0))
+        self.plugin.db.prune_old_data(self.plugin.prune_days)
+        self.plugin.db.reclaim_space(convert=(self.passes % 24 == 0))
         self.plugin.evict_stale_state()
-        counts = self.plugin.db.get_network_counts(self.plugin.persistence_threshold)
-        self.plugin.counts_cache = counts
+        self.plugin.set_counts(
+            self.plugin.db.get_network_counts(self.plugin.persistence_threshold))
 
 
 class CountsThread(StoppableThread):
@@ -1745,8 +4477,8 @@ class CountsThread(StoppableThread):
         super().__init__(plugin, interval, 'snoopr-counts')
 
     def tick(self):
-        self.plugin.counts_cache = self.plugin.db.get_network_counts(
-            self.plugin.persistence_threshold)
+        self.plugin.set_counts(
+            self.plugin.db.get_network_counts(self.plugin.persistence_threshold))
 
 
 class BufferFlusher(StoppableThread):
@@ -1759,6 +4491,79 @@ class BufferFlusher(StoppableThread):
         self.plugin.flush_detection_buffer()
 
 
+class WigleWorker(StoppableThread):
+    """WiGLE SSID geolocation off the bettercap callback, which used to block for up
+    to 10 s per unknown SSID. The scan path only reads the cache (memory, then the
+    wigle_cache table) and queues misses here; this thread spends at most
+    `per_hour` requests an hour on the queue and persists every answer, positive
+    for TTL and negative for NEGATIVE_TTL, so a restart does not ask again."""
+
+    URL = 'https://api.wigle.net/api/v2/network/search'
+    TTL = 30 * 86400
+    NEGATIVE_TTL = 7 * 86400
+    QUEUE = 256
+    BACKOFF = 3600
+
+    def __init__(self, plugin, per_hour=30, interval=2.0):
+        super().__init__(plugin, interval, 'snoopr-wigle')
+        self.per_hour = max(1, int(per_hour))
+        self.auth = base64.b64encode(('%s:%s' % (plugin.wigle_api_name,
+                                                 plugin.wigle_api_token)).encode()).decode()
+        self.pending = OrderedDict()
+        self.sent = deque()
+        self.paused_until = 0.0
+        self._lock = Lock()
+
+    def request(self, ssid):
+        """Queue a lookup; a no-op when it is already queued or the queue is full
+        (a later sweep that still sees the SSID asks again)."""
+        with self._lock:
+            if ssid not in self.pending and len(self.pending) < self.QUEUE:
+                self.pending[ssid] = None
+
+    def tick(self):
+        now = time.time()
+        while self.sent and now - self.sent[0] >= 3600:
+            self.sent.popleft()
+        while now >= self.paused_until and len(self.sent) < self.per_hour \
+                and not self.stop_event.is_set():
+            with self._lock:
+                if not self.pending:
+                    return
+                ssid = self.pending.popitem(last=False)[0]
+            if self.plugin.db.get_wigle_location(ssid) is not False:
+                continue  # answered meanwhile (or by an earlier run)
+            self.sent.append(now)
+            self._lookup(ssid)
+            now = time.time()
+
+    def _lookup(self, ssid):
+        try:
+            resp = requests.get(self.URL, params={'ssid': ssid, 'resultsPerPage': 1},
+                                headers={'Authorization': 'Basic %s' % self.auth},
+                                timeout=10)
+            if resp.status_code == 200:
+                results = (resp.json() or {}).get('results') or []
+                coords = (valid_coords(results[0].get('trilat'), results[0].get('trilong'))
+                          if results else None)
+                self.plugin.db.store_wigle_location(
+                    ssid, coords, self.TTL if coords else self.NEGATIVE_TTL)
+                self.plugin.remember_wigle(ssid, coords)
+            elif resp.status_code == 429:
+                LOG.info('[SnoopR] WiGLE rate limit reached; pausing lookups for an hour')
+                self.paused_until = time.time() + self.BACKOFF
+                self.request(ssid)
+            elif resp.status_code in (401, 403):
+                LOG.warning('[SnoopR] WiGLE rejected the credentials (HTTP %s); lookups '
+                            'disabled', resp.status_code)
+                self.plugin.wigle_enabled = False
+                self.stop()
+            else:
+                LOG.debug('[SnoopR] WiGLE lookup for %s: HTTP %s', ssid, resp.status_code)
+        except (requests.RequestException, ValueError) as exc:
+            LOG.debug('[SnoopR] WiGLE lookup failed for %s: %s', ssid, exc)
+
+
 # ---------------------------------------------------------------------
 # Web interface
 # ---------------------------------------------------------------------
@@ -1828,8 +4633,10 @@ body.dark tr.high td { background: #3d1a1a; }
   <button class="btn" data-filter="aircraft">Aircraft</button>
   <button class="btn" data-filter="randomized">Randomised</button>
   <button class="btn ghost" id="export-kml">Export KML</button>
+  <button class="btn ghost" id="export-kmz">KMZ</button>
 </div>
 <div class="meta" id="counts">Loading&hellip;</div>
+<div class="meta" id="stats"></div>
 <div class="wrap">
 <table id="tbl">
 <thead><tr>
@@ -1856,7 +4663,9 @@ body.dark tr.high td { background: #3d1a1a; }
 (function () {
   "use strict";
   var base = window.location.pathname.replace(/\\/?$/, "/");
-  var state = { filter: "all", sort: "persistence", search: "", page: 0, size: 100 };
+  // cursors[i] is the keyset cursor that opens page i (the previous page's "next").
+  var state = { filter: "all", sort: "persistence", search: "", page: 0, size: 100,
+                cursors: [null], etag: null };
   var map = L.map("map").setView(INITIAL_CENTER, 13);
   L.tileLayer("https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png", {
     maxZoom: 19,
@@ -1970,23 +4779,41 @@ body.dark tr.high td { background: #3d1a1a; }
                           " (" + data.total + " devices)", "meta");
     var prev = el("button", "Prev", "btn ghost");
     var next = el("button", "Next", "btn ghost");
+    state.cursors[state.page + 1] = data.next;
     prev.disabled = state.page === 0;
-    next.disabled = state.page + 1 >= pages;
+    next.disabled = !data.next;
     prev.addEventListener("click", function () { state.page -= 1; load(); });
     next.addEventListener("click", function () { state.page += 1; load(); });
     pager.appendChild(prev); pager.appendChild(next); pager.appendChild(info);
   }
 
+  function restart() { state.page = 0; state.cursors = [null]; load(); }
+
   function load() {
     var url = base + "data.json?filter_by=" + encodeURIComponent(state.filter) +
       "&sort_by=" + encodeURIComponent(state.sort) +
       "&search=" + encodeURIComponent(state.search) +
-      "&limit=" + state.size + "&offset=" + (state.page * state.size);
+      "&limit=" + state.size +
+      (state.cursors[state.page] ? "&after=" + encodeURIComponent(state.cursors[state.page])
+                                 : "&offset=" + (state.page * state.size)) +
+      "&zoom=" + map.getZoom();
     fetch(url, { headers: { "Accept": "application/json" } })
-      .then(function (r) { return r.json(); })
-      .then(function (data) { render(data); paintCounts(data.counts); })
+      .then(function (r) {
+        // The browser revalidates with If-None-Match; an unchanged ETag means nothing
+        // to redraw either.
+        var tag = r.headers.get("ETag");
+        if (tag && tag === state.etag) { return null; }
+        state.etag = tag;
+        return r.json();
+      })
+      .then(function (data) {
+        if (!data) { return; }
+        render(data); paintCounts(data.counts); paintStats(data.stats);
+      })
       .catch(function (err) { console.error("SnoopR load failed", err); });
   }
+  // Trails are simplified for the current zoom, so zooming asks for a fresh set.
+  map.on("zoomend", function () { load(); });
 
   document.querySelectorAll("[data-filter]").forEach(function (button) {
     button.addEventListener("click", function () {
@@ -1995,20 +4822,19 @@ body.dark tr.high td { background: #3d1a1a; }
       });
       button.classList.add("active");
       state.filter = button.getAttribute("data-filter");
-      state.page = 0;
-      load();
+      restart();
     });
   });
   document.querySelectorAll("th[data-sort]").forEach(function (th) {
     var key = th.getAttribute("data-sort");
     if (!key) { return; }
-    th.addEventListener("click", function () { state.sort = key; state.page = 0; load(); });
+    th.addEventListener("click", function () { state.sort = key; restart(); });
   });
   var timer = null;
   document.getElementById("search").addEventListener("input", function (evt) {
     clearTimeout(timer);
     var value = evt.target.value;
-    timer = setTimeout(function () { state.search = value; state.page = 0; load(); }, 300);
+    timer = setTimeout(function () { state.search = value; restart(); }, 300);
   });
   document.getElementById("toggle-dark").addEventListener("click", function () {
     document.body.classList.toggle("dark");
@@ -2020,6 +4846,9 @@ body.dark tr.high td { background: #3d1a1a; }
   document.getElementById("export-kml").addEventListener("click", function () {
     window.location.href = base + "export.kml?filter_by=" + encodeURIComponent(state.filter);
   });
+  document.getElementById("export-kmz").addEventListener("click", function () {
+    window.location.href = base + "export.kmz?filter_by=" + encodeURIComponent(state.filter);
+  });
 
   function showAlert(message) {
     var box = document.getElementById("alert-box");
@@ -2037,6 +4866,29 @@ body.dark tr.high td { background: #3d1a1a; }
       " | Anomalous aircraft " + c.anomalous_aircraft;
   }
 
+  function paintStats(s) {
+    if (!s) { return; }
+    var parts = [];
+    if (s.writes && s.writes.last_rows_per_s !== null) {
+      parts.push("DB flush " + s.writes.last_rows + " rows in " + s.writes.last_ms + " ms (" +
+                 Math.round(s.writes.last_rows_per_s) + " rows/s)");
+    }
+    if (s.id_cache) {
+      parts.push("Id cache " + s.id_cache.hits + " hits / " + s.id_cache.misses + " misses" +
+                 (s.id_cache.hit_rate === null ? "" : " (" + Math.round(s.id_cache.hit_rate * 100) + "%)"));
+    }
+    if (s.profiles) {
+      parts.push("Profile cache " + s.profiles.hits + " hits / " + s.profiles.misses + " misses" +
+                 (s.profiles.hit_rate === null ? "" : " (" + Math.round(s.profiles.hit_rate * 100) + "%)"));
+    }
+    if (s.mesh) {
+      parts.push("Mesh " + (s.mesh.frames_per_s === null ? "-" : s.mesh.frames_per_s) + " frames/s, " +
+                 s.mesh.rejects + " rejected, " + (s.mesh.queued_frames + s.mesh.queued_detections) +
+                 " queued");
+    }
+    document.getElementById("stats").textContent = parts.join(" | ");
+  }
+
   var pollMs = 60000, timerHandle = null;
   function schedule() {
     if (timerHandle) { clearInterval(timerHandle); }
@@ -2078,6 +4930,123 @@ body.dark tr.high td { background: #3d1a1a; }
 '''
 
 
+class ChunkSink:
+    """Write-only, non-seekable file object collecting bytes until drained; lets
+    zipfile produce an archive incrementally inside a response generator."""
+
+    def __init__(self):
+        self._parts = []
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+class EventHub:
+    """Single publisher behind the SSE routes. Each counts change or alert is serialised
+    once and the same frame is appended to every subscriber's bounded queue; stream
+    generators block on one condition variable instead of each waking every second to
+    diff counts_cache and scan the alert deque. A subscriber that falls QUEUE frames
+    behind loses its oldest ones rather than growing without bound."""
+
+    HISTORY = 200
+    QUEUE = 256
+
+    class Subscription:
+        __slots__ = ('kinds', 'queue')
+
+        def __init__(self, kinds, size):
+            self.kinds = frozenset(kinds)
+            self.queue = deque(maxlen=size)
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._subscribers = set()
+        self._alerts = deque(maxlen=self.HISTORY)  # serialised alert frames
+        self._counts = None                         # (counts dict, frame)
+        self.alert_seq = 0
+        self.closed = False
+        self.published = 0
+        self.dropped = 0
+
+    @staticmethod
+    def _frame(kind, data):
+        return 'event: %s\ndata: %s\n\n' % (kind, json.dumps(data))
+
+    def _push(self, kind, frame):
+        """Caller holds _cond."""
+        for sub in self._subscribers:
+            if kind in sub.kinds:
+                if len(sub.queue) == sub.queue.maxlen:
+                    self.dropped += 1
+                sub.queue.append(frame)
+        self.published += 1
+        self._cond.notify_all()
+
+    def publish_alert(self, kind, message, extra=None):
+        with self._cond:
+            self.alert_seq += 1
+            frame = self._frame('alert', {'id': self.alert_seq, 'kind': kind,
+                                          'message': message, 'time': fmt_ts(),
+                                          'extra': extra or {}})
+            self._alerts.append(frame)
+            self._push('alert', frame)
+            return self.alert_seq
+
+    def publish_counts(self, counts):
+        """No-op unless the counts differ from the last ones published."""
+        with self._cond:
+            if self._counts is not None and self._counts[0] == counts:
+                return
+            frame = self._frame('counts', counts)
+            self._counts = (dict(counts), frame)
+            self._push('counts', frame)
+
+    def subscribe(self, kinds, history=False):
+        """New subscription, primed with the current counts and, with `history`, the
+        alerts still held."""
+        sub = self.Subscription(kinds, self.QUEUE)
+        with self._cond:
+            if 'counts' in sub.kinds and self._counts is not None:
+                sub.queue.append(self._counts[1])
+            if history and 'alert' in sub.kinds:
+                sub.queue.extend(self._alerts)
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._cond:
+            self._subscribers.discard(sub)
+
+    def wait(self, sub, timeout):
+        """Block until `sub` has frames, the hub closes or `timeout` passes; returns
+        (and clears) the pending frames."""
+        with self._cond:
+            if not sub.queue and not self.closed:
+                self._cond.wait_for(lambda: sub.queue or self.closed, timeout)
+            frames = list(sub.queue)
+            sub.queue.clear()
+            return frames
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {'subscribers': len(self._subscribers), 'published': self.published,
+                    'dropped': self.dropped}
+
+
 class WebHandler:
     """Serves the dashboard shell, a paginated JSON endpoint, KML export and one SSE
     stream. Device data is never interpolated into HTML: the client builds every cell and
@@ -2085,28 +5054,26 @@ class WebHandler:
     browser via the old bindPopup template literals."""
 
     SSE_PATHS = ('events', 'stream', 'alerts')
+    SSE_KEEPALIVE = 20.0
+    DATA_CACHE_SIZE = 32
 
     def __init__(self, plugin):
         self.plugin = plugin
         self.ip_requests = {}
         self._rate_lock = Lock()
-        self.alerts = deque(maxlen=200)
-        self.alert_seq = 0
-        self._alert_lock = Lock()
+        self.events = EventHub()
+        # (data_version, query) -> serialised device page of data.json.
+        self._data_cache = LRUDict(maxsize=self.DATA_CACHE_SIZE)
+        # data_version starts from zero on every start; this keeps a browser's ETag
+        # from an earlier run from matching the same version number in this one.
+        self._epoch = os.urandom(4).hex()
+        self._data_lock = Lock()
         self._streams = 0
         self._stream_lock = Lock()
 
     # -- alerts --------------------------------------------------------
     def add_alert(self, kind, message, extra=None):
-        with self._alert_lock:
-            self.alert_seq += 1
-            self.alerts.append({'id': self.alert_seq, 'kind': kind, 'message': message,
-                                'time': fmt_ts(), 'extra': extra or {}})
-            return self.alert_seq
-
-    def _alerts_since(self, last_id):
-        with self._alert_lock:
-            return [a for a in self.alerts if a['id'] > last_id]
+        return self.events.publish_alert(kind, message, extra)
 
     # -- rate limiting -------------------------------------------------
     def _rate_limited(self, ip):
@@ -2137,9 +5104,11 @@ class WebHandler:
             return self._data(request)
         if route in ('export.kml', 'kml'):
             return self._export_kml(request)
+        if route in ('export.kmz', 'kmz'):
+            return self._export_kml(request, kmz=True)
         if route == '':
-            if request.args.get('export') == 'kml':
-                return self._export_kml(request)
+            if request.args.get('export') in ('kml', 'kmz'):
+                return self._export_kml(request, kmz=request.args.get('export') == 'kmz')
             page = (HTML_PAGE
                     .replace('INITIAL_CENTER', json.dumps(self.plugin.map_center()))
                     .replace('SSE_ENABLED', 'true' if self.plugin.sse_enabled else 'false'))
@@ -2156,44 +5125,108 @@ class WebHandler:
         filter_by = args.get('filter_by', 'all')
         sort_by = args.get('sort_by', 'persistence')
         search = (args.get('search') or '').strip()[:64] or None
-        networks = self.plugin.db.get_all_networks(
+        after = self._parse_cursor(args.get('after'))
+        # The map's zoom level picks the trail simplification tolerance; without it
+        # trails come back raw, as before.
+        try:
+            zoom = max(0, min(22, int(float(args['zoom']))))
+            tolerance = zoom_tolerance(zoom, self.plugin.path_tolerance_px)
+        except (KeyError, ValueError):
+            tolerance = None
+        # The device page moves with the database's data version, so a poll that finds
+        # it unchanged is answered from memory. Counters, map centre and stats change
+        # without a version bump (GPS, mesh, cache hits), so they are built for every
+        # response and the ETag covers them as well; a browser that already holds the
+        # whole body gets a 304. The version is read before querying: a write that
+        # lands mid-query only makes the cached page newer than its key.
+        version = self.plugin.db.data_version
+        query = (filter_by, sort_by, search, limit, offset, after, tolerance)
+        live = json.dumps(self._data_live(), separators=(',', ':'))
+        etag = '%s-%x-%08x-%08x' % (self._epoch, version,
+                                    zlib.crc32(repr(query).encode('utf-8')),
+                                    zlib.crc32(live.encode('utf-8')))
+        headers = {'ETag': '"%s"' % etag, 'Cache-Control': 'no-cache'}
+        if request.if_none_match.contains(etag):
+            return Response(status=304, headers=headers)
+        key = (version,) + query
+        with self._data_lock:
+            page = self._data_cache.get(key)
+        if page is None:
+            page = json.dumps(self._data_page(filter_by, sort_by, search, limit, offset,
+                                              after, tolerance), separators=(',', ':'))
+            with self._data_lock:
+                self._data_cache[key] = page
+        # Both are non-empty JSON objects; join them into one.
+        return Response(page[:-1] + ',' + live[1:], mimetype='application/json',
+                        headers=headers)
+
+    @staticmethod
+    def _parse_cursor(token):
+        """`after` is the `next` token of the previous page, JSON [sort key, id]; anything
+        else is ignored and the page falls back to `offset`."""
+        if not token or len(token) > 256:
+            return None
+        try:
+            key, net_id = json.loads(token)
+        except (ValueError, TypeError):
+            return None
+        if isinstance(key, (str, int, float)) and not isinstance(key, bool) \
+                and isinstance(net_id, int) and not isinstance(net_id, bool):
+            return key, net_id
+        return None
+
+    def _data_page(self, filter_by, sort_by, search, limit, offset, after, tolerance):
+        networks, cursor = self.plugin.db.get_network_page(
             sort_by=sort_by, filter_by=filter_by, include_paths=True,
-            limit=limit, offset=offset,
+            limit=limit, offset=offset, after=after,
             persistence_threshold=self.plugin.persistence_threshold,
-            path_limit=self.plugin.max_path_points, search=search)
+            path_limit=self.plugin.max_path_points, search=search, path_tolerance=tolerance)
         total = self.plugin.db.count_networks(filter_by, self.plugin.persistence_threshold)
-        return jsonify({
+        return {
             'networks': networks,
+            'next': json.dumps(list(cursor), separators=(',', ':')) if cursor else None,
             'total': total,
             'geofences': [g.to_json() for g in self.plugin.geofences],
+        }
+
+    def _data_live(self):
+        return {
             'counts': self.plugin.counts_cache,
             'center': self.plugin.map_center(),
-        })
-
-    def _export_kml(self, request):
-        filter_by = request.args.get('filter_by', 'all')
-        networks = self.plugin.db.get_all_networks(
-            filter_by=filter_by, include_paths=True, limit=5000,
-            persistence_threshold=self.plugin.persistence_threshold,
-            path_limit=self.plugin.max_path_points)
-        parts = ['<?xml version="1.0" encoding="UTF-8"?>',
-                 '<kml xmlns="http://www.opengis.net/kml/2.2"><Document>',
-                 '<name>SnoopR export</name>',
-                 '<Style id="green"><IconStyle><color>ff00ff00</color></IconStyle></Style>',
-                 '<Style id="yellow"><IconStyle><color>ff00ffff</color></IconStyle></Style>',
-                 '<Style id="red"><IconStyle><color>ff0000ff</color></IconStyle></Style>',
-                 '<Style id="purple"><IconStyle><color>fff72f7b</color></IconStyle></Style>',
-                 '<Style id="path_high"><LineStyle><color>ff0000ff</color>'
-                 '<width>4</width></LineStyle></Style>',
-                 '<Style id="path_med"><LineStyle><color>ff00aaff</color>'
-                 '<width>3</width></LineStyle></Style>']
+            'stats': {'writes': self.plugin.db.get_write_stats(),
+                      'id_cache': self.plugin.db.get_id_cache_stats(),
+                      'profiles': self.plugin.profiles.stats(),
+                      'events': self.events.stats(),
+                      'mesh': (self.plugin.mesh_receiver.get_stats()
+                               if self.plugin.mesh_receiver else None)},
+        }
+
+    KML_HEADER = (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<kml xmlns="http://www.opengis.net/kml/2.2"><Document>\n'
+        '<name>SnoopR export</name>\n'
+        '<Style id="green"><IconStyle><color>ff00ff00</color></IconStyle></Style>\n'
+        '<Style id="yellow"><IconStyle><color>ff00ffff</color></IconStyle></Style>\n'
+        '<Style id="red"><IconStyle><color>ff0000ff</color></IconStyle></Style>\n'
+        '<Style id="purple"><IconStyle><color>fff72f7b</color></IconStyle></Style>\n'
+        '<Style id="path_high"><LineStyle><color>ff0000ff</color>'
+        '<width>4</width></LineStyle></Style>\n'
+        '<Style id="path_med"><LineStyle><color>ff00aaff</color>'
+        '<width>3</width></LineStyle></Style>')
+    KML_CHUNK = 64 * 1024
+
+    def _kml_parts(self, filter_by):
+        """Yield the KML document piece by piece straight off iter_networks."""
+        yield self.KML_HEADER
         for fence in self.plugin.geofences:
             if fence.type == 'polygon':
                 coords = ' '.join('%s,%s,0' % (p[1], p[0]) for p in fence.params)
-                parts.append('<Placemark><name>%s</name><Polygon><outerBoundaryIs><LinearRing>'
-                             '<coordinates>%s</coordinates></LinearRing></outerBoundaryIs>'
-                             '</Polygon></Placemark>' % (xml_escape(fence.name), coords))
-        for net in networks:
+                yield ('<Placemark><name>%s</name><Polygon><outerBoundaryIs><LinearRing>'
+                       '<coordinates>%s</coordinates></LinearRing></outerBoundaryIs>'
+                       '</Polygon></Placemark>' % (xml_escape(fence.name), coords))
+        for net in self.plugin.db.iter_networks(
+                filter_by=filter_by, persistence_threshold=self.plugin.persistence_threshold,
+                path_limit=self.plugin.max_path_points, path_min_score=0.4):
             if net['latitude'] is None or net['longitude'] is None:
                 continue
             score = net['persistence_score']
@@ -2211,20 +5244,55 @@ class WebHandler:
                     'yes' if net['is_snooper'] else 'no',
                     (' (%s)' % net['snooper_reason']) if net['snooper_reason'] else '',
                     net['anomalies']))
-            parts.append('<Placemark><name>%s</name><description>%s</description>'
-                         '<styleUrl>#%s</styleUrl><Point><coordinates>%s,%s,0</coordinates>'
-                         '</Point></Placemark>' % (xml_escape(net['mac']), desc, style,
-                                                   net['longitude'], net['latitude']))
+            yield ('<Placemark><name>%s</name><description>%s</description>'
+                   '<styleUrl>#%s</styleUrl><Point><coordinates>%s,%s,0</coordinates>'
+                   '</Point></Placemark>' % (xml_escape(net['mac']), desc, style,
+                                             net['longitude'], net['latitude']))
             path = net.get('path')
             if path and len(path) > 1 and (score > 0.4 or net['is_snooper']):
                 coords = ' '.join('%s,%s,0' % (p['longitude'], p['latitude']) for p in path)
-                parts.append('<Placemark><name>Trail %s</name><styleUrl>#%s</styleUrl>'
-                             '<LineString><tessellate>1</tessellate><coordinates>%s'
-                             '</coordinates></LineString></Placemark>' % (
-                                 xml_escape(net['mac']),
-                                 'path_high' if score > 0.7 else 'path_med', coords))
-        parts.append('</Document></kml>')
-        return Response('\n'.join(parts),
+                yield ('<Placemark><name>Trail %s</name><styleUrl>#%s</styleUrl>'
+                       '<LineString><tessellate>1</tessellate><coordinates>%s'
+                       '</coordinates></LineString></Placemark>' % (
+                           xml_escape(net['mac']),
+                           'path_high' if score > 0.7 else 'path_med', coords))
+        yield '</Document></kml>'
+
+    def _kml_chunks(self, filter_by):
+        """Coalesce placemarks into ~64 KB UTF-8 chunks so the WSGI server is not handed
+        one tiny write per device."""
+        buf, size = [], 0
+        for part in self._kml_parts(filter_by):
+            data = (part + '\n').encode('utf-8')
+            buf.append(data)
+            size += len(data)
+            if size >= self.KML_CHUNK:
+                yield b''.join(buf)
+                buf, size = [], 0
+        if buf:
+            yield b''.join(buf)
+
+    def _kmz_chunks(self, filter_by):
+        """KMZ is a zip holding doc.kml. zipfile writes data descriptors when the target
+        cannot seek, so the archive streams with the same constant memory as KML."""
+        sink = ChunkSink()
+        with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            with archive.open('doc.kml', 'w') as doc:
+                for chunk in self._kml_chunks(filter_by):
+                    doc.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+        yield sink.drain()
+
+    def _export_kml(self, request, kmz=False):
+        filter_by = request.args.get('filter_by', 'all')
+        kmz = kmz or request.args.get('format') == 'kmz'
+        if kmz:
+            return Response(stream_with_context(self._kmz_chunks(filter_by)),
+                            mimetype='application/vnd.google-earth.kmz',
+                            headers={'Content-Disposition': 'attachment; filename=snoopr.kmz'})
+        return Response(stream_with_context(self._kml_chunks(filter_by)),
                         mimetype='application/vnd.google-earth.kml+xml',
                         headers={'Content-Disposition': 'attachment; filename=snoopr.kml'})
 
@@ -2234,29 +5302,22 @@ class WebHandler:
                 abort(503)
             self._streams += 1
 
-        want_counts = route in ('events', 'stream')
-        want_alerts = route in ('events', 'alerts')
+        kinds = set()
+        if route in ('events', 'stream'):
+            kinds.add('counts')
+        if route in ('events', 'alerts'):
+            kinds.add('alert')
 
         def generate():
-            last_counts = None
-            last_alert = self.alert_seq if route == 'alerts' else 0
-            last_beat = 0.0
+            # Subscribing here, not in _stream, so the finally below always runs for it.
+            self.events.publish_counts(self.plugin.counts_cache)
+            sub = self.events.subscribe(kinds, history=(route == 'events'))
             try:
                 while not self.plugin.stop_event.is_set():
-                    if want_counts:
-                        counts = self.plugin.counts_cache
-                        if counts != last_counts:
-                            yield 'event: counts\ndata: %s\n\n' % json.dumps(counts)
-                            last_counts = dict(counts)
-                    if want_alerts:
-                        for alert in self._alerts_since(last_alert):
-                            last_alert = alert['id']
-                            yield 'event: alert\ndata: %s\n\n' % json.dumps(alert)
-                    if time.time() - last_beat > 20:
-                        last_beat = time.time()
-                        yield ': keepalive\n\n'
-                    time.sleep(1.0)
+                    frames = self.events.wait(sub, self.SSE_KEEPALIVE)
+                    yield ''.join(frames) if frames else ': keepalive\n\n'
             finally:
+                self.events.unsubscribe(sub)
                 with self._stream_lock:
                     self._streams -= 1
 
@@ -2310,11 +5371,13 @@ class SnoopR(plugins.Plugin):
         self._gps_rejects = 0
         self._stale_aps = 0
         self._warned_no_ap_timestamps = False
-        self.oui_db = {24: {}, 28: {}, 36: {}}
+        self.oui_db = OuiIndex()
         self.bluetooth_company_db = {}
-        self.kalman_filters = LRUDict(maxsize=8192)
+        self.kalman_filters = KalmanBank(capacity=8192)
+        self.profiles = ProfileCache()
         self.aircraft_tracks = LRUDict(maxsize=2048)
         self.wigle_cache = LRUDict(maxsize=512)
+        self.wigle_worker = None
         self.counts_cache = {'wifi': 0, 'bluetooth': 0, 'aircraft': 0, 'snoopers': 0,
                              'high_persistence': 0, 'anomalous_aircraft': 0}
 
@@ -2357,6 +5420,7 @@ class SnoopR(plugins.Plugin):
         self.bt_company_db_path = self._opt(
             'bt_company_db_path', os.path.join(base_dir, 'company_identifiers.json'))
         self.aircraft_file = self._resolve_aircraft_file(self._opt('aircraft_file'))
+        self.aircraft_source = str(self._opt('aircraft_source', '') or '')
         self.aircraft_db_csv = self._opt('aircraft_db_csv', '')
 
         self.scan_interval = float(self._opt('scan_interval', 10))
@@ -2372,6 +5436,7 @@ class SnoopR(plugins.Plugin):
         self.ap_max_age = float(self._opt('ap_max_age', 30))
         self.prune_days = int(self._opt('prune_days', 30))
         self.prune_interval_hours = float(self._opt('prune_interval_hours', 6))
+        self.partition_days = int(self._opt('partition_days', 7))
 
         self.mesh_enabled = bool(self._opt('mesh_enabled', False))
         self.mesh_host = self._opt('mesh_host', '0.0.0.0')
@@ -2379,6 +5444,12 @@ class SnoopR(plugins.Plugin):
         self.mesh_peers = list(self._opt('mesh_peers', []) or [])
         self.mesh_key = self._opt('mesh_key', '') or ''
         self.mesh_allow_plaintext = bool(self._opt('mesh_allow_plaintext', False))
+        self.mesh_wire_format = str(self._opt('mesh_wire_format', 'compact')).lower()
+        if self.mesh_wire_format not in ('compact', 'json'):
+            LOG.warning('[SnoopR] unknown mesh_wire_format %r, using compact',
+                        self.mesh_wire_format)
+            self.mesh_wire_format = 'compact'
+        self.mesh_resend_after = max(0, int(self._opt('mesh_resend_after', 300)))
         if self.mesh_enabled and self.mesh_key:
             LOG.warning('[SnoopR] mesh_key is stored in plaintext in config.toml; '
                         'restrict permissions (chmod 600).')
@@ -2386,6 +5457,7 @@ class SnoopR(plugins.Plugin):
         self.wigle_enabled = bool(self._opt('wigle_enabled', False))
         self.wigle_api_name = self._opt('wigle_api_name', '')
         self.wigle_api_token = self._opt('wigle_api_token', '')
+        self.wigle_requests_per_hour = max(1, int(self._opt('wigle_requests_per_hour', 30)))
         if self.wigle_enabled and (self.wigle_api_name or self.wigle_api_token):
             LOG.warning('[SnoopR] WiGLE credentials are stored in plaintext in config.toml; '
                         'restrict permissions (chmod 600).')
@@ -2419,6 +5491,9 @@ class SnoopR(plugins.Plugin):
             self._opt('require_movement_for_snooper', True))
         self.analysis_days = int(self._opt('analysis_days', 7))
         self.analysis_row_limit = int(self._opt('analysis_row_limit', 4000))
+        # Opt-in process pool for the analysis pass (Pi 4/5); 0 keeps it on one thread.
+        self.analysis_workers = max(0, min(int(self._opt('analysis_workers', 0)),
+                                           os.cpu_count() or 1))
         self.update_interval = float(self._opt('update_interval', 300))
         self.persistence_window_minutes = float(self._opt('persistence_window_minutes', 5))
         self.persistence_windows = int(self._opt('persistence_windows', 4))
@@ -2471,6 +5546,7 @@ class SnoopR(plugins.Plugin):
         self.sse_enabled = bool(self._opt('sse_enabled', True))
         self.max_sse_clients = int(self._opt('max_sse_clients', 2))
         self.max_path_points = int(self._opt('max_path_points', 300))
+        self.path_tolerance_px = float(self._opt('path_tolerance_px', 1.5))
 
         self.ui_enabled = bool(self._opt('ui_enabled', True))
         self.ui_x = int(self._opt('ui_x', 0))
@@ -2543,8 +5619,9 @@ class SnoopR(plugins.Plugin):
             missing.append('bleak (BLE scanning disabled)')
         if self.mesh_enabled and not HAS_CRYPTO:
             missing.append('cryptography (mesh encryption)')
-        if not HAS_SCIPY:
-            LOG.info('[SnoopR] scipy not present; using the pure-Python solver')
+        if not HAS_NUMPY:
+            LOG.info('[SnoopR] numpy not present; trilateration uses the %s solver',
+                     'scipy Nelder-Mead' if HAS_SCIPY else 'pure-Python')
         if missing:
             import sys
             LOG.warning('[SnoopR] missing optional packages: %s', ', '.join(missing))
@@ -2556,46 +5633,15 @@ class SnoopR(plugins.Plugin):
     # Vendor databases
     # -----------------------------------------------------------------
     def _load_oui_db(self):
-        """Understands both the Wireshark `manuf` format and IEEE `oui.txt`.
-        The 6.x parser only handled `oui.txt`, so against the documented
-        wireshark-common path it loaded zero entries."""
         path = self.oui_db_path
         if not path or not os.path.exists(path):
             LOG.warning('[SnoopR] OUI database not found (%s); vendor lookup limited', path)
             return
-        loaded = 0
         try:
-            with open(path, 'r', encoding='utf-8', errors='ignore') as handle:
-                for line in handle:
-                    line = line.strip()
-                    if not line or line.startswith('#'):
-                        continue
-                    if '(hex)' in line:  # IEEE oui.txt
-                        head, _, tail = line.partition('(hex)')
-                        prefix = head.strip().replace('-', '').replace(':', '').upper()
-                        vendor = tail.strip()
-                        if len(prefix) >= 6 and vendor:
-                            self.oui_db[24][prefix[:6]] = vendor
-                            loaded += 1
-                        continue
-                    parts = line.split('\t')
-                    if len(parts) < 2:
-                        parts = line.split(None, 2)
-                    if len(parts) < 2:
-                        continue
-                    prefix, _, mask = parts[0].partition('/')
-                    prefix = prefix.replace(':', '').replace('-', '').replace('.', '').upper()
-                    vendor = (parts[2].strip() if len(parts) > 2 and parts[2].strip()
-                              else parts[1].strip())
-                    if not prefix or not vendor:
-                        continue
-                    bits = int(mask) if mask.isdigit() else 24
-                    bucket = 36 if bits >= 36 else (28 if bits >= 28 else 24)
-                    nibbles = bucket // 4
-                    if len(prefix) >= nibbles:
-                        self.oui_db[bucket][prefix[:nibbles]] = vendor
-                        loaded += 1
-            LOG.info('[SnoopR] loaded %d OUI entries from %s', loaded, path)
+            started = time.time()
+            self.oui_db = OuiIndex.load(path, os.path.join(self.base_dir, 'oui.cache'))
+            LOG.info('[SnoopR] loaded %d OUI entries from %s in %.2fs', len(self.oui_db),
+                     path, time.time() - started)
         except OSError as exc:
             LOG.error('[SnoopR] OUI load error: %s', exc)
 
@@ -2604,13 +5650,7 @@ class SnoopR(plugins.Plugin):
             return 'Unknown'
         if is_randomized_mac(mac):
             return 'Randomised (private address)'
-        digits = mac_hex(mac)
-        for bits, nibbles in ((36, 9), (28, 7), (24, 6)):
-            if len(digits) >= nibbles:
-                vendor = self.oui_db[bits].get(digits[:nibbles])
-                if vendor:
-                    return vendor
-        return 'Unknown'
+        return self.oui_db.lookup(mac) or 'Unknown'
 
     def _load_bluetooth_company_db(self):
         if not os.path.exists(self.bt_company_db_path):
@@ -2644,6 +5684,7 @@ class SnoopR(plugins.Plugin):
             os.replace(tmp, self.bt_company_db_path)
             LOG.info('[SnoopR] downloaded Bluetooth company database')
             self._load_bluetooth_company_db()
+            self.profiles.clear()
         except (requests.RequestException, OSError) as exc:
             LOG.error('[SnoopR] Bluetooth company DB download failed: %s', exc)
 
@@ -2728,14 +5769,6 @@ class SnoopR(plugins.Plugin):
                       '00001828-0000-1000-8000-00805f9b34fb'}
         return 1 if self._service_uuids(adv) & mesh_uuids else 0
 
-    def _get_kalman(self, mac, device_type):
-        key = (mac, device_type)
-        kf = self.kalman_filters.get(key)
-        if kf is None:
-            kf = KalmanFilter()
-            self.kalman_filters[key] = kf
-        return kf
-
     # -----------------------------------------------------------------
     # GPS + buffering
     # -----------------------------------------------------------------
@@ -2828,7 +5861,7 @@ class SnoopR(plugins.Plugin):
                 {'mac': d[0], 'type': d[1], 'name': d[2], 'device_type': d[3], 'vendor': d[4],
                  'encryption': d[11], 'signal_strength': d[12], 'latitude': d[13],
                  'longitude': d[14], 'channel': d[15], 'auth_mode': d[16], 'altitude': d[17]}
-                for d in batch[:100]])
+                for d in batch])
 
     # -----------------------------------------------------------------
     # Alerts
@@ -2840,6 +5873,13 @@ class SnoopR(plugins.Plugin):
                 return True
         return False
 
+    def set_counts(self, counts):
+        """The one writer of counts_cache after startup, so open dashboards are pushed
+        a counts event the moment they change."""
+        self.counts_cache = counts
+        if self.web_handler:
+            self.web_handler.events.publish_counts(counts)
+
     def raise_alert(self, kind, message, extra=None):
         LOG.warning('[SnoopR] ALERT (%s): %s', kind, message)
         if self.web_handler:
@@ -2914,261 +5954,86 @@ class SnoopR(plugins.Plugin):
     # Device analysis
     # -----------------------------------------------------------------
     def update_device_status(self, mac, device_type):
-        """No DB lock is held here: 6.x held db_lock across the whole analysis
-        (including the optimiser), blocking every scan write and web request."""
+        """Analyse one device in-process. The analyzer thread normally goes through
+        iter_analysis_jobs / analyse_batch / apply_analysis_results in chunks; this
+        is the same pipeline for a single device."""
         if device_type == 'aircraft':
             return
-        try:
-            rows = self.db.get_detections_for_network(
-                mac, device_type, limit=self.analysis_row_limit,
-                days=self.analysis_days, ascending=True)
-            if len(rows) < 3:
-                return
-            meta = self.db.get_network_meta(mac, device_type) or {}
-
-            fixes = []
-            for row in rows:
-                coords = valid_coords(row['lat'], row['lon'])
-                ts = parse_ts(row['timestamp'])
-                if coords and ts:
-                    fixes.append({'lat': coords[0], 'lon': coords[1], 'ts': ts,
-                                  'rssi': row['rssi'], 'id': row['id'],
-                                  'session': row['session']})
-
-            # --- movement / velocity (rows are chronological now) ---
-            max_velocity = 0.0
-            close_fixes = [f for f in fixes
-                           if f['rssi'] is not None and f['rssi'] >= self.min_rssi_for_movement]
-            previous = None
-            for fix in fixes:
-                if previous is not None:
-                    seconds = (fix['ts'] - previous['ts']).total_seconds()
-                    if 0 < seconds <= self.time_threshold_minutes * 60:
-                        distance = haversine(previous['lat'], previous['lon'],
-                                             fix['lat'], fix['lon'])
-                        velocity = distance / seconds
-                        if velocity * MPS_TO_MPH <= self.max_plausible_velocity_mph:
-                            max_velocity = max(max_velocity, velocity)
-                previous = fix
-
-            # A device is "following" only if it was seen CLOSE (strong RSSI) in more
-            # than one well-populated place. Two extreme fixes are not evidence: one bad
-            # GPS sample or one stale cache entry can produce them, and that is what
-            # turned an ordinary drive into dozens of "snoopers".
-            zones = greedy_clusters([(f['lat'], f['lon']) for f in close_fixes],
-                                    self.min_close_separation_m, self.min_zone_fixes)
-            separation_miles = (polygon_diameter([(z['lat'], z['lon']) for z in zones])
-                                / METERS_PER_MILE)
-            followed = False
-            follow_kind = ''
-
-            # A cache artefact re-logs one frozen RSSI value at every new GPS position.
-            # A real radio never returns byte-identical signal over a mile of travel, so
-            # identical readings across separated zones are evidence of the bug, not a tail.
-            cached_rssi = self._looks_like_cached_rssi(close_fixes)
-
-            # (a) Dwell evidence: strong contact in two or more distinct places.
-            if not cached_rssi and len(zones) >= 2 and len(close_fixes) >= self.min_close_fixes:
-                span = (close_fixes[-1]['ts'] - close_fixes[0]['ts']).total_seconds()
-                if separation_miles >= self.movement_threshold and span >= 300:
-                    followed, follow_kind = True, '%d zones' % len(zones)
-
-            # (b) Continuous-contact evidence: an unbroken chain of strong fixes covering
-            # the distance. A tail on the road never dwells, so (a) alone would miss it --
-            # but an unbroken chain is exactly what a stale cache entry cannot fake.
-            if not followed and not cached_rssi:
-                run_miles, run_len, run_span = self._longest_contact_run(close_fixes)
-                if (run_len >= self.min_close_fixes and run_span >= 300
-                        and run_miles >= self.movement_threshold):
-                    followed = True
-                    follow_kind = 'unbroken contact over %d fixes' % run_len
-                    separation_miles = max(separation_miles, run_miles)
-
-            # --- persistence score ---
-            now = utcnow()
-            timestamps = [f['ts'] for f in fixes] or [parse_ts(r['timestamp']) for r in rows]
-            timestamps = [t for t in timestamps if t]
-            weights = ([0.4, 0.3, 0.2, 0.1] if self.persistence_windows == 4
-                       else [1.0 / self.persistence_windows] * self.persistence_windows)
-            score = 0.0
-            windows_hit = 0
-            for index in range(self.persistence_windows):
-                start = now - timedelta(minutes=self.persistence_window_minutes * (index + 1))
-                end = now - timedelta(minutes=self.persistence_window_minutes * index)
-                if any(start <= ts < end for ts in timestamps):
-                    score += weights[index]
-                    windows_hit += 1
-            cluster_count, _ = grid_cluster_count([(f['lat'], f['lon']) for f in fixes])
-            # Only well-populated close-range zones count towards the score.
-            close_clusters = len(zones)
-            encounters = count_encounters([f['ts'] for f in fixes],
-                                          self.encounter_gap_minutes)
-            score += 0.2 * max(0, windows_hit - 1)
-            score += 0.1 * max(0, close_clusters - 1)
-            score = min(1.0, score)
-
-            # Being visible for a long time is not evidence of surveillance: a stationary
-            # unit sees its own neighbourhood constantly. A tail is a device seen at close
-            # range in more than one place, or in more than one session.
-            reasons = []
-            if followed:
-                reasons.append('tracked across %.1f mi at >= %d dBm (%s)'
-                               % (separation_miles, self.min_rssi_for_movement,
-                                  follow_kind))
-            if (score >= self.persistence_threshold and close_clusters >= 2
-                    and encounters >= self.min_encounters):
-                reasons.append('persistence %.2f across %d close-range zones / %d encounters'
-                               % (score, close_clusters, encounters))
-            if not self.require_movement_for_snooper and score >= self.persistence_threshold:
-                reasons.append('persistence %.2f' % score)
-            if meta.get('is_randomized') and not self.flag_randomized_snoopers and not followed:
-                # Randomised BLE addresses rotate every ~15 min, so persistence alone is
-                # not evidence of anything.
-                reasons = []
-            if reasons and self._in_exempt_zone(zones):
-                # Everything happened inside a zone you told SnoopR to ignore (home, work).
-                reasons = []
-            if self.snooper_debug:
-                LOG.info('[SnoopR] eval %s/%s fixes=%d close=%d zones=%d sep=%.2fmi '
-                         'score=%.2f windows=%d encounters=%d -> %s',
-                         mac, device_type, len(fixes), len(close_fixes), len(zones),
-                         separation_miles, score, windows_hit, encounters,
-                         '; '.join(reasons) or 'clear')
-            is_snooper = bool(reasons)
-            reason_text = '; '.join(reasons)
-
-            self.db.update_persistence(mac, device_type, score, windows_hit, cluster_count)
-            self.db.update_max_velocity(mac, device_type, max_velocity)
-            if is_snooper != bool(meta.get('is_snooper')):
-                self.db.update_snooper_status(mac, device_type, is_snooper, reason_text)
-                if is_snooper and 'snooper' in self.alert_on:
-                    label = meta.get('name') or mac
-                    self.raise_alert('snooper', 'Possible tail: %s (%s) - %s'
-                                     % (label, mac, reason_text),
-                                     {'mac': mac, 'device_type': device_type})
-            elif is_snooper:
-                self.db.update_snooper_status(mac, device_type, True, reason_text)
-
-            # --- trilateration + filtered RSSI backfill ---
-            if device_type not in ('wifi', 'bluetooth'):
-                return
-            kf = KalmanFilter()
-            samples = []
-            filtered_updates = []
-            tx = self.tx_power.get(device_type, -20.0)
-            loss = self.path_loss_n.get(device_type, 2.7)
-            for fix in fixes:
-                rssi = fix['rssi']
-                if rssi is None or not (-100 <= rssi <= -20):
-                    continue
-                filtered = kf.filter(rssi)
-                filtered_updates.append((round(filtered, 2), fix['id']))
-                distance = 10 ** ((tx - filtered) / (10.0 * loss))
-                if not (0.1 <= distance <= 2000):
-                    continue
-                age_hours = max(0.0, (now - fix['ts']).total_seconds() / 3600.0)
-                samples.append((fix['lat'], fix['lon'], distance,
-                                exp(-age_hours / 24.0) / max(distance, 1.0)))
-            if filtered_updates:
-                self.db.update_filtered_rssi_batch(filtered_updates)
-            if len(samples) < self.triangulation_min_points:
-                return
-            spread = polygon_diameter([(s[0], s[1]) for s in samples])
-            if spread < 10.0:
-                return  # all observations from one spot: no geometry to solve
-            lat, lon, mse = trilaterate(samples, self.mse_threshold_m2)
-            if lat is not None:
-                self.db.update_triangulated_position(mac, device_type, str(lat), str(lon), mse)
-        except Exception as exc:  # noqa: BLE001
-            LOG.error('[SnoopR] update_device_status failed for %s (%s): %s',
-                      mac, device_type, exc)
-
-    def _looks_like_cached_rssi(self, close_fixes):
-        if not self.ignore_frozen_rssi or len(close_fixes) < 6:
-            return False
-        values = {f['rssi'] for f in close_fixes if f['rssi'] is not None}
-        if len(values) > 1:
-            return False
-        spread = polygon_diameter([(f['lat'], f['lon']) for f in close_fixes])
-        if spread < self.min_close_separation_m * 2:
-            return False  # sitting still: an unchanging reading is plausible
-        LOG.debug('[SnoopR] ignoring frozen RSSI %s across %.0f m -- looks like a stale '
-                  'cache entry rather than movement', values, spread)
-        return True
-
-    def _longest_contact_run(self, close_fixes):
-        """Longest chain of strong fixes with no gap larger than max_contact_gap_minutes.
-        Returns (miles_covered, fix_count, seconds)."""
-        best = (0.0, 0, 0.0)
-        if len(close_fixes) < 2:
-            return best
-        gap_limit = self.max_contact_gap_minutes * 60
-        start = 0
-        for index in range(1, len(close_fixes) + 1):
-            broken = (index == len(close_fixes) or
-                      (close_fixes[index]['ts']
-                       - close_fixes[index - 1]['ts']).total_seconds() > gap_limit)
-            if not broken:
+        meta = self.db.get_network_meta(mac, device_type)
+        if meta:
+            jobs = list(self.iter_analysis_jobs([meta['id']]))
+            self.apply_analysis_results(analyse_batch(AnalysisSettings(self), jobs))
+
+    def iter_analysis_jobs(self, network_ids, chunk=64):
+        """Yield (mac, device_type, meta, state_text, rows, now) per device, streaming through
+        the detections table once. No DB lock is held across the analysis itself: 6.x
+        held db_lock through the optimiser, blocking every scan write and web request.
+
+        Incremental: only detections newer than the device's stored DeviceState are read.
+        A device with nothing new is rescored from its aggregates alone, which is all a
+        sliding persistence window needs."""
+        now = utcnow().timestamp()
+        for meta, state_text, rows in self.db.iter_analysis_rows(
+                network_ids, days=self.analysis_days, limit=self.analysis_row_limit,
+                fresh_since=now - self.analysis_days * 86400, chunk=chunk):
+            if meta['device_type'] != 'aircraft':
+                yield meta['mac'], meta['device_type'], meta, state_text, rows, now
+
+    def apply_analysis_results(self, results):
+        """Write a chunk of analysis results in one transaction, then raise alerts."""
+        ok = []
+        for result in results:
+            if 'error' in result:
+                LOG.error('[SnoopR] update_device_status failed for %s (%s): %s',
+                          result['mac'], result['device_type'], result['error'])
                 continue
-            run = close_fixes[start:index]
-            if len(run) >= 2:
-                miles = polygon_diameter([(f['lat'], f['lon']) for f in run]) / METERS_PER_MILE
-                seconds = (run[-1]['ts'] - run[0]['ts']).total_seconds()
-                if miles > best[0]:
-                    best = (miles, len(run), seconds)
-            start = index
-        return best
-
-    def _in_exempt_zone(self, zones):
-        """True when every close-range zone sits inside a geofence listed in
-        snooper_exempt_zones -- your own home and office should not be evidence."""
-        if not self.snooper_exempt_zones or not zones:
-            return False
-        fences = [f for f in self.geofences if f.name in self.snooper_exempt_zones]
-        if not fences:
-            return False
-        for zone in zones:
-            if not any(f.contains(zone['lat'], zone['lon']) for f in fences):
-                return False
-        return True
+            for level, message in result['notes']:
+                LOG.log(level, '[SnoopR] %s', message)
+            ok.append(result)
+        self.db.store_analysis_results(ok)
+        if 'snooper' not in self.alert_on:
+            return
+        for result in ok:
+            verdict = result['verdict']
+            if verdict and verdict[3] and not result['was_snooper']:
+                mac, device_type = result['mac'], result['device_type']
+                label = result['name'] or mac
+                self.raise_alert('snooper', 'Possible tail: %s (%s) - %s'
+                                 % (label, mac, verdict[4]),
+                                 {'mac': mac, 'device_type': device_type})
 
     def evict_stale_state(self):
-        cutoff = time.time() - 3600
-        stale = [key for key, kf in list(self.kalman_filters.items())
-                 if kf.last_used < cutoff]
-        for key in stale:
-            self.kalman_filters.pop(key, None)
-        if stale:
-            LOG.debug('[SnoopR] evicted %d idle Kalman filters', len(stale))
+        evicted = self.kalman_filters.evict_idle(time.time() - 3600)
+        if evicted:
+            LOG.debug('[SnoopR] evicted %d idle Kalman filters', evicted)
 
     # -----------------------------------------------------------------
     # WiGLE fallback
     # -----------------------------------------------------------------
+    WIGLE_RECHECK = 60
+
     def _wigle_geolocate(self, ssid):
-        if not self.wigle_enabled or not ssid or not self.wigle_api_name:
+        """Cached WiGLE position for `ssid`, never a network call: misses are queued on
+        the WigleWorker and come back None until it has an answer. Memory entries are
+        (coords or None, valid until); an unanswered SSID is re-checked against the
+        table every WIGLE_RECHECK seconds rather than on every sweep."""
+        if not self.wigle_enabled or not ssid or not self.wigle_worker:
             return None
+        now = time.time()
         cached = self.wigle_cache.get(ssid)
-        if cached is not None:
-            return cached or None
-        try:
-            auth = base64.b64encode(
-                ('%s:%s' % (self.wigle_api_name, self.wigle_api_token)).encode()).decode()
-            resp = requests.get('https://api.wigle.net/api/v2/network/search',
-                                params={'ssid': ssid, 'resultsPerPage': 1},
-                                headers={'Authorization': 'Basic %s' % auth}, timeout=10)
-            if resp.status_code == 200:
-                results = (resp.json() or {}).get('results') or []
-                if results:
-                    coords = valid_coords(results[0].get('trilat'), results[0].get('trilong'))
-                    self.wigle_cache[ssid] = coords or False
-                    return coords
-            elif resp.status_code == 429:
-                LOG.info('[SnoopR] WiGLE rate limit reached; disabling for this session')
-                self.wigle_enabled = False
-        except (requests.RequestException, ValueError) as exc:
-            LOG.debug('[SnoopR] WiGLE lookup failed for %s: %s', ssid, exc)
-        self.wigle_cache[ssid] = False
-        return None
+        if cached is not None and cached[1] > now:
+            return cached[0]
+        coords = self.db.get_wigle_location(ssid, now)
+        if coords is False:
+            self.wigle_worker.request(ssid)
+            self.wigle_cache[ssid] = (None, now + self.WIGLE_RECHECK)
+            return None
+        self.remember_wigle(ssid, coords)
+        return coords
+
+    def remember_wigle(self, ssid, coords):
+        ttl = WigleWorker.TTL if coords else WigleWorker.NEGATIVE_TTL
+        self.wigle_cache[ssid] = (coords, time.time() + min(ttl, 3600))
 
     # -----------------------------------------------------------------
     # Scanners
@@ -3224,22 +6089,19 @@ class SnoopR(plugins.Plugin):
                     if name.casefold() in self.whitelist_ssids:
                         continue
                     manufacturer_data = getattr(adv, 'manufacturer_data', None) or {}
-                    randomized = is_randomized_mac(mac)
-                    vendor = self._lookup_oui_vendor(mac)
-                    if vendor.startswith('Unknown') and manufacturer_data:
-                        vendor = self._lookup_bt_company(next(iter(manufacturer_data)))
-                    kf = self._get_kalman(mac, 'bluetooth')
+                    vendor, classification, rogue, randomized = self.profiles.get(
+                        ('bluetooth', mac), (name, tuple(manufacturer_data)),
+                        lambda: self._ble_profile(mac, name, manufacturer_data))
+                    filtered = self.kalman_filters.filter((mac, 'bluetooth'), rssi)
                     self.add_to_buffer(make_detection(
                         mac=mac, type_='bluetooth', name=name or 'Unknown',
-                        device_type='bluetooth', vendor=vendor,
-                        classification=self._classify_device(name, manufacturer_data),
-                        is_rogue=self._detect_rogue(vendor, name),
-                        is_mesh=self._detect_mesh(adv), is_randomized=randomized,
+                        device_type='bluetooth', vendor=vendor, classification=classification,
+                        is_rogue=rogue, is_mesh=self._detect_mesh(adv), is_randomized=randomized,
                         vulnerabilities=self._detect_vulnerabilities(adv),
                         anomalies=self._detect_ble_anomalies(adv, mac),
                         signal_strength=int(rssi), latitude=lat, longitude=lon,
                         altitude=self.last_gps['altitude'], session_id=self.session_id,
-                        filtered_rssi=round(kf.filter(rssi), 2)))
+                        filtered_rssi=round(filtered, 2)))
                 LOG.debug('[SnoopR] BLE sweep: %d devices', len(devices))
             except asyncio.CancelledError:
                 return
@@ -3247,6 +6109,19 @@ class SnoopR(plugins.Plugin):
                 LOG.error('[SnoopR] BLE scan error: %s', exc)
             await asyncio.sleep(self.scan_interval)
 
+    def _ble_profile(self, mac, name, manufacturer_data):
+        vendor = self._lookup_oui_vendor(mac)
+        if vendor.startswith('Unknown') and manufacturer_data:
+            vendor = self._lookup_bt_company(next(iter(manufacturer_data)))
+        return (vendor, self._classify_device(name, manufacturer_data),
+                self._detect_rogue(vendor, name), is_randomized_mac(mac))
+
+    def _wifi_profile(self, mac, ssid, vendor_hint):
+        """(vendor, is_rogue, is_randomized); clients pass ssid=None (no rogue test)."""
+        vendor = vendor_hint or self._lookup_oui_vendor(mac)
+        rogue = self._detect_rogue(vendor, ssid) if ssid is not None else 0
+        return vendor, rogue, is_randomized_mac(mac)
+
     def _bleak_thread(self):
         self.loop = asyncio.new_event_loop()
         asyncio.set_event_loop(self.loop)
@@ -3288,20 +6163,23 @@ class SnoopR(plugins.Plugin):
                 coords = self._wigle_geolocate(ssid)
                 if coords:
                     ap_lat, ap_lon = str(coords[0]), str(coords[1])
-            vendor = ap.get('vendor') or self._lookup_oui_vendor(mac)
+            vendor_hint = ap.get('vendor')
+            vendor, rogue, randomized = self.profiles.get(
+                ('wifi-ap', mac), (ssid, vendor_hint),
+                lambda: self._wifi_profile(mac, ssid, vendor_hint))
             encryption = '%s%s%s' % (ap.get('encryption', ''), ap.get('cipher', ''),
                                      ap.get('authentication', ''))
             channel = ap.get('channel', 0) or 0
             auth_mode = ap.get('authentication', '') or ''
-            kf = self._get_kalman(mac, 'wifi')
             self.add_to_buffer(make_detection(
                 mac=mac, type_='wi-fi ap', name=ssid, device_type='wifi', vendor=vendor,
-                classification='WiFi AP', is_rogue=self._detect_rogue(vendor, ssid),
-                is_randomized=is_randomized_mac(mac), encryption=encryption,
+                classification='WiFi AP', is_rogue=rogue, is_randomized=randomized,
+                encryption=encryption,
                 signal_strength=rssi, latitude=ap_lat, longitude=ap_lon, channel=channel,
                 auth_mode=auth_mode, altitude=self.last_gps['altitude'],
                 session_id=self.session_id,
-                filtered_rssi=round(kf.filter(rssi), 2) if rssi is not None else None))
+                filtered_rssi=(round(self.kalman_filters.filter((mac, 'wifi'), rssi), 2)
+                               if rssi is not None else None)))
 
             for client in ap.get('clients') or []:
                 client_mac = norm_mac(client if isinstance(client, str) else client.get('mac'))
@@ -3309,15 +6187,18 @@ class SnoopR(plugins.Plugin):
                     continue
                 client_name = '' if isinstance(client, str) else (client.get('hostname') or '')
                 client_rssi = rssi if isinstance(client, str) else client.get('rssi', rssi)
-                client_kf = self._get_kalman(client_mac, 'wifi')
+                client_vendor, _, client_randomized = self.profiles.get(
+                    ('wifi-client', client_mac), None,
+                    lambda: self._wifi_profile(client_mac, None, None))
                 self.add_to_buffer(make_detection(
                     mac=client_mac, type_='wi-fi client', name=client_name, device_type='wifi',
-                    vendor=self._lookup_oui_vendor(client_mac), classification='WiFi Client',
-                    is_randomized=is_randomized_mac(client_mac), encryption=encryption,
+                    vendor=client_vendor, classification='WiFi Client',
+                    is_randomized=client_randomized, encryption=encryption,
                     signal_strength=client_rssi, latitude=ap_lat, longitude=ap_lon,
                     channel=channel, auth_mode=auth_mode,
                     altitude=self.last_gps['altitude'], session_id=self.session_id,
-                    filtered_rssi=(round(client_kf.filter(client_rssi), 2)
+                    filtered_rssi=(round(self.kalman_filters.filter((client_mac, 'wifi'),
+                                                                    client_rssi), 2)
                                    if client_rssi is not None else None)))
 
     def _ap_is_fresh(self, ap, now):
@@ -3358,7 +6239,9 @@ class SnoopR(plugins.Plugin):
                 threading.Thread(target=self._download_bt_company_db, daemon=True,
                                  name='snoopr-btdb').start()
 
-            self.db = Database(self.db_path)
+            self.db = Database(self.db_path,
+                               persistence_threshold=self.persistence_threshold,
+                               partition_days=self.partition_days)
             self.session_id = self.db.new_session()
             self.counts_cache = self.db.get_network_counts(self.persistence_threshold)
             LOG.info('[SnoopR] session %s started', self.session_id)
@@ -3368,18 +6251,23 @@ class SnoopR(plugins.Plugin):
             else:
                 self.opensky = OpenSkyClient()  # anonymous, heavily rate limited
             if self.aircraft_db_csv:
-                self.local_aircraft_db = LocalAircraftDB(self.aircraft_db_csv)
+                self.local_aircraft_db = LocalAircraftDB(self.aircraft_db_csv,
+                                                         cache_dir=self.base_dir)
 
             self.web_handler = WebHandler(self)
 
             self.threads = [
                 AircraftProcessor(self, interval=self.aircraft_interval),
                 PersistenceAnalyzer(self, interval=self.update_interval,
-                                    analysis_days=self.analysis_days),
+                                    analysis_days=self.analysis_days,
+                                    workers=self.analysis_workers),
                 MaintenanceThread(self, interval=self.prune_interval_hours * 3600),
                 CountsThread(self, interval=10),
                 BufferFlusher(self, interval=2.0),
             ]
+            if self.wigle_enabled and self.wigle_api_name:
+                self.wigle_worker = WigleWorker(self, per_hour=self.wigle_requests_per_hour)
+                self.threads.append(self.wigle_worker)
             for thread in self.threads:
                 thread.start()
 
@@ -3387,7 +6275,9 @@ class SnoopR(plugins.Plugin):
                 try:
                     self.mesh = MeshNetwork(self.mesh_host, self.mesh_port, self.mesh_peers,
                                             self.mesh_key, HAS_CRYPTO,
-                                            self.mesh_allow_plaintext)
+                                            self.mesh_allow_plaintext,
+                                            wire_format=self.mesh_wire_format,
+                                            resend_after=self.mesh_resend_after)
                     self.mesh_receiver = MeshReceiver(self)
                     self.mesh_receiver.start()
                     LOG.info('[SnoopR] mesh listening on %s:%s with %d peer(s)',
@@ -3412,6 +6302,9 @@ class SnoopR(plugins.Plugin):
         LOG.info('[SnoopR] unloading')
         self.ready = False
         self.stop_event.set()
+        if self.web_handler:
+            # Wakes the SSE generators blocked on the hub so they see stop_event.
+            self.web_handler.events.close()
         for thread in self.threads:
             thread.stop()
         if self.bleak_task and self.bleak_task.is_alive() and self.loop:
@@ -3426,10 +6319,11 @@ class SnoopR(plugins.Plugin):
             self.flush_detection_buffer()
         except Exception as exc:  # noqa: BLE001
             LOG.error('[SnoopR] final flush failed: %s', exc)
-        if self.mesh:
-            self.mesh.close()
         if self.mesh_receiver:
+            # Writes its last coalesced batch on the way out, so before disconnect().
             self.mesh_receiver.join(timeout=3)
+        if self.mesh:
+            self.mesh.close()
         if self.db:
             # Pruning (and VACUUM) happens in MaintenanceThread, not here: it used to be
             # able to hang shutdown for minutes on a large database.
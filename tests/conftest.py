@@ -0,0 +1,82 @@
+"""Shared fixtures for the SnoopR tests.
+
+snoopr.py is a pwnagotchi plugin and imports the host application at module level. When
+the tests run outside a pwnagotchi image, the few names it imports are registered as
+bare modules first; nothing under test touches them."""
+import importlib.util
+import os
+import sys
+import types
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _install_host_modules():
+    try:
+        import pwnagotchi  # noqa: F401
+        return
+    except ImportError:
+        pass
+
+    class Plugin:
+        def __init__(self):
+            self.options = {}
+
+    class LabeledValue:
+        def __init__(self, *args, **kwargs):
+            pass
+
+    modules = {
+        'pwnagotchi': {},
+        'pwnagotchi.plugins': {'Plugin': Plugin},
+        'pwnagotchi.ui': {},
+        'pwnagotchi.ui.fonts': {'Small': None, 'Medium': None, 'Bold': None,
+                                'BoldSmall': None},
+        'pwnagotchi.ui.components': {'LabeledValue': LabeledValue},
+        'pwnagotchi.ui.view': {'BLACK': 0},
+    }
+    for name, attrs in modules.items():
+        module = types.ModuleType(name)
+        module.__dict__.update(attrs)
+        sys.modules[name] = module
+    sys.modules['pwnagotchi'].plugins = sys.modules['pwnagotchi.plugins']
+    sys.modules['pwnagotchi'].ui = sys.modules['pwnagotchi.ui']
+    for sub in ('fonts', 'components', 'view'):
+        setattr(sys.modules['pwnagotchi.ui'], sub, sys.modules['pwnagotchi.ui.' + sub])
+
+
+@pytest.fixture(scope='session')
+def snoopr():
+    _install_host_modules()
+    spec = importlib.util.spec_from_file_location('snoopr', os.path.join(ROOT, 'snoopr.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def db(snoopr, tmp_path):
+    database = snoopr.Database(str(tmp_path / 'snoopr.db'))
+    yield database
+    database.disconnect()
+
+
+@pytest.fixture
+def plugin(snoopr, tmp_path):
+    """A configured SnoopR on a fresh database, without starting its threads."""
+    instance = snoopr.SnoopR()
+    instance.options.update({'base_dir': str(tmp_path)})
+    instance._load_config()
+    instance.db = snoopr.Database(str(tmp_path / 'snoopr.db'))
+    instance.session_id = instance.db.new_session()
+    yield instance
+    instance.db.disconnect()
+
+
+def wifi_detection(snoopr, index, session_id, rssi=-60, lat=37.7749, lon=-122.4194, name=None):
+    return snoopr.make_detection(
+        mac='02:00:00:00:%02X:%02X' % (index // 256, index % 256), type_='wi-fi ap',
+        name=name if name is not None else 'net%d' % index, device_type='wifi',
+        signal_strength=rssi, latitude=str(lat), longitude=str(lon), session_id=session_id)
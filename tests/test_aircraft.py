@@ -0,0 +1,213 @@
+import json
+import os
+from datetime import timedelta
+
+import pytest
+
+
+class ReplayFeed:
+    def __init__(self, records):
+        self.records = records
+
+    def poll(self):
+        return [dict(record) for record in self.records]
+
+    def close(self):
+        pass
+
+
+def test_hovering_aircraft_is_flagged_circling(snoopr, plugin, monkeypatch):
+    hover = {'hex': 'abc123', 'lat': 37.7, 'lon': -122.4, 'alt_baro': 1500,
+             'flight': 'HOVER1', 'gs': 90, 'track': 90.0}
+    processor = snoopr.AircraftProcessor(plugin, interval=15)
+    processor.feed.close()
+    processor.feed = ReplayFeed([hover])
+    processor._queue_lookup = lambda icao: None
+    start = snoopr.utcnow()
+    clock = {'now': start}
+    monkeypatch.setattr(snoopr, 'utcnow', lambda: clock['now'])
+    try:
+        for poll in range(12):
+            clock['now'] = start + timedelta(seconds=15 * poll)
+            processor.tick()
+    finally:
+        processor.stop()
+
+    assert len(plugin.aircraft_tracks.get('abc123')) == 12
+    assert 'Circling' in processor.cache['abc123']['anomalies']
+    meta = plugin.db._connection.execute(
+        "SELECT anomalies FROM networks WHERE mac = 'abc123'").fetchone()
+    assert 'Circling' in meta[0]
+
+
+def test_unchanged_record_is_not_stored_again(snoopr, plugin, monkeypatch):
+    cruise = {'hex': 'def456', 'lat': 37.7, 'lon': -122.4, 'alt_baro': 30000,
+              'flight': 'CRUISE', 'gs': 450, 'track': 90.0}
+    processor = snoopr.AircraftProcessor(plugin, interval=15)
+    processor.feed.close()
+    processor.feed = ReplayFeed([cruise])
+    processor._queue_lookup = lambda icao: None
+    start = snoopr.utcnow()
+    clock = {'now': start}
+    monkeypatch.setattr(snoopr, 'utcnow', lambda: clock['now'])
+    try:
+        for poll in range(3):
+            clock['now'] = start + timedelta(seconds=15 * poll)
+            processor.tick()
+    finally:
+        processor.stop()
+
+    hits = plugin.db._connection.execute(
+        "SELECT COUNT(*) FROM detections d JOIN networks n ON n.id = d.network_id "
+        "WHERE n.mac = 'def456'").fetchone()[0]
+    assert hits == 1
+
+
+@pytest.mark.parametrize('source, host, port', [
+    ('sbs://adsb.local', 'adsb.local', 30003),
+    ('sbs://adsb.local/', 'adsb.local', 30003),
+    ('sbs://10.0.0.5:30005', '10.0.0.5', 30005),
+    ('sbs://[::1]', '::1', 30003),
+    ('sbs://[::1]:30004', '::1', 30004),
+    ('sbs://', '127.0.0.1', 30003),
+])
+def test_sbs_source_spellings(snoopr, monkeypatch, source, host, port):
+    opened = []
+    monkeypatch.setattr(snoopr, 'SbsFeed', lambda h, p: opened.append((h, p)) or 'feed')
+    assert snoopr.open_aircraft_feed(source, '/tmp/aircraft.json') == 'feed'
+    assert opened == [(host, port)]
+
+
+@pytest.mark.parametrize('source', ['sbs://adsb.local:port', 'sbs://adsb.local:99999',
+                                    'sbs://[::1'])
+def test_bad_sbs_source_falls_back_to_the_file(snoopr, monkeypatch, source):
+    monkeypatch.setattr(snoopr, 'SbsFeed', lambda h, p: pytest.fail('opened %s:%s' % (h, p)))
+    feed = snoopr.open_aircraft_feed(source, '/tmp/aircraft.json')
+    assert isinstance(feed, snoopr.JsonSnapshotFeed) and feed.path == '/tmp/aircraft.json'
+
+
+def append(path, *docs):
+    with open(path, 'a') as handle:
+        for doc in docs:
+            handle.write(json.dumps(doc) + '\n')
+
+
+def test_jsonl_feed_skips_history_then_follows(snoopr, tmp_path):
+    path = str(tmp_path / 'feed.jsonl')
+    append(path, {'hex': 'old'})
+    feed = snoopr.JsonLinesFeed(path)
+    try:
+        assert feed.poll() == []
+        append(path, {'hex': 'a1'}, {'aircraft': [{'hex': 'a2'}, {'hex': 'a3'}]})
+        with open(path, 'a') as handle:
+            handle.write('{"hex": "a4"')
+        assert [r['hex'] for r in feed.poll()] == ['a1', 'a2', 'a3']
+        with open(path, 'a') as handle:
+            handle.write('}\n')
+        assert [r['hex'] for r in feed.poll()] == ['a4']
+    finally:
+        feed.close()
+
+
+def test_jsonl_feed_resumes_after_read_error(snoopr, tmp_path, monkeypatch):
+    path = str(tmp_path / 'feed.jsonl')
+    append(path, {'hex': 'old'})
+    feed = snoopr.JsonLinesFeed(path)
+    try:
+        feed.poll()
+        append(path, {'hex': 'a1'})
+        with open(path, 'a') as handle:
+            handle.write('{"hex": ')
+        stat = snoopr.os.stat
+        monkeypatch.setattr(snoopr.os, 'stat', lambda p: (_ for _ in ()).throw(OSError('EIO')))
+        assert feed.poll() == [] and feed.handle is None
+        monkeypatch.setattr(snoopr.os, 'stat', stat)
+        with open(path, 'a') as handle:
+            handle.write('"a2"}\n')
+        append(path, {'hex': 'a3'})
+        assert [r['hex'] for r in feed.poll()] == ['a1', 'a2', 'a3']
+    finally:
+        feed.close()
+
+
+def test_jsonl_feed_reads_replaced_and_truncated_files_from_the_start(snoopr, tmp_path):
+    path = str(tmp_path / 'feed.jsonl')
+    feed = snoopr.JsonLinesFeed(path)
+    try:
+        # Created after we started: everything in it is live.
+        assert feed.poll() == []
+        append(path, {'hex': 'a1'})
+        assert [r['hex'] for r in feed.poll()] == ['a1']
+        os.rename(path, path + '.1')
+        append(path, {'hex': 'b1'}, {'hex': 'b2'})
+        assert [r['hex'] for r in feed.poll()] == ['b1', 'b2']
+        with open(path, 'w') as handle:
+            handle.write(json.dumps({'hex': 'c1'}) + '\n')
+        assert [r['hex'] for r in feed.poll()] == ['c1']
+    finally:
+        feed.close()
+
+
+def write_aircraft_csv(path, rows):
+    with open(path, 'w', newline='') as handle:
+        handle.write('icao24,registration,typecode,owner\n')
+        for row in rows:
+            handle.write(','.join(row) + '\n')
+
+
+def test_local_aircraft_db_hit_miss_and_duplicates(snoopr, tmp_path, monkeypatch):
+    # A tiny run size so the conversion merges several spilled runs.
+    monkeypatch.setattr(snoopr.LocalAircraftDB, 'SORT_RUN', 3)
+    path = str(tmp_path / 'aircraft.csv')
+    rows = [('%06x' % (i * 7919 % 0xffffff), 'N%d' % i, 'B738', 'Owner %d' % i)
+            for i in range(20)]
+    rows += [('not-hex', 'X', 'X', 'X'), ("'4CA1D2'", 'EI-DVM', 'A320', 'Ryanair'),
+             ('4ca1d2', 'EI-DVN', 'A320', 'Ryanair')]
+    write_aircraft_csv(path, rows)
+    aircraft = snoopr.LocalAircraftDB(path, cache_dir=str(tmp_path))
+    assert aircraft.lookup('4CA1D2') == {'registration': 'EI-DVN', 'type': 'A320',
+                                         'owner': 'Ryanair'}
+    assert aircraft.count == 21
+    for icao, registration, _, owner in rows[:20]:
+        assert aircraft.lookup(icao) == {'registration': registration, 'type': 'B738',
+                                         'owner': owner}
+    assert aircraft.lookup('000001') is None
+    assert aircraft.lookup('~zz') is None
+    assert os.path.exists(aircraft.index_path)
+    assert sorted(os.listdir(tmp_path)) == ['aircraft.csv', 'aircraft.csv.idx']
+
+
+def test_local_aircraft_db_rebuilds_a_stale_index(snoopr, tmp_path, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(snoopr.time, 'time', lambda: clock[0])
+    path = str(tmp_path / 'aircraft.csv')
+    write_aircraft_csv(path, [('abc123', 'G-OLD', 'C172', 'Club')])
+    aircraft = snoopr.LocalAircraftDB(path, cache_dir=str(tmp_path))
+    assert aircraft.lookup('abc123')['registration'] == 'G-OLD'
+
+    converted = []
+    convert = snoopr.LocalAircraftDB._convert
+
+    def recording_convert(self, st):
+        # Lookups are not blocked by a conversion; they answer from the old index.
+        converted.append(self.lookup('abc123'))
+        return convert(self, st)
+    monkeypatch.setattr(snoopr.LocalAircraftDB, '_convert', recording_convert)
+    write_aircraft_csv(path, [('abc123', 'G-NEW', 'C172', 'Club'),
+                              ('def456', 'G-TWO', 'PA28', 'Club')])
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 10 ** 9))
+    # Not re-checked until CHECK_INTERVAL has passed.
+    assert aircraft.lookup('abc123')['registration'] == 'G-OLD'
+    assert aircraft.lookup('def456') is None and not converted
+    clock[0] += snoopr.LocalAircraftDB.CHECK_INTERVAL
+    assert aircraft.lookup('abc123')['registration'] == 'G-NEW'
+    assert aircraft.lookup('def456')['registration'] == 'G-TWO'
+    assert converted == [{'registration': 'G-OLD', 'type': 'C172', 'owner': 'Club'}]
+
+    # A fresh instance reuses the index on disk instead of converting again.
+    again = snoopr.LocalAircraftDB(path, cache_dir=str(tmp_path))
+    assert again.lookup('def456')['registration'] == 'G-TWO'
+    assert len(converted) == 1
+    clock[0] += snoopr.LocalAircraftDB.CHECK_INTERVAL
+    assert aircraft.lookup('abc123')['registration'] == 'G-NEW'
+    assert len(converted) == 1
@@ -0,0 +1,186 @@
+import math
+import pickle
+import sys
+from concurrent.futures import Future
+
+import pytest
+
+from conftest import wifi_detection
+
+
+class FailingFirstPool:
+    """Runs chunks inline; the first one fails, and like a real executor it refuses
+    work once shut down."""
+
+    def __init__(self):
+        self.submitted = 0
+        self.closed = False
+
+    def submit(self, fn, *args):
+        if self.closed:
+            raise RuntimeError('cannot schedule new futures after shutdown')
+        self.submitted += 1
+        future = Future()
+        if self.submitted == 1:
+            future.set_exception(ValueError('worker died'))
+        else:
+            future.set_result(fn(*args))
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.closed = True
+
+
+def dirty_count(db):
+    return db._connection.execute('SELECT COUNT(*) FROM dirty_devices').fetchone()[0]
+
+
+def test_worker_failure_falls_back_to_in_thread_analysis(snoopr, plugin):
+    plugin.db.add_detection_batch([wifi_detection(snoopr, i, plugin.session_id)
+                                   for i in range(300)])
+    assert dirty_count(plugin.db) == 300
+    analyzer = snoopr.PersistenceAnalyzer(plugin, workers=1)
+    pool = analyzer.pool = FailingFirstPool()
+
+    analyzer.tick()
+
+    assert pool.closed and analyzer.pool is None
+    # Only the failed chunk is left for the next pass.
+    assert dirty_count(plugin.db) == snoopr.PersistenceAnalyzer.CHUNK
+
+
+def test_in_thread_analysis_clears_the_queue(snoopr, plugin):
+    plugin.db.add_detection_batch([wifi_detection(snoopr, i, plugin.session_id)
+                                   for i in range(20)])
+    snoopr.PersistenceAnalyzer(plugin, workers=0).tick()
+    assert dirty_count(plugin.db) == 0
+
+
+class DeadPool(FailingFirstPool):
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_exception(OSError('worker killed'))
+        return future
+
+
+def test_pool_is_given_up_after_repeated_failures(snoopr, plugin, caplog):
+    plugin.db.add_detection_batch([wifi_detection(snoopr, i, plugin.session_id)
+                                   for i in range(20)])
+    analyzer = snoopr.PersistenceAnalyzer(plugin, workers=2)
+    pools = []
+
+    def get_pool():
+        if analyzer.workers > 0 and analyzer.pool is None:
+            analyzer.pool = DeadPool()
+            pools.append(analyzer.pool)
+        return analyzer.pool
+
+    analyzer._get_pool = get_pool
+    for _ in range(snoopr.PersistenceAnalyzer.MAX_POOL_FAILURES):
+        analyzer.tick()
+        assert dirty_count(plugin.db) == 20
+    assert analyzer.workers == 0 and len(pools) == 3
+    assert sum('analysing in-thread from now on' in r.getMessage()
+               for r in caplog.records) == 1
+
+    analyzer.tick()
+    assert len(pools) == 3 and dirty_count(plugin.db) == 0
+
+
+def test_worker_payload_pickles_without_the_plugin_module(snoopr, plugin, monkeypatch):
+    plugin.geofences = [snoopr.Geofence('home', 'circle', (37.7, -122.4, 150.0))]
+    plugin.snooper_exempt_zones = ['home']
+    settings = snoopr.AnalysisSettings(plugin)
+    # pwnagotchi never registers plugins in sys.modules, and neither does conftest.
+    assert sys.modules.get(snoopr.__name__) is not snoopr
+    payload = pickle.dumps((snoopr.WorkerRef('analyse_batch'), settings))
+
+    # What the worker's bootstrap registers.
+    monkeypatch.setitem(sys.modules, snoopr.ANALYSIS_WORKER_MODULE, snoopr)
+    fn, restored = pickle.loads(payload)
+    assert fn is snoopr.analyse_batch
+    assert isinstance(restored, snoopr.AnalysisSettings)
+    assert restored.analysis_row_limit == settings.analysis_row_limit
+    assert restored.exempt_fences[0].contains(37.7, -122.4)
+    assert not restored.exempt_fences[0].contains(37.8, -122.4)
+
+
+def tail_rows(count=120, start=1_700_000_000):
+    """A device following the car along a road: strong, varying RSSI at every fix,
+    with a few rows lacking GPS and one long stop that opens a second encounter."""
+    rows = []
+    ts = start
+    for i in range(count):
+        ts += 3600 if i == 70 else 30
+        fix = i % 9 != 4
+        rows.append({'id': i + 1, 'rssi': -50 - (i * 7) % 15,
+                     'lat': 37.70 + 0.0004 * i if fix else None,
+                     'lon': -122.40 + 0.0003 * i if fix else None,
+                     'alt': None, 'timestamp': ts, 'filtered_rssi': None, 'session': 1})
+    return rows
+
+
+def beacon_rows(count=90, start=1_700_000_000):
+    """A fixed beacon circled at 60 m, its RSSI matching that range under the default
+    path-loss model, so trilateration has geometry to solve."""
+    rows = []
+    for i in range(count):
+        angle = i * 0.7
+        rows.append({'id': i + 1, 'rssi': -68,
+                     'lat': 37.80 + 60 / 111320.0 * math.sin(angle),
+                     'lon': -122.30 + 60 / (111320.0 * math.cos(math.radians(37.8)))
+                     * math.cos(angle),
+                     'alt': None, 'timestamp': start + 20 * i, 'filtered_rssi': None,
+                     'session': 1})
+    return rows
+
+
+def analyse_in_passes(snoopr, settings, rows, cuts, now):
+    meta = {'id': 1, 'is_randomized': False, 'is_snooper': False, 'name': 'dev'}
+    state_text, result = None, None
+    bounds = [0] + list(cuts) + [len(rows)]
+    for lo, hi in zip(bounds, bounds[1:]):
+        result = snoopr.analyse_device(
+            settings, ('02:00:00:00:00:01', 'wifi', meta, state_text, rows[lo:hi], now))
+        state_text = result['state']
+    return result
+
+
+def assert_same_outcome(one, other):
+    assert one['verdict'][:4] == pytest.approx(other['verdict'][:4])
+    assert one['verdict'][4] == other['verdict'][4]
+    assert one['max_velocity'] == pytest.approx(other['max_velocity'])
+    if one['position'] is None:
+        assert other['position'] is None
+    else:
+        assert other['position'] == pytest.approx(one['position'], rel=1e-6)
+
+
+@pytest.mark.parametrize('cuts', [(1,), (10, 11, 12), (30, 70, 71, 100), tuple(range(5, 120, 5))])
+def test_incremental_passes_match_full_rescan(snoopr, plugin, cuts):
+    settings = snoopr.AnalysisSettings(plugin)
+    rows = tail_rows()
+    now = rows[-1]['timestamp'] + 60
+    full = analyse_in_passes(snoopr, settings, rows, (), now)
+    assert full['verdict'][3], full['verdict']
+    assert_same_outcome(full, analyse_in_passes(snoopr, settings, rows, cuts, now))
+
+
+@pytest.mark.parametrize('cuts', [(45,), (3, 4, 50, 89), tuple(range(2, 90, 7))])
+def test_incremental_location_matches_full_rescan(snoopr, plugin, cuts):
+    settings = snoopr.AnalysisSettings(plugin)
+    rows = beacon_rows()
+    now = rows[-1]['timestamp'] + 60
+    full = analyse_in_passes(snoopr, settings, rows, (), now)
+    lat, lon, _ = full['position']
+    assert snoopr.haversine(lat, lon, 37.80, -122.30) < 15
+    assert_same_outcome(full, analyse_in_passes(snoopr, settings, rows, cuts, now))
+
+
+def test_samples_follow_analysis_row_limit(snoopr, plugin):
+    plugin.analysis_row_limit = 40
+    settings = snoopr.AnalysisSettings(plugin)
+    rows = beacon_rows()
+    result = analyse_in_passes(snoopr, settings, rows, (30, 60), rows[-1]['timestamp'] + 60)
+    samples = snoopr.DeviceState.loads(result['state']).samples
+    assert len(samples) == 40 and samples[-1][3] == rows[-1]['timestamp']
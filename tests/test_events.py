@@ -0,0 +1,98 @@
+import json
+import threading
+import time
+
+
+def decode(frame):
+    head, data = frame.rstrip('\n').split('\n')
+    return head[len('event: '):], json.loads(data[len('data: '):])
+
+
+def test_slow_subscriber_loses_oldest_frames(snoopr, monkeypatch):
+    monkeypatch.setattr(snoopr.EventHub, 'QUEUE', 4)
+    hub = snoopr.EventHub()
+    slow = hub.subscribe({'alert'})
+    for i in range(10):
+        hub.publish_alert('test', 'alert %d' % i)
+    frames = hub.wait(slow, 0)
+    assert [decode(f)[1]['message'] for f in frames] == ['alert %d' % i for i in range(6, 10)]
+    assert hub.stats() == {'subscribers': 1, 'published': 10, 'dropped': 6}
+    assert hub.wait(slow, 0) == []
+
+
+def test_frames_go_only_to_matching_kinds(snoopr):
+    hub = snoopr.EventHub()
+    counts_only = hub.subscribe({'counts'})
+    both = hub.subscribe({'counts', 'alert'})
+    hub.publish_counts({'wifi': 1})
+    hub.publish_alert('geofence', 'entered home')
+    assert [decode(f)[0] for f in hub.wait(counts_only, 0)] == ['counts']
+    assert [decode(f)[0] for f in hub.wait(both, 0)] == ['counts', 'alert']
+    hub.unsubscribe(both)
+    hub.publish_alert('geofence', 'left home')
+    assert hub.stats()['subscribers'] == 1 and not both.queue
+
+
+def test_publish_counts_skips_repeats(snoopr):
+    hub = snoopr.EventHub()
+    sub = hub.subscribe({'counts'})
+    counts = {'wifi': 3, 'bluetooth': 1}
+    hub.publish_counts(counts)
+    hub.publish_counts(dict(counts))
+    # The hub kept its own copy: changing the caller's dict is a change.
+    counts['wifi'] = 4
+    hub.publish_counts(counts)
+    hub.publish_counts(counts)
+    assert [decode(f)[1]['wifi'] for f in hub.wait(sub, 0)] == [3, 4]
+    assert hub.stats()['published'] == 2
+
+
+def test_subscribe_primes_counts_and_alert_history(snoopr, monkeypatch):
+    monkeypatch.setattr(snoopr.EventHub, 'HISTORY', 3)
+    hub = snoopr.EventHub()
+    for i in range(5):
+        hub.publish_alert('test', 'alert %d' % i)
+    hub.publish_counts({'wifi': 7})
+
+    late = hub.subscribe({'counts', 'alert'}, history=True)
+    frames = [decode(f) for f in hub.wait(late, 0)]
+    assert frames[0] == ('counts', {'wifi': 7})
+    assert [(kind, data['id']) for kind, data in frames[1:]] == [
+        ('alert', 3), ('alert', 4), ('alert', 5)]
+    assert hub.wait(hub.subscribe({'alert'}), 0) == []
+    assert [decode(f)[0] for f in hub.wait(hub.subscribe({'counts'}, history=True), 0)] == [
+        'counts']
+
+
+def test_wait_wakes_on_publish_and_close(snoopr):
+    hub = snoopr.EventHub()
+    sub = hub.subscribe({'alert'})
+    results = []
+
+    def waiter():
+        results.append(hub.wait(sub, 30))
+
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    time.sleep(0.05)
+    hub.publish_alert('test', 'wake up')
+    thread.join(5)
+    assert not thread.is_alive() and len(results[0]) == 1
+
+    thread = threading.Thread(target=waiter)
+    started = time.monotonic()
+    thread.start()
+    time.sleep(0.05)
+    hub.close()
+    thread.join(5)
+    assert not thread.is_alive() and results[1] == []
+    assert time.monotonic() - started < 5
+    # Once closed, wait() returns straight away.
+    assert hub.wait(sub, 30) == []
+
+
+def test_wait_times_out(snoopr):
+    hub = snoopr.EventHub()
+    started = time.monotonic()
+    assert hub.wait(hub.subscribe({'counts'}), 0.05) == []
+    assert time.monotonic() - started >= 0.05
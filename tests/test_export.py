@@ -0,0 +1,113 @@
+import pytest
+
+from conftest import wifi_detection
+
+
+def interleave(db):
+    """Give every row a distinct timestamp, with the partitions' ranges overlapping,
+    so the per-partition trail runs really have to be merged."""
+    conn = db._connection
+    with db.db_lock, conn:
+        for _, name, _, typed in db._partitions:
+            if typed:
+                conn.execute('UPDATE %s SET timestamp = 1700000000 + (id * 37) %% 1000 * 10 '
+                             '+ id %% 10' % name)
+
+
+@pytest.fixture
+def partitioned(snoopr, tmp_path):
+    """Three partitions holding interleaved fixes for networks 0-3; network 4 has only
+    rows without a fix."""
+    db = snoopr.Database(str(tmp_path / 'snoopr.db'), partition_days=1)
+    session = db.new_session()
+    conn = db._connection
+    for round_ in range(3):
+        db.add_detection_batch([
+            wifi_detection(snoopr, i, session, rssi=-40 - round_ * 10 - step,
+                           lat=37.0 + round_ + step / 100.0, lon=-122.0 - i)
+            for i in range(4) for step in range(5)])
+        db.add_detection_batch([wifi_detection(snoopr, 4, session, lat='-', lon='-')])
+        with db.db_lock, conn:
+            conn.execute('UPDATE detection_partitions SET starts = starts - 864000, '
+                         'ends = ends - 864000')
+            db._load_partitions(conn)
+    interleave(db)
+    assert len(db._partitions) == 3
+    yield db
+    db.disconnect()
+
+
+def expected_trail(db, mac, limit):
+    return [{'latitude': lat, 'longitude': lon, 'timestamp': stamp, 'signal_strength': rssi}
+            for lat, lon, stamp, rssi in db._connection.execute('''
+                SELECT d.latitude, d.longitude,
+                       datetime(d.timestamp, 'unixepoch', 'localtime'), d.signal_strength
+                FROM detections d JOIN networks n ON n.id = d.network_id
+                WHERE n.mac = ? AND d.latitude IS NOT NULL
+                ORDER BY d.timestamp LIMIT ?''', (mac, limit))]
+
+
+@pytest.mark.parametrize('limit', [1, 2, 7, 500])
+def test_trails_match_the_view_in_timestamp_order(snoopr, partitioned, limit):
+    nets = list(partitioned.iter_networks(path_limit=limit))
+    assert len(nets) == 5
+    for net in nets:
+        expected = expected_trail(partitioned, net['mac'], limit)
+        if len(expected) > 1:
+            assert net['path'] == expected
+            assert len(expected) == min(limit, 15)
+        else:
+            assert 'path' not in net
+
+
+def test_trails_only_for_scored_or_flagged_networks(snoopr, partitioned):
+    conn = partitioned._connection
+    with partitioned.db_lock, conn:
+        conn.execute("UPDATE networks SET persistence_score = 0.5 WHERE mac LIKE '%:00'")
+        conn.execute("UPDATE networks SET persistence_score = 0.4 WHERE mac LIKE '%:01'")
+        conn.execute("UPDATE networks SET is_snooper = 1 WHERE mac LIKE '%:02'")
+    with_path = [net['mac'][-2:] for net in partitioned.iter_networks(path_min_score=0.4)
+                 if 'path' in net]
+    assert with_path == ['00', '02']
+
+
+def test_trail_reads_use_the_fix_index_and_stop_at_the_limit(snoopr, partitioned,
+                                                            monkeypatch):
+    plans, fetched = [], []
+    read_trail = snoopr.Database._read_trail
+
+    def traced(conn, queries, net_id, path_limit):
+        for query in queries:
+            plans.extend(row[-1] for row in conn.execute(
+                'EXPLAIN QUERY PLAN ' + query, (net_id, path_limit)))
+        conn.set_trace_callback(fetched.append)
+        try:
+            return read_trail(conn, queries, net_id, path_limit)
+        finally:
+            conn.set_trace_callback(None)
+    monkeypatch.setattr(snoopr.Database, '_read_trail', staticmethod(traced))
+    nets = list(partitioned.iter_networks(path_limit=3))
+    assert sum('path' in net for net in nets) == 4
+    assert plans and not [plan for plan in plans if 'TEMP B-TREE' in plan]
+    assert all('USING INDEX idx_detections_' in plan for plan in plans), plans
+    # One bounded query per partition holding the network; none for fixless ones.
+    assert len(fetched) == 4 * 3
+    assert all(query.rstrip().endswith('LIMIT 3') for query in fetched)
+
+
+def test_legacy_partition_trails(snoopr, tmp_path):
+    from test_partitions import legacy_database
+    path = str(tmp_path / 'snoopr.db')
+    legacy_database(path, [(-60, '37.5', '-122.5', '-', '2024-01-02 03:04:05'),
+                           (-61, '-', '-', '-', '2024-01-02 03:05:05'),
+                           (-62, '37.6', '-122.6', '-', '2024-01-02 03:06:05')])
+    db = snoopr.Database(path)
+    try:
+        db.add_detection_batch([wifi_detection(snoopr, 1, db.new_session(), lat=37.7,
+                                               lon=-122.7)])
+        net, = db.iter_networks()
+        assert [(p['latitude'], p['signal_strength']) for p in net['path']] == [
+            (37.5, -60), (37.6, -62), (37.7, -60)]
+        assert net['path'] == expected_trail(db, net['mac'], 500)
+    finally:
+        db.disconnect()
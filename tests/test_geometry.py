@@ -0,0 +1,37 @@
+import random
+from itertools import combinations
+
+
+def brute_force_diameter2(points):
+    return max((a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2 for a, b in combinations(points, 2))
+
+
+def test_hull_diameter_pair_matches_brute_force(snoopr):
+    rnd = random.Random(8)
+    for _ in range(300):
+        points = [(rnd.uniform(-500, 500), rnd.uniform(-500, 500))
+                  for _ in range(rnd.randint(3, 60))]
+        hull = snoopr.convex_hull(points)
+        if len(hull) < 2:
+            continue
+        i, j = snoopr.hull_diameter_pair(hull)
+        found = (hull[i][0] - hull[j][0]) ** 2 + (hull[i][1] - hull[j][1]) ** 2
+        assert abs(found - brute_force_diameter2(hull)) < 1e-6
+
+
+def test_hull_diameter_pair_either_orientation(snoopr):
+    square = [(0.0, 0.0), (10.0, 0.0), (10.0, 10.0), (0.0, 10.0), (5.0, 12.0)]
+    hull = snoopr.convex_hull(square)
+    for polygon in (hull, hull[::-1]):
+        i, j = snoopr.hull_diameter_pair(polygon)
+        found = (polygon[i][0] - polygon[j][0]) ** 2 + (polygon[i][1] - polygon[j][1]) ** 2
+        assert found == brute_force_diameter2(polygon)
+
+
+def test_polygon_diameter_matches_pairwise_haversine(snoopr):
+    rnd = random.Random(9)
+    points = [(37.77 + rnd.uniform(-0.01, 0.01), -122.42 + rnd.uniform(-0.01, 0.01))
+              for _ in range(200)]
+    expected = max(snoopr.haversine(a[0], a[1], b[0], b[1])
+                   for a, b in combinations(snoopr.convex_hull(points), 2))
+    assert abs(snoopr.polygon_diameter(points) - expected) < 1e-6
@@ -0,0 +1,97 @@
+import random
+
+import pytest
+
+
+def scalar_run(snoopr, measurements, state=None):
+    """The per-measurement recursion kalman_run must reproduce."""
+    filtered = []
+    if state:
+        mu, sigma = state
+    else:
+        mu, sigma = float(measurements[0]), 1.0
+        filtered.append(mu)
+        measurements = measurements[1:]
+    for z in measurements:
+        sigma_bar = sigma + snoopr.KALMAN_PROCESS_NOISE
+        gain = sigma_bar / (sigma_bar + snoopr.KALMAN_MEASUREMENT_NOISE)
+        mu += gain * (z - mu)
+        sigma = sigma_bar - gain * sigma_bar
+        filtered.append(mu)
+    return filtered, [mu, sigma]
+
+
+def rssi_trace(count, seed):
+    rng = random.Random(seed)
+    level = -65.0
+    trace = []
+    for _ in range(count):
+        level = min(-20.0, max(-100.0, level + rng.gauss(0, 0.5)))
+        trace.append(int(level + rng.gauss(0, 4)))
+    return trace
+
+
+@pytest.mark.parametrize('count', [1, 2, 50, 1023, 1024, 1025, 5000])
+def test_kalman_run_matches_scalar(snoopr, count):
+    trace = rssi_trace(count, count)
+    got, state = snoopr.kalman_run(trace)
+    want, want_state = scalar_run(snoopr, trace)
+    assert len(got) == count
+    assert got == pytest.approx(want, abs=1e-9)
+    assert state == pytest.approx(want_state, abs=1e-12)
+
+
+def test_kalman_run_resumes_from_state(snoopr, monkeypatch):
+    if not snoopr.HAS_NUMPY:
+        pytest.skip('numpy not installed')
+    blocks = []
+    cumsum = snoopr.np.cumsum
+    monkeypatch.setattr(snoopr.np, 'cumsum', lambda a: blocks.append(len(a)) or cumsum(a))
+    trace = rssi_trace(snoopr.KALMAN_VECTOR_MIN * 3 + 17, 3)
+    head, state = snoopr.kalman_run(trace[:400])
+    tail, resumed = snoopr.kalman_run(trace[400:], state)
+    want, want_state = scalar_run(snoopr, trace)
+    assert blocks, 'the long run should take the numpy path'
+    assert head + tail == pytest.approx(want, abs=1e-9)
+    assert resumed == pytest.approx(want_state, abs=1e-12)
+    assert snoopr.kalman_run([], state) == ([], state)
+
+
+def test_bank_filters_like_kalman_run(snoopr):
+    bank = snoopr.KalmanBank(capacity=4)
+    trace = rssi_trace(300, 5)
+    got = [bank.filter('a', z) for z in trace]
+    assert got == pytest.approx(snoopr.kalman_run(trace)[0], abs=1e-9)
+    assert bank.filter('a', None) == got[-1]
+    assert bank.filter('unknown', None) == snoopr.KALMAN_INITIAL
+
+
+def test_bank_recycles_least_recently_used(snoopr):
+    bank = snoopr.KalmanBank(capacity=3)
+    for key, value in (('a', -50), ('b', -60), ('c', -70)):
+        bank.filter(key, value)
+    bank.filter('a', -50)  # 'b' is now the oldest
+    bank.filter('d', -80)
+    assert len(bank) == 3
+    assert bank.filter('b', None) == snoopr.KALMAN_INITIAL
+    assert bank.filter('d', None) == -80.0
+    # A recycled slot starts over from its first measurement.
+    assert bank.filter('b', -40) == -40.0
+    assert len(bank) == 3
+
+
+def test_bank_evicts_idle(snoopr, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(snoopr.time, 'time', lambda: clock[0])
+    bank = snoopr.KalmanBank()
+    for key in ('a', 'b', 'c'):
+        bank.filter(key, -60)
+        clock[0] += 10
+    bank.filter('a', -61)  # used at 1030
+    assert bank.evict_idle(1025) == 2
+    assert len(bank) == 1 and bank.filter('a', None) != snoopr.KALMAN_INITIAL
+    assert bank.evict_idle(1025) == 0
+    # Freed slots are reused before the arrays grow.
+    bank.filter('e', -70)
+    bank.filter('f', -71)
+    assert len(bank._mu) == 3
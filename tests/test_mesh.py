@@ -0,0 +1,217 @@
+import asyncio
+import json
+import socket
+import threading
+import time
+import types
+
+import pytest
+
+
+def sample_items(count):
+    items = []
+    for i in range(count):
+        items.append({'mac': '02:00:00:00:%02X:%02X' % (i // 256, i % 256),
+                      'device_type': ('wifi', 'bluetooth')[i % 2], 'type': 'wi-fi ap',
+                      'name': 'net%d' % (i % 7), 'vendor': 'Apple, Inc.',
+                      'encryption': 'WPA2', 'auth_mode': 'PSK', 'altitude': '12.5',
+                      'channel': 1 + i % 11, 'signal_strength': -40 - i % 50,
+                      'latitude': 37.7749 + i * 1e-6, 'longitude': -122.4194 - i * 1e-6})
+    return items
+
+
+@pytest.mark.parametrize('count, compress', [(1, True), (50, True), (50, False)])
+def test_compact_payload_round_trip(snoopr, count, compress):
+    items = sample_items(count)
+    decoded = snoopr.decode_mesh_payload(snoopr.encode_mesh_payload(items, compress=compress))
+    assert len(decoded) == count
+    for sent, got in zip(items, decoded):
+        for key in ('mac', 'device_type', 'channel', 'signal_strength') + \
+                snoopr.MESH_STRING_FIELDS:
+            assert got[key] == sent[key]
+        assert abs(got['latitude'] - sent['latitude']) <= 1e-6
+        assert abs(got['longitude'] - sent['longitude']) <= 1e-6
+
+
+def test_compact_payload_optional_fields(snoopr):
+    items = [{'mac': 'a1b2c3', 'device_type': 'aircraft', 'signal_strength': None,
+              'latitude': '-', 'longitude': '-'},
+             {'mac': '02:00:00:00:00:01', 'device_type': 'printer'}]
+    decoded = snoopr.decode_mesh_payload(snoopr.encode_mesh_payload(items))
+    assert decoded == [{'mac': 'a1b2c3', 'device_type': 'aircraft', 'signal_strength': None,
+                        'latitude': '-', 'longitude': '-', 'channel': 0, 'type': '',
+                        'name': '', 'vendor': '', 'encryption': '', 'auth_mode': '',
+                        'altitude': ''}]
+
+
+def test_long_strings_are_cut_on_a_character_boundary(snoopr):
+    item = dict(sample_items(1)[0], name='ab' + '\u00e9' * 200, vendor='x' + '\u2603' * 100)
+    payload = snoopr.encode_mesh_payload([item], compress=False)
+    # Every interned string on the wire is valid UTF-8 of at most 255 bytes.
+    body, pos = payload[3:], 2
+    for _ in range(int.from_bytes(body[:2], 'big')):
+        size = body[pos]
+        body[pos + 1:pos + 1 + size].decode('utf-8')
+        pos += 1 + size
+    got = snoopr.decode_mesh_payload(payload)[0]
+    assert got['name'] == 'ab' + '\u00e9' * 126
+    assert got['vendor'] == 'x' + '\u2603' * 84
+
+
+def test_compact_payload_is_smaller_than_json(snoopr):
+    items = sample_items(200)
+    assert len(snoopr.encode_mesh_payload(items)) * 4 < len(json.dumps(items))
+
+
+def test_json_payload_still_decodes(snoopr):
+    items = sample_items(3)
+    assert snoopr.decode_mesh_payload(json.dumps(items).encode('utf-8')) == items
+    assert snoopr.decode_mesh_payload(json.dumps(items[0]).encode('utf-8')) == [items[0]]
+
+
+def test_malformed_compact_payload_raises_value_error(snoopr):
+    payload = snoopr.encode_mesh_payload(sample_items(5), compress=False)
+    for broken in (payload[:-3], payload + b'\0', payload[:1] + b'\x09' + payload[2:]):
+        with pytest.raises(ValueError):
+            snoopr.decode_mesh_payload(broken)
+
+
+def test_nonce_window_rejects_replays(snoopr):
+    window = snoopr.NonceWindow(horizon=120, bucket=5)
+    assert window.add(b'n1', sent_at=1000.0, now=1000.0)
+    assert window.add(b'n2', sent_at=1000.0, now=1000.5)
+    assert not window.add(b'n1', sent_at=1000.0, now=1100.0)
+    # Same nonce under another send time lives in another bucket.
+    assert window.add(b'n1', sent_at=1010.0, now=1100.0)
+
+
+def test_nonce_window_remembers_the_whole_skew_at_high_rates(snoopr):
+    window = snoopr.NonceWindow(horizon=120, bucket=5)
+    # 100 frames/s for two minutes: far beyond the old 4096-entry cache.
+    for i in range(12000):
+        assert window.add(i, sent_at=i / 100.0, now=i / 100.0)
+    assert len(window) == 12000
+    assert not window.add(0, sent_at=0.0, now=119.99)
+
+
+def test_nonce_window_drops_buckets_past_the_horizon(snoopr):
+    window = snoopr.NonceWindow(horizon=120, bucket=5)
+    for i in range(100):
+        window.add(i, sent_at=float(i), now=float(i))
+    window.add('late', sent_at=400.0, now=400.0)
+    assert len(window) == 1
+    assert list(window.buckets) == [80]
+
+
+class RecordingDb:
+    def __init__(self):
+        self.batches = []
+        self.written = threading.Event()
+
+    def add_detection_batch(self, batch):
+        self.batches.append(list(batch))
+        self.written.set()
+
+
+@pytest.fixture
+def mesh_plugin(snoopr):
+    mesh = snoopr.MeshNetwork('127.0.0.1', 0, [], 'test-key', has_crypto=False,
+                              allow_plaintext=True)
+    mesh.port = mesh.socket.getsockname()[1]
+    plugin = types.SimpleNamespace(stop_event=threading.Event(), mesh=mesh, session_id=7,
+                                   db=RecordingDb())
+    yield plugin
+    plugin.stop_event.set()
+    mesh.close()
+
+
+def frames(mesh, count, per_frame=3):
+    items = sample_items(count * per_frame)
+    return [mesh._seal(json.dumps(items[i:i + per_frame]).encode('utf-8'))
+            for i in range(0, len(items), per_frame)]
+
+
+def test_receiver_writes_one_batch_per_flush(snoopr, mesh_plugin):
+    receiver = snoopr.MeshReceiver(mesh_plugin)
+    receiver.loop = asyncio.new_event_loop()
+
+    async def burst():
+        for frame in frames(mesh_plugin.mesh, 20) + [b'garbage']:
+            receiver.enqueue(frame, ('127.0.0.1', 1))
+        await receiver._open_task
+        await receiver._flush()
+
+    try:
+        receiver.loop.run_until_complete(burst())
+    finally:
+        receiver.executor.shutdown()
+        receiver.loop.close()
+    assert len(mesh_plugin.db.batches) == 1 and len(mesh_plugin.db.batches[0]) == 60
+    assert all(det[18] == 7 for det in mesh_plugin.db.batches[0])
+    assert receiver.stats == {'frames': 21, 'rejects': 1, 'dropped': 0, 'detections': 60,
+                              'batches': 1}
+
+
+def test_receiver_drops_frames_past_max_pending(snoopr, mesh_plugin):
+    receiver = snoopr.MeshReceiver(mesh_plugin)
+    receiver.MAX_PENDING = 5
+    receiver.loop = asyncio.new_event_loop()
+    try:
+        # Nothing runs the open task in between, as during a burst.
+        for frame in frames(mesh_plugin.mesh, 8):
+            receiver.enqueue(frame, ('127.0.0.1', 1))
+        assert len(receiver.pending) == 5 and receiver.stats['dropped'] == 3
+        receiver.loop.run_until_complete(receiver._open_task)
+        assert receiver.stats['frames'] == 5 and len(receiver.detections) == 15
+    finally:
+        receiver.executor.shutdown()
+        receiver.loop.close()
+
+
+def test_receiver_opens_and_flushes_on_shutdown(snoopr, mesh_plugin):
+    receiver = snoopr.MeshReceiver(mesh_plugin, flush_interval=0.5)
+    receiver.start()
+    deadline = time.time() + 5
+    while mesh_plugin.mesh.sender is None and time.time() < deadline:
+        time.sleep(0.01)
+    client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        for frame in frames(mesh_plugin.mesh, 10):
+            client.sendto(frame, ('127.0.0.1', mesh_plugin.mesh.port))
+    finally:
+        client.close()
+    # Stop before the first flush interval is up: the last frames are still opened and
+    # written on the way out.
+    mesh_plugin.stop_event.set()
+    receiver.join(timeout=5)
+    assert not receiver.is_alive()
+    assert [len(b) for b in mesh_plugin.db.batches] == [30]
+    assert mesh_plugin.mesh.sender is None
+
+
+def test_broadcast_sends_through_the_receiver(snoopr, mesh_plugin):
+    mesh = mesh_plugin.mesh
+    mesh.peers = ['127.0.0.1']
+    mesh._sent = {'127.0.0.1': snoopr.LRUDict(8192)}
+    items = sample_items(1000)
+
+    # Without a running receiver nothing is sent or marked as sent.
+    mesh.broadcast_detections(items)
+    assert len(mesh._sent['127.0.0.1']) == 0
+
+    receiver = snoopr.MeshReceiver(mesh_plugin, flush_interval=0.1)
+    receiver.start()
+    try:
+        deadline = time.time() + 5
+        while mesh.sender is None and time.time() < deadline:
+            time.sleep(0.01)
+        # The peer is ourselves: every frame of the flush comes back in.
+        mesh.broadcast_detections(items)
+        while sum(map(len, mesh_plugin.db.batches)) < 1000 and time.time() < deadline:
+            time.sleep(0.02)
+    finally:
+        mesh_plugin.stop_event.set()
+        receiver.join(timeout=5)
+    assert sum(map(len, mesh_plugin.db.batches)) == 1000
+    assert receiver.stats['frames'] == 5 and receiver.stats['rejects'] == 0
+    assert len(mesh._sent['127.0.0.1']) == 1000
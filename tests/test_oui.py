@@ -0,0 +1,128 @@
+import os
+import struct
+
+import pytest
+
+MANUF = '''\
+# Wireshark manuf excerpt
+00:00:0C\tCisco\tCisco Systems, Inc
+00:1B:63\tApple\tApple, Inc.
+70:B3:D5:1E:70:00/36\tLegrand\tLegrand Fr
+70:B3:D5\tIEEERegi\tIEEE Registration Authority
+8C:1F:64:0A:00:00/28\tSmartMesh\tSmartMesh GmbH
+8C:1F:64\tIEEERegi\tIEEE Registration Authority
+B8:27:EB\tRaspberr\tRaspberry Pi Foundation
+DC:A6:32\tRaspberr\tRaspberry Pi Trading Ltd
+F0:9F:C2\tUbiquiti\tUbiquiti Inc — Überwachung
+'''
+
+MACS = ['00:00:0c:12:34:56', '00:1b:63:aa:bb:cc', '70:b3:d5:1e:7a:bc', '70:b3:d5:1e:80:00',
+        '8c:1f:64:0a:12:34', '8c:1f:64:1b:12:34', 'b8:27:eb:00:00:01', 'dc:a6:32:ff:ff:ff',
+        'f0:9f:c2:01:02:03', '12:34:56:78:9a:bc', '70:b3:d5', '8c:1f:64:0']
+
+
+@pytest.fixture
+def manuf(tmp_path):
+    path = tmp_path / 'manuf'
+    path.write_text(MANUF, encoding='utf-8')
+    return str(path)
+
+
+def lookups(index):
+    return [index.lookup(mac) for mac in MACS]
+
+
+def test_cache_round_trip_matches_text_parse(snoopr, manuf, tmp_path, monkeypatch):
+    cache = str(tmp_path / 'oui.cache')
+    parsed = snoopr.OuiIndex.load(manuf, cache)
+    assert os.path.exists(cache)
+    assert lookups(parsed)[:3] == ['Cisco Systems, Inc', 'Apple, Inc.', 'Legrand Fr']
+    assert lookups(parsed)[5] == 'IEEE Registration Authority'
+    assert lookups(parsed)[8] == 'Ubiquiti Inc — Überwachung'
+
+    monkeypatch.setattr(snoopr.OuiIndex, 'parse',
+                        classmethod(lambda cls, path: pytest.fail('parsed again')))
+    cached = snoopr.OuiIndex.load(manuf, cache)
+    assert len(cached) == len(parsed) == 9
+    assert lookups(cached) == lookups(parsed)
+    assert cached.vendors == parsed.vendors
+
+
+def test_changed_source_is_parsed_again(snoopr, manuf, tmp_path):
+    cache = str(tmp_path / 'oui.cache')
+    snoopr.OuiIndex.load(manuf, cache)
+    st = os.stat(manuf)
+    assert snoopr.OuiIndex.read_cache(cache, st) is not None
+    os.utime(manuf, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    assert snoopr.OuiIndex.read_cache(cache, os.stat(manuf)) is None
+    with open(manuf, 'a') as handle:
+        handle.write('12:34:56\tExample\tExample Corp\n')
+    os.utime(manuf, ns=(st.st_atime_ns, st.st_mtime_ns))
+    assert snoopr.OuiIndex.read_cache(cache, os.stat(manuf)) is None
+    index = snoopr.OuiIndex.load(manuf, cache)
+    assert index.lookup(MACS[9]) == 'Example Corp'
+    assert snoopr.OuiIndex.read_cache(cache, os.stat(manuf)).lookup(MACS[9]) == 'Example Corp'
+
+
+# OuiIndex.HEADER, spelled out so a layout change has to touch this test too.
+HEADER = struct.Struct('!4sBB2xqqI3I')
+FIELDS = ['magic', 'version', 'order', 'size', 'mtime_ns', 'vendors']
+
+
+def rewrite_header(cache, **changes):
+    with open(cache, 'rb') as handle:
+        data = bytearray(handle.read())
+    header = list(HEADER.unpack_from(data, 0))
+    for name, value in changes.items():
+        header[FIELDS.index(name)] = value
+    HEADER.pack_into(data, 0, *header)
+    with open(cache, 'wb') as handle:
+        handle.write(data)
+
+
+@pytest.mark.parametrize('damage', [
+    {'magic': b'XXXX'}, {'version': 99}, {'order': 2}, {'vendors': 1000},
+])
+def test_bad_header_is_rejected(snoopr, manuf, tmp_path, damage):
+    assert snoopr.OuiIndex.HEADER.format == HEADER.format
+    cache = str(tmp_path / 'oui.cache')
+    snoopr.OuiIndex.load(manuf, cache)
+    st = os.stat(manuf)
+    rewrite_header(cache, **damage)
+    assert snoopr.OuiIndex.read_cache(cache, st) is None
+
+
+def test_wrong_byte_order_is_rejected(snoopr, manuf, tmp_path):
+    cache = str(tmp_path / 'oui.cache')
+    snoopr.OuiIndex.load(manuf, cache)
+    with open(cache, 'rb') as handle:
+        order = HEADER.unpack_from(handle.read(), 0)[2]
+    rewrite_header(cache, order=int(not order))
+    assert snoopr.OuiIndex.read_cache(cache, os.stat(manuf)) is None
+
+
+def test_truncated_or_corrupt_cache_is_parsed_again(snoopr, manuf, tmp_path):
+    cache = str(tmp_path / 'oui.cache')
+    expected = lookups(snoopr.OuiIndex.load(manuf, cache))
+    st = os.stat(manuf)
+    with open(cache, 'rb') as handle:
+        data = handle.read()
+    for cut in range(len(data)):
+        with open(cache, 'wb') as handle:
+            handle.write(data[:cut])
+        assert snoopr.OuiIndex.read_cache(cache, st) is None, cut
+    # A vendor slot past the vendor table.
+    damaged = bytearray(data)
+    slots = HEADER.size + 1 * 8
+    damaged[slots:slots + 4] = b'\xff\xff\xff\x7f'
+    with open(cache, 'wb') as handle:
+        handle.write(damaged)
+    assert snoopr.OuiIndex.read_cache(cache, st) is None
+    # Vendor names that are not UTF-8.
+    with open(cache, 'wb') as handle:
+        handle.write(data[:-3] + b'\xff\xfe\xfd')
+    assert snoopr.OuiIndex.read_cache(cache, st) is None
+
+    index = snoopr.OuiIndex.load(manuf, cache)
+    assert lookups(index) == expected
+    assert lookups(snoopr.OuiIndex.read_cache(cache, st)) == expected
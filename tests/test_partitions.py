@@ -0,0 +1,195 @@
+import sqlite3
+import time
+
+from conftest import wifi_detection
+
+
+def age_partitions(db, days):
+    """Shift every partition (and its rows) `days` into the past, so the next write
+    opens a fresh one and prune_old_data sees the old ones as expired."""
+    shift = days * 86400
+    conn = db._connection
+    with db.db_lock, conn:
+        for _, name, _, typed in db._partitions:
+            if typed:
+                conn.execute('UPDATE %s SET timestamp = timestamp - ?' % name, (shift,))
+        conn.execute('UPDATE detection_partitions SET starts = starts - ?, ends = ends - ?',
+                      (shift, shift))
+        db._load_partitions(conn)
+
+
+def summary(db, mac):
+    return db._connection.execute('''
+        SELECT s.hits, s.sessions_count, s.last_lat, s.last_lon, s.last_rssi
+        FROM network_summary s JOIN networks n ON n.id = s.network_id
+        WHERE n.mac = ?''', (mac,)).fetchone()
+
+
+def test_prune_drops_expired_partitions_and_orphans(snoopr, tmp_path):
+    db = snoopr.Database(str(tmp_path / 'snoopr.db'), partition_days=1)
+    try:
+        session = db.new_session()
+        db.add_detection_batch([wifi_detection(snoopr, i, session) for i in range(3)])
+        age_partitions(db, 5)
+        db.add_detection_batch([wifi_detection(snoopr, 0, session)])
+        assert len(db._partitions) == 2
+        old = db._partitions[0][1]
+
+        db.prune_old_data(2)
+
+        conn = db._connection
+        assert old not in [p[1] for p in db._partitions]
+        assert not conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?",
+                                (old,)).fetchone()
+        macs = [row[0] for row in conn.execute('SELECT mac FROM networks ORDER BY mac')]
+        assert macs == [wifi_detection(snoopr, 0, session)[0]]
+        assert conn.execute('SELECT COUNT(*) FROM detections').fetchone()[0] == 1
+        assert conn.execute('SELECT COUNT(*) FROM network_summary').fetchone()[0] == 1
+        assert summary(db, macs[0])[:2] == (1, 1)
+    finally:
+        db.disconnect()
+
+
+def test_prune_recomputes_last_fix(snoopr, tmp_path):
+    db = snoopr.Database(str(tmp_path / 'snoopr.db'), partition_days=1)
+    try:
+        session = db.new_session()
+        db.add_detection_batch([wifi_detection(snoopr, 0, session, rssi=-50, lat=10.0, lon=20.0),
+                                wifi_detection(snoopr, 1, session, rssi=-51, lat=11.0, lon=21.0)])
+        age_partitions(db, 5)
+        # Device 0 gets a newer fix; device 1 is only seen without GPS from now on.
+        db.add_detection_batch([wifi_detection(snoopr, 0, session, rssi=-70, lat=12.0, lon=22.0),
+                                wifi_detection(snoopr, 1, session, rssi=-71, lat='-', lon='-')])
+        db.add_detection_batch([wifi_detection(snoopr, 0, session, rssi=-80, lat='-', lon='-')])
+        mac0, mac1 = (wifi_detection(snoopr, i, session)[0] for i in (0, 1))
+        assert summary(db, mac1)[2:] == (11.0, 21.0, -51)
+
+        db.prune_old_data(2)
+
+        assert summary(db, mac0) == (2, 1, 12.0, 22.0, -70)
+        assert summary(db, mac1) == (1, 1, None, None, None)
+    finally:
+        db.disconnect()
+
+
+def legacy_database(path, rows):
+    """A pre-v10 database: one detections table with text coordinates and timestamps.
+    rows: [(signal_strength, latitude, longitude, altitude, timestamp)] for network 1."""
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        CREATE TABLE sessions (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                               created_at TEXT DEFAULT CURRENT_TIMESTAMP);
+        CREATE TABLE networks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, mac TEXT NOT NULL, type TEXT NOT NULL,
+            name TEXT, device_type TEXT NOT NULL, vendor TEXT DEFAULT 'Unknown',
+            classification TEXT DEFAULT 'Unknown', is_rogue INTEGER DEFAULT 0,
+            is_mesh INTEGER DEFAULT 0, is_randomized INTEGER DEFAULT 0,
+            vulnerabilities TEXT DEFAULT '', anomalies TEXT DEFAULT '',
+            is_snooper INTEGER DEFAULT 0, snooper_reason TEXT DEFAULT '',
+            triangulated_lat TEXT, triangulated_lon TEXT, triangulated_mse REAL,
+            max_velocity REAL, persistence_score REAL DEFAULT 0.0,
+            windows_hit INTEGER DEFAULT 0, cluster_count INTEGER DEFAULT 0,
+            best_rssi INTEGER, first_seen TEXT, last_seen TEXT, UNIQUE(mac, device_type));
+        CREATE TABLE detections (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, session_id INTEGER NOT NULL,
+            network_id INTEGER NOT NULL, encryption TEXT, signal_strength INTEGER,
+            latitude TEXT, longitude TEXT, altitude TEXT DEFAULT '-', channel INTEGER,
+            auth_mode TEXT, timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
+            filtered_signal_strength REAL);
+        INSERT INTO sessions (id) VALUES (1);
+        INSERT INTO networks (id, mac, type, name, device_type)
+            VALUES (1, '02:00:00:00:00:01', 'wi-fi ap', 'old', 'wifi');
+    ''')
+    conn.executemany('INSERT INTO detections (session_id, network_id, signal_strength, '
+                     'latitude, longitude, altitude, timestamp) VALUES (1, 1, ?, ?, ?, ?, ?)',
+                     rows)
+    conn.commit()
+    conn.close()
+
+
+def test_legacy_detections_table_is_adopted(snoopr, tmp_path):
+    path = str(tmp_path / 'snoopr.db')
+    legacy_database(path, [(-60, '37.5', '-122.5', '-', '2024-01-02 03:04:05'),
+                           (-61, '-', '-', '-', '2024-01-02 03:05:05')])
+
+    db = snoopr.Database(path)
+    try:
+        conn = db._connection
+        assert db._partitions[0][1] == 'detections_legacy'
+        assert conn.execute("SELECT type FROM sqlite_master WHERE name = 'detections'"
+                            ).fetchone()[0] == 'view'
+        assert conn.execute('SELECT part, network_id, session_id, hits FROM detection_refs'
+                            ).fetchall() == [('detections_legacy', 1, 1, 2)]
+        assert summary(db, '02:00:00:00:00:01')[:2] == (2, 1)
+
+        # New rows go to a typed partition with ids past the legacy ones.
+        session = db.new_session()
+        db.add_detection_batch([wifi_detection(snoopr, 1, session)])
+        assert len(db._partitions) == 2 and db._partitions[-1][3]
+        ids = [row[0] for row in conn.execute('SELECT id FROM detections ORDER BY id')]
+        assert ids == [1, 2, 3]
+    finally:
+        db.disconnect()
+
+
+def test_partition_ids_stay_monotonic_after_prune(snoopr, tmp_path):
+    db = snoopr.Database(str(tmp_path / 'snoopr.db'), partition_days=1)
+    try:
+        session = db.new_session()
+        db.add_detection_batch([wifi_detection(snoopr, i, session) for i in range(4)])
+        high = db._connection.execute('SELECT MAX(id) FROM detections').fetchone()[0]
+        age_partitions(db, 5)
+        db.prune_old_data(2)
+        assert db._connection.execute('SELECT COUNT(*) FROM detections').fetchone()[0] == 0
+        # The session went with its last detection.
+        db.add_detection_batch([wifi_detection(snoopr, 0, db.new_session())])
+        assert db._connection.execute('SELECT MIN(id) FROM detections').fetchone()[0] > high
+        assert time.time() < db._partitions[-1][2]
+    finally:
+        db.disconnect()
+
+
+def test_legacy_text_columns_convert_through_view(snoopr, tmp_path):
+    path = str(tmp_path / 'snoopr.db')
+    legacy_database(path, [
+        (-60, ' 37.5 ', '-122.5', '12.5', '2024-01-02 03:04:05'),
+        (-61, '-', '-', '-', '2024-01-02 03:04:06'),
+        (-62, '0', '0', '', '2024-01-02 03:04:07'),
+        (-63, '91', '10', 'n/a', '2024-01-02 03:04:08'),
+        (-64, '1e1', 'east', '1e2', '2024-01-02 03:04:09'),
+        (-65, '-33.9', '151.2', '-4', '2024-01-02 03:04:10'),
+    ])
+    db = snoopr.Database(path)
+    try:
+        rows = db._connection.execute(
+            'SELECT latitude, longitude, altitude, timestamp, typeof(latitude), '
+            'typeof(timestamp) FROM detections ORDER BY id').fetchall()
+        base = 1704164645  # 2024-01-02 03:04:05 UTC
+        assert [row[:4] for row in rows] == [
+            (37.5, -122.5, 12.5, base),
+            (None, None, None, base + 1),
+            (None, None, None, base + 2),
+            (None, None, None, base + 3),
+            (None, None, 100.0, base + 4),
+            (-33.9, 151.2, -4.0, base + 5),
+        ]
+        assert rows[0][4:] == ('real', 'integer')
+    finally:
+        db.disconnect()
+
+
+def test_typed_partition_stores_numbers(snoopr, db):
+    session = db.new_session()
+    db.add_detection_batch([wifi_detection(snoopr, 0, session, lat=37.25, lon=-122.5),
+                            wifi_detection(snoopr, 1, session, lat='-', lon='-'),
+                            wifi_detection(snoopr, 2, session, lat='0', lon='0')])
+    name = db._partitions[-1][1]
+    rows = db._connection.execute(
+        'SELECT typeof(latitude), latitude, longitude, typeof(timestamp) FROM %s ORDER BY id'
+        % name).fetchall()
+    assert rows == [('real', 37.25, -122.5, 'integer'),
+                    ('null', None, None, 'integer'),
+                    ('null', None, None, 'integer')]
+    now = time.time()
+    stamp = db._connection.execute('SELECT MAX(timestamp) FROM detections').fetchone()[0]
+    assert now - 5 <= stamp <= now + 1
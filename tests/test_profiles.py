@@ -0,0 +1,108 @@
+import json
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def no_flush(plugin, monkeypatch):
+    # Sweeps buffer detections; the database side is not under test here.
+    monkeypatch.setattr(plugin, 'flush_detection_buffer', lambda: None)
+
+
+def test_changed_inputs_miss_and_replace(snoopr):
+    cache = snoopr.ProfileCache()
+    built = []
+
+    def build(value):
+        return lambda: built.append(value) or value
+
+    assert cache.get(('wifi-ap', 'aa'), ('home', None), build('first')) == 'first'
+    assert cache.get(('wifi-ap', 'aa'), ('home', None), build('unused')) == 'first'
+    assert cache.get(('wifi-ap', 'aa'), ('guest', None), build('second')) == 'second'
+    assert cache.get(('wifi-ap', 'aa'), ('guest', None), build('unused')) == 'second'
+    # Going back to the old inputs is a miss again: only the latest entry is kept.
+    assert cache.get(('wifi-ap', 'aa'), ('home', None), build('third')) == 'third'
+    assert built == ['first', 'second', 'third']
+    assert cache.stats() == {'hits': 2, 'misses': 3, 'size': 1, 'maxsize': 8192,
+                             'hit_rate': 0.4}
+
+
+def test_lru_bound(snoopr):
+    cache = snoopr.ProfileCache(maxsize=3)
+    for mac in ('a', 'b', 'c'):
+        cache.get(('bluetooth', mac), (), lambda: mac)
+    cache.get(('bluetooth', 'a'), (), lambda: 'rebuilt')  # 'b' is now the oldest
+    cache.get(('bluetooth', 'd'), (), lambda: 'd')
+    assert cache.stats()['size'] == 3
+    assert cache.get(('bluetooth', 'a'), (), lambda: 'rebuilt') == 'a'
+    assert cache.get(('bluetooth', 'b'), (), lambda: 'rebuilt') == 'rebuilt'
+    assert list(cache.entries) == [('bluetooth', 'd'), ('bluetooth', 'a'), ('bluetooth', 'b')]
+
+
+class Agent:
+    def session(self):
+        return {'gps': {'Latitude': 37.7749, 'Longitude': -122.4194}}
+
+
+def test_ssid_change_rebuilds_the_ap_profile(plugin):
+    plugin.ready = True
+    plugin.ap_max_age = 0
+    ap = {'mac': 'B8:27:EB:00:00:01', 'hostname': 'home', 'rssi': -50, 'channel': 6}
+    plugin.on_unfiltered_ap_list(Agent(), [ap])
+    plugin.on_unfiltered_ap_list(Agent(), [ap])
+    key = ('wifi-ap', 'B8:27:EB:00:00:01')
+    assert plugin.profiles.entries[key] == (('home', None), ('Unknown', 0, False))
+    assert plugin.profiles.stats()['hits'] == 1
+
+    plugin.on_unfiltered_ap_list(Agent(), [dict(ap, hostname='Pineapple')])
+    assert plugin.profiles.entries[key] == (('Pineapple', None), ('Unknown', 1, False))
+    assert plugin.profiles.stats()['misses'] == 2
+    assert len(plugin.detection_buffer) == 3
+
+
+def ble_vendor(plugin, mac, manufacturer_data):
+    return plugin.profiles.get(
+        ('bluetooth', mac), ('', tuple(manufacturer_data)),
+        lambda: plugin._ble_profile(mac, '', manufacturer_data))[0]
+
+
+def test_new_manufacturer_data_is_a_miss(plugin):
+    plugin.bluetooth_company_db = {0x004C: 'Apple, Inc.', 0x0006: 'Microsoft'}
+    mac = '5a:00:00:00:00:01'  # locally administered, so no OUI answer
+    plugin._lookup_oui_vendor = lambda mac: 'Unknown'
+    assert ble_vendor(plugin, mac, {}) == 'Unknown'
+    assert ble_vendor(plugin, mac, {0x004C: b'\x10'}) == 'Apple, Inc.'
+    assert ble_vendor(plugin, mac, {0x0006: b'\x01'}) == 'Microsoft'
+    assert plugin.profiles.stats()['misses'] == 3
+
+
+class Response:
+    def __init__(self, body):
+        self.text = json.dumps(body)
+
+    def raise_for_status(self):
+        pass
+
+
+def test_company_db_download_drops_stale_vendors(snoopr, plugin, monkeypatch):
+    mac = '5a:00:00:00:00:02'
+    data = {0x0D3C: b'\x00'}
+    plugin._lookup_oui_vendor = lambda mac: 'Unknown'
+    assert ble_vendor(plugin, mac, data) == 'Unknown (0x0D3C)'
+    assert ble_vendor(plugin, mac, data) == 'Unknown (0x0D3C)'
+
+    monkeypatch.setattr(snoopr.requests, 'get', lambda url, timeout: Response(
+        [{'code': 0x0D3C, 'name': 'Example Trackers Ltd'}]))
+    plugin._download_bt_company_db()
+    assert plugin.profiles.stats()['size'] == 0
+    assert ble_vendor(plugin, mac, data) == 'Example Trackers Ltd'
+
+
+def test_failed_download_keeps_the_cache(snoopr, plugin, monkeypatch):
+    plugin.profiles.get(('wifi-client', 'aa'), None, lambda: ('Vendor', 0, 0))
+
+    def fail(url, timeout):
+        raise snoopr.requests.ConnectionError('offline')
+    monkeypatch.setattr(snoopr.requests, 'get', fail)
+    plugin._download_bt_company_db()
+    assert plugin.profiles.stats()['size'] == 1
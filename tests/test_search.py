@@ -0,0 +1,126 @@
+import random
+
+import pytest
+
+from conftest import wifi_detection
+
+VENDORS = ['Apple, Inc.', 'Espressif Inc.', 'Unknown', 'TP-LINK', 'Raspberry Pi']
+
+
+@pytest.fixture
+def populated(snoopr, db):
+    """90 networks with ties on every sort key, so pages break ties on id."""
+    rng = random.Random(7)
+    session = db.new_session()
+    db.add_detection_batch([
+        wifi_detection(snoopr, i, session, rssi=-40 - i % 30,
+                       name=rng.choice(['home', 'Office-5G', 'cafe_guest', '', 'Pixel %d' % i]))
+        for i in range(90)])
+    conn = db._connection
+    with db.db_lock, conn:
+        for net_id, in conn.execute('SELECT id FROM networks').fetchall():
+            conn.execute('''
+                UPDATE networks SET vendor = ?, persistence_score = ?, max_velocity = ?,
+                       is_snooper = ?, best_rssi = ?, last_seen = ?, anomalies = ?
+                WHERE id = ?''', (
+                rng.choice(VENDORS), rng.choice([None, 0.0, 0.25, 0.5, 0.9]),
+                rng.choice([None, 0.0, 3.5, 12.0]), rng.choice([0, 1]),
+                rng.choice([None, -40, -55, -70]),
+                rng.choice([None, '2026-01-01 10:00:00', '2026-01-02 08:30:00']),
+                rng.choice(['None', 'Beacon flood', 'Deauth burst']), net_id))
+    return db
+
+
+def walk_keyset(db, size, **kwargs):
+    macs, after = [], None
+    while True:
+        page, after = db.get_network_page(limit=size, after=after, **kwargs)
+        macs.extend(net['mac'] for net in page)
+        if after is None:
+            return macs
+
+
+def walk_offset(db, size, **kwargs):
+    macs, offset = [], 0
+    while True:
+        page, _ = db.get_network_page(limit=size, offset=offset, **kwargs)
+        macs.extend(net['mac'] for net in page)
+        if len(page) < size:
+            return macs
+        offset += size
+
+
+@pytest.mark.parametrize('sort_by', ['device_type', 'is_snooper', 'persistence', 'velocity',
+                                     'mac', 'name', 'last_seen', 'rssi'])
+@pytest.mark.parametrize('filter_by', ['all', 'snoopers', 'high_persistence', 'anomalies'])
+def test_keyset_pages_match_offset_pages(populated, sort_by, filter_by):
+    kwargs = {'sort_by': sort_by, 'filter_by': filter_by, 'persistence_threshold': 0.5}
+    expected = walk_offset(populated, 7, **kwargs)
+    assert expected
+    assert walk_keyset(populated, 7, **kwargs) == expected
+    assert len(set(expected)) == len(expected)
+
+
+def test_cursor_only_on_full_pages(populated):
+    page, cursor = populated.get_network_page(sort_by='mac', limit=10)
+    assert len(page) == 10 and cursor[0] == page[-1]['mac']
+    page, cursor = populated.get_network_page(sort_by='mac', limit=10, offset=85)
+    assert len(page) == 5 and cursor is None
+
+
+def test_parse_cursor(snoopr):
+    parse = snoopr.WebHandler._parse_cursor
+    assert parse('["02:00:00:00:00:05",12]') == ('02:00:00:00:00:05', 12)
+    assert parse('[0.25,3]') == (0.25, 3)
+    for token in (None, '', 'x', '[1]', '[1,2,3]', '[true,2]', '[1,"2"]', '[[1],2]',
+                  '{"a":1}', '[1,%s]' % ('9' * 300)):
+        assert parse(token) is None
+
+
+def search(db, term):
+    return sorted(net['mac'] for net in db.get_all_networks(search=term, limit=500))
+
+
+@pytest.mark.parametrize('term', ['home', 'HOME', 'ffice-5', 'Espressif', 'apple, i',
+                                  'flood', 'Pixel 1', '02:00:00:00:00:4', 'afe_gue'])
+def test_fts_search_matches_like(populated, term):
+    if not populated.has_fts:
+        pytest.skip('SQLite built without FTS5')
+    fts = search(populated, term)
+    populated.has_fts = False
+    try:
+        assert fts == search(populated, term)
+    finally:
+        populated.has_fts = True
+
+
+def test_short_terms_use_like(populated):
+    # Under three characters there is no trigram to look up.
+    for term in ('ho', 'e', ':4'):
+        expected = sorted(
+            row[0] for row in populated._connection.execute(
+                'SELECT mac, name, vendor, anomalies FROM networks')
+            if any(term in (value or '').lower() for value in row))
+        assert expected and search(populated, term) == expected
+
+
+def test_fts_index_follows_networks(db):
+    if not db.has_fts:
+        pytest.skip('SQLite built without FTS5')
+    conn = db._connection
+
+    def matches(term):
+        return [row[0] for row in conn.execute(
+            'SELECT rowid FROM network_fts WHERE network_fts MATCH ?', ('"%s"' % term,))]
+
+    with db.db_lock, conn:
+        net_id = conn.execute(
+            "INSERT INTO networks (mac, type, name, device_type, vendor) "
+            "VALUES ('02:aa:bb:cc:dd:ee', 'wi-fi ap', 'Lighthouse', 'wifi', 'Acme')").lastrowid
+    assert matches('ighthou') == [net_id]
+    with db.db_lock, conn:
+        conn.execute("UPDATE networks SET name = 'Harbour' WHERE id = ?", (net_id,))
+    assert matches('ighthou') == [] and matches('arbou') == [net_id]
+    with db.db_lock, conn:
+        conn.execute('DELETE FROM networks WHERE id = ?', (net_id,))
+    assert matches('arbou') == [] and matches('Acme') == []
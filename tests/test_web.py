@@ -0,0 +1,63 @@
+import json
+
+import flask
+import pytest
+
+from conftest import wifi_detection
+
+
+@pytest.fixture
+def app():
+    return flask.Flask(__name__)
+
+
+def fetch(app, handler, etag=None, query='limit=10'):
+    headers = {'If-None-Match': etag} if etag else {}
+    with app.test_request_context('/data.json?' + query, headers=headers):
+        return handler._data(flask.request)
+
+
+def test_data_etag_answers_304_until_data_changes(snoopr, plugin, app):
+    handler = snoopr.WebHandler(plugin)
+    plugin.db.add_detection_batch([wifi_detection(snoopr, i, plugin.session_id)
+                                   for i in range(3)])
+    first = fetch(app, handler)
+    assert first.status_code == 200
+    body = json.loads(first.get_data())
+    assert len(body['networks']) == 3 and body['total'] == 3
+    assert set(body) >= {'networks', 'next', 'total', 'geofences', 'counts', 'center', 'stats'}
+    etag = first.headers['ETag']
+
+    assert fetch(app, handler, etag).status_code == 304
+    assert fetch(app, handler, etag, query='limit=20').status_code == 200
+
+    plugin.db.add_detection_batch([wifi_detection(snoopr, 9, plugin.session_id)])
+    changed = fetch(app, handler, etag)
+    assert changed.status_code == 200
+    assert json.loads(changed.get_data())['total'] == 4
+
+
+def test_data_fresh_fields_are_not_frozen(snoopr, plugin, app):
+    handler = snoopr.WebHandler(plugin)
+    first = fetch(app, handler)
+    etag = first.headers['ETag']
+
+    # Neither the counters nor the GPS fix bump the data version.
+    plugin.counts_cache = dict(plugin.counts_cache, wifi=41)
+    plugin.last_gps = dict(plugin.last_gps, latitude=51.5, longitude=-0.12)
+    second = fetch(app, handler, etag)
+    assert second.status_code == 200
+    body = json.loads(second.get_data())
+    assert body['counts']['wifi'] == 41
+    assert body['center'] == [51.5, -0.12]
+    assert second.headers['ETag'] != etag
+    assert fetch(app, handler, second.headers['ETag']).status_code == 304
+
+
+def test_data_etag_does_not_survive_restart(snoopr, plugin, app):
+    etag = fetch(app, snoopr.WebHandler(plugin)).headers['ETag']
+    # A new handler sees the same data_version and query as the old one did.
+    restarted = snoopr.WebHandler(plugin)
+    response = fetch(app, restarted, etag)
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
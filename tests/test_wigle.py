@@ -0,0 +1,130 @@
+import pytest
+
+
+class Response:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.body = body
+
+    def json(self):
+        return self.body
+
+
+def found(lat, lon):
+    return Response(200, {'results': [{'trilat': lat, 'trilong': lon}]})
+
+
+class Wigle:
+    """Stands in for requests.get: answers from `replies` by SSID (200 with no
+    results when missing) and records what was asked."""
+
+    def __init__(self, replies=None):
+        self.replies = replies or {}
+        self.asked = []
+
+    def __call__(self, url, params, headers, timeout):
+        self.asked.append(params['ssid'])
+        reply = self.replies.get(params['ssid'], Response(200, {'results': []}))
+        return reply.pop(0) if isinstance(reply, list) else reply
+
+
+@pytest.fixture
+def clock(snoopr, monkeypatch):
+    now = [1_800_000_000.0]
+    monkeypatch.setattr(snoopr.time, 'time', lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def wigle(snoopr, plugin, monkeypatch):
+    fake = Wigle()
+    monkeypatch.setattr(snoopr.requests, 'get', fake)
+    plugin.wigle_enabled = True
+    plugin.wigle_api_name, plugin.wigle_api_token = 'AID', 'token'
+    plugin.wigle_worker = snoopr.WigleWorker(plugin, per_hour=3)
+    return fake
+
+
+def test_hourly_budget(snoopr, plugin, wigle, clock):
+    worker = plugin.wigle_worker
+    for i in range(5):
+        worker.request('net%d' % i)
+    worker.tick()
+    assert wigle.asked == ['net0', 'net1', 'net2']
+    clock[0] += 3599
+    worker.tick()
+    assert len(wigle.asked) == 3
+    clock[0] += 1
+    worker.tick()
+    assert wigle.asked == ['net%d' % i for i in range(5)]
+    # Answers already in the table are not asked for again, and cost no budget.
+    worker.request('net0')
+    worker.request('net5')
+    worker.tick()
+    assert wigle.asked[5:] == ['net5']
+
+
+def test_rate_limit_pauses_and_requeues(snoopr, plugin, wigle, clock):
+    wigle.replies = {'busy': [Response(429), found(51.5, -0.12)]}
+    worker = plugin.wigle_worker
+    worker.request('busy')
+    worker.request('later')
+    worker.tick()
+    assert wigle.asked == ['busy']
+    assert list(worker.pending) == ['later', 'busy']
+    clock[0] += worker.BACKOFF - 1
+    worker.tick()
+    assert wigle.asked == ['busy']
+    clock[0] += 1
+    worker.tick()
+    assert wigle.asked == ['busy', 'later', 'busy']
+    assert plugin.db.get_wigle_location('busy') == (51.5, -0.12)
+
+
+@pytest.mark.parametrize('status', [401, 403])
+def test_rejected_credentials_stop_the_worker(snoopr, plugin, wigle, clock, status):
+    wigle.replies = {'first': Response(status)}
+    worker = plugin.wigle_worker
+    worker.request('first')
+    worker.request('second')
+    worker.tick()
+    assert wigle.asked == ['first']
+    assert worker.stop_event.is_set() and plugin.wigle_enabled is False
+    assert plugin.db.get_wigle_location('first') is False
+    assert plugin._wigle_geolocate('second') is None
+
+
+def test_positive_and_negative_answers_expire_separately(snoopr, plugin, wigle, clock):
+    wigle.replies = {'cafe': found('48.85', '2.35')}
+    worker = plugin.wigle_worker
+    version = plugin.db.data_version
+    assert plugin._wigle_geolocate('cafe') is None
+    assert plugin._wigle_geolocate('nowhere') is None
+    worker.tick()
+    # Cache rows are not dashboard data.
+    assert plugin.db.data_version == version
+    assert plugin._wigle_geolocate('cafe') == (48.85, 2.35)
+    assert plugin._wigle_geolocate('nowhere') is None
+    assert plugin.db.get_wigle_location('nowhere') is None
+
+    clock[0] += worker.NEGATIVE_TTL
+    assert plugin.db.get_wigle_location('cafe') == (48.85, 2.35)
+    assert plugin.db.get_wigle_location('nowhere') is False
+    clock[0] += worker.TTL - worker.NEGATIVE_TTL
+    assert plugin.db.get_wigle_location('cafe') is False
+    # An expired answer is asked for again.
+    plugin.wigle_cache.clear()
+    assert plugin._wigle_geolocate('cafe') is None
+    worker.tick()
+    assert wigle.asked.count('cafe') == 2
+
+
+def test_failed_requests_store_nothing(snoopr, plugin, wigle, clock, monkeypatch):
+    def offline(url, params, headers, timeout):
+        raise snoopr.requests.ConnectionError('offline')
+    monkeypatch.setattr(snoopr.requests, 'get', offline)
+    wigle.replies = {}
+    plugin.wigle_worker.request('cafe')
+    plugin.wigle_worker.tick()
+    assert plugin.db.get_wigle_location('cafe') is False
+    assert not plugin.wigle_worker.stop_event.is_set()
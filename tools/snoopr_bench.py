@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+"""
+snoopr_bench.py - micro-benchmarks for the SnoopR plugin's hot paths
+
+Loads snoopr.py straight from disk and times its pure functions on synthetic
+data, so changes to the analysis code can be compared on the device itself.
+snoopr.py imports pwnagotchi at module level, so run this with the same
+interpreter as the daemon (on a stock image: /usr/bin/python3 or the venv
+under /home/pi/.pwn):
+
+    python3 snoopr_bench.py trilaterate               # 200 synthetic drives
+    python3 snoopr_bench.py trilaterate --drives 1000 --samples 120
+    python3 snoopr_bench.py cluster                   # 10k and 100k close-range fixes
+    python3 snoopr_bench.py mesh                      # 10k frames/s for 180 s of send time
+    python3 snoopr_bench.py mesh --rate 2000 --seconds 600 --records 20
+    python3 snoopr_bench.py oui                       # /usr/share/wireshark/manuf, else synthetic
+    python3 snoopr_bench.py --plugin /usr/local/share/pwnagotchi/custom-plugins/snoopr.py trilaterate
+
+Nothing is written outside a temporary directory; every benchmark is seeded and
+repeatable (the mesh benchmark binds an ephemeral UDP port on 127.0.0.1 but sends
+nothing).
+"""
+
+import argparse
+import importlib.util
+import math
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import deque
+
+DEFAULT_PLUGIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                              'snoopr.py')
+
+
+def load_plugin(path):
+    spec = importlib.util.spec_from_file_location('snoopr_bench_target', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def summary(label, seconds, extra=''):
+    seconds = sorted(seconds)
+    print('  %-22s median %8.3f ms   p95 %8.3f ms   total %8.1f ms  %s' % (
+        label, statistics.median(seconds) * 1000.0,
+        seconds[int(len(seconds) * 0.95) - 1] * 1000.0, sum(seconds) * 1000.0, extra))
+
+
+# --------------------------------------------------------------------------
+# Trilateration
+# --------------------------------------------------------------------------
+
+def synthetic_drive(rnd, samples, lat0=37.7749, lon0=-122.4194):
+    """A device parked somewhere near a drive of straight legs with turns; distances
+    come from a path-loss model with log-normal shadowing, like the real RSSI ones."""
+    truth = (rnd.uniform(-400.0, 400.0), rnd.uniform(-400.0, 400.0))
+    x, y = rnd.uniform(-600.0, 600.0), rnd.uniform(-600.0, 600.0)
+    heading = rnd.uniform(0.0, 6.283)
+    rows = []
+    for i in range(samples):
+        if i % 25 == 0:
+            heading += rnd.uniform(-1.6, 1.6)
+        x += 12.0 * math.cos(heading)
+        y += 12.0 * math.sin(heading)
+        dist = ((x - truth[0]) ** 2 + (y - truth[1]) ** 2) ** 0.5
+        noisy = max(1.0, dist * 10 ** (rnd.gauss(0.0, 4.0) / 20.0))
+        rows.append((x, y, noisy, 1.0 / max(noisy, 1.0)))
+    return truth, rows, (lat0, lon0)
+
+
+def bench_trilaterate(mod, args):
+    rnd = random.Random(args.seed)
+    drives = [synthetic_drive(rnd, args.samples) for _ in range(args.drives)]
+    has_numpy = getattr(mod, 'HAS_NUMPY', False)
+    print('trilaterate: %d drives x %d samples (numpy=%s, scipy=%s)' % (
+        args.drives, args.samples, has_numpy, mod.HAS_SCIPY))
+
+    results = {'nelder_mead': ([], [], [])}
+    if has_numpy:
+        results['numpy_lm'] = ([], [], [])
+    for truth, projected, _ in drives:
+        total_w = sum(p[3] for p in projected)
+        evals = [0]
+
+        def objective(vec):
+            evals[0] += 1
+            err = 0.0
+            for x, y, dist, weight in projected:
+                err += weight * (mod.euclidean(vec[0], vec[1], x, y) - dist) ** 2
+            return err / total_w
+
+        nearest = sorted(projected, key=lambda p: p[2])[:max(3, len(projected) // 3)]
+        guess = [sum(p[0] for p in nearest) / len(nearest),
+                 sum(p[1] for p in nearest) / len(nearest)]
+
+        (best, _), secs = timed(mod.nelder_mead, objective, guess, step=25.0)
+        times, iters, errors = results['nelder_mead']
+        times.append(secs)
+        iters.append(evals[0])
+        errors.append(mod.euclidean(best[0], best[1], truth[0], truth[1]))
+
+        if has_numpy:
+            np = mod.np
+            arr = np.asarray(projected, dtype=float)
+            started = time.perf_counter()
+            linear = mod.linear_position(arr[:, :2], arr[:, 2], arr[:, 3])
+            point, _, steps = mod.lm_refine(arr[:, :2], arr[:, 2], arr[:, 3], linear)
+            secs = time.perf_counter() - started
+            times, iters, errors = results['numpy_lm']
+            times.append(secs)
+            iters.append(steps)
+            errors.append(mod.euclidean(point[0], point[1], truth[0], truth[1]))
+
+    for label, (times, iters, errors) in results.items():
+        unit = 'objective evals' if label == 'nelder_mead' else 'LM steps'
+        summary(label, times, '%s median %d, position error median %.0f m' % (
+            unit, statistics.median(iters), statistics.median(errors)))
+
+    # End to end, as update_device_status calls it (lat/lon in, lat/lon out).
+    samples = []
+    for _, projected, (lat0, lon0) in drives:
+        samples.append([mod.unproject(x, y, lat0, lon0) + (dist, weight)
+                        for x, y, dist, weight in projected])
+    flags = [('trilaterate(numpy)', True), ('trilaterate(fallback)', False)] if has_numpy \
+        else [('trilaterate(fallback)', False)]
+    for label, flag in flags:
+        saved = has_numpy
+        mod.HAS_NUMPY = flag
+        try:
+            times = [timed(mod.trilaterate, s)[1] for s in samples]
+        finally:
+            mod.HAS_NUMPY = saved
+        summary(label, times)
+
+
+# --------------------------------------------------------------------------
+# Clustering and hull diameter
+# --------------------------------------------------------------------------
+
+def linear_clusters(mod, points, radius_m):
+    """The pre-index greedy_clusters: every point against every cluster."""
+    clusters = []
+    for lat, lon in points:
+        for cluster in clusters:
+            if mod.haversine(cluster['lat'], cluster['lon'], lat, lon) <= radius_m:
+                cluster['n'] += 1
+                cluster['lat'] += (lat - cluster['lat']) / cluster['n']
+                cluster['lon'] += (lon - cluster['lon']) / cluster['n']
+                break
+        else:
+            clusters.append({'lat': lat, 'lon': lon, 'n': 1})
+    return clusters
+
+
+def pairwise_diameter(mod, points):
+    """The pre-calipers polygon_diameter: haversine over every pair of hull vertices."""
+    hull = mod.convex_hull(points) or list(points)
+    best = 0.0
+    for i in range(len(hull)):
+        for j in range(i + 1, len(hull)):
+            best = max(best, mod.haversine(hull[i][0], hull[i][1], hull[j][0], hull[j][1]))
+    return best
+
+
+def synthetic_fixes(rnd, count, lat0=37.7749, lon0=-122.4194):
+    """Close-range fixes along a commute: dense stops joined by sparse driving legs."""
+    points = []
+    lat, lon = lat0, lon0
+    while len(points) < count:
+        if rnd.random() < 0.02:
+            lat += rnd.uniform(-0.02, 0.02)
+            lon += rnd.uniform(-0.02, 0.02)
+        for _ in range(rnd.randint(1, 40)):
+            points.append((lat + rnd.gauss(0.0, 0.0003), lon + rnd.gauss(0.0, 0.0003)))
+    return points[:count]
+
+
+def bench_cluster(mod, args):
+    rnd = random.Random(args.seed)
+    for count in args.sizes:
+        points = synthetic_fixes(rnd, count)
+        print('cluster: %d fixes, radius %.0f m' % (count, args.radius))
+        clusters, secs = timed(mod.greedy_clusters, points, args.radius)
+        summary('greedy_clusters', [secs], '%d clusters' % len(clusters))
+        if count <= args.linear_max:
+            reference, secs = timed(linear_clusters, mod, points, args.radius)
+            summary('linear scan', [secs], '%d clusters, identical=%s' % (
+                len(reference), reference == clusters))
+        diameter, secs = timed(mod.polygon_diameter, points)
+        summary('polygon_diameter', [secs], '%.1f m' % diameter)
+        reference, secs = timed(pairwise_diameter, mod, points)
+        summary('pairwise hull', [secs], '%.1f m' % reference)
+
+    # Hull-bound case: a loop drive where every fix is a hull vertex.
+    ring = [(37.7749 + 0.05 * math.sin(2 * math.pi * k / args.ring),
+             -122.4194 + 0.06 * math.cos(2 * math.pi * k / args.ring))
+            for k in range(args.ring)]
+    print('diameter: %d-vertex hull' % args.ring)
+    diameter, secs = timed(mod.polygon_diameter, ring)
+    summary('polygon_diameter', [secs], '%.1f m' % diameter)
+    reference, secs = timed(pairwise_diameter, mod, ring)
+    summary('pairwise hull', [secs], '%.1f m' % reference)
+
+
+# --------------------------------------------------------------------------
+# Mesh framing and replay protection
+# --------------------------------------------------------------------------
+
+def bench_mesh(mod, args):
+    """Seal and open frames on a simulated clock at `rate` frames/s, replaying a sample
+    of already-accepted frames that are still inside the skew window. Every replay must
+    be rejected, whatever the rate."""
+    rnd = random.Random(args.seed)
+    mesh = mod.MeshNetwork('127.0.0.1', 0, [], 'bench', mod.HAS_CRYPTO, allow_plaintext=True)
+    items = [{'mac': ':'.join('%02X' % rnd.getrandbits(8) for _ in range(6)),
+              'device_type': 'wifi', 'type': 'wi-fi ap', 'name': 'net-%d' % i,
+              'vendor': 'Unknown', 'signal_strength': rnd.randint(-90, -30),
+              'latitude': 37.77 + rnd.random() / 100, 'longitude': -122.42 + rnd.random() / 100,
+              'channel': 6, 'encryption': 'WPA2', 'auth_mode': 'PSK', 'altitude': '-'}
+             for i in range(args.records)]
+    payload = mod.encode_mesh_payload(items)
+    total = int(args.rate * args.seconds)
+    step = 1.0 / args.rate
+    start = time.time()
+    print('mesh: %d frames at %d frames/s of simulated send time, %d records each '
+          '(%d byte payload, encrypted=%s)' % (total, args.rate, args.records, len(payload),
+                                               mesh.has_crypto))
+    seal_s = open_s = 0.0
+    accepted = replays = replayed_ok = peak = 0
+    kept = deque(maxlen=4096)
+    for i in range(total):
+        now = start + i * step
+        t0 = time.perf_counter()
+        frame = mesh._seal(payload, now=now)
+        t1 = time.perf_counter()
+        mesh._open(frame, now=now + 0.05)
+        open_s += time.perf_counter() - t1
+        seal_s += t1 - t0
+        accepted += 1
+        if rnd.random() < 0.3:
+            kept.append((now, frame))
+        if i % 1000 == 999:
+            # Replay frames the old 4096-entry deque had already forgotten.
+            for sent_at, old in rnd.sample(list(kept), min(len(kept), 20)):
+                if now - sent_at >= mod.MESH_MAX_SKEW - 1:
+                    continue
+                replays += 1
+                try:
+                    mesh._open(old, now=now)
+                    replayed_ok += 1
+                except ValueError:
+                    pass
+            peak = max(peak, len(mesh._nonces))
+    print('  seal   %8.1f us/frame  (%8.0f frames/s)' % (seal_s / total * 1e6, total / seal_s))
+    print('  open   %8.1f us/frame  (%8.0f frames/s)' % (open_s / total * 1e6, total / open_s))
+    print('  accepted %d, replays tried %d, replays accepted %d' % (accepted, replays,
+                                                                  replayed_ok))
+    print('  nonces held: peak %d, now %d in %d buckets (window %d s)' % (
+        peak, len(mesh._nonces), len(mesh._nonces.buckets), mod.MESH_MAX_SKEW))
+    mesh.close()
+
+
+# --------------------------------------------------------------------------
+# OUI vendor index
+# --------------------------------------------------------------------------
+
+def synthetic_manuf(rnd, path, entries):
+    """A manuf-format file shaped like Wireshark's: mostly /24, a tail of /28 and /36."""
+    vendors = ['Vendor%04d\tVendor %d Holdings Co., Ltd' % (i, i) for i in range(entries // 3)]
+    with open(path, 'w') as out:
+        out.write('# synthetic manuf\n')
+        for i in range(entries):
+            prefix = rnd.getrandbits(24) & ~0x020000  # globally administered
+            vendor = rnd.choice(vendors)
+            roll = rnd.random()
+            if roll < 0.85:
+                out.write('%02X:%02X:%02X\t%s\n' % (prefix >> 16, (prefix >> 8) & 255,
+                                                     prefix & 255, vendor))
+            else:
+                bits = 28 if roll < 0.95 else 36
+                value = (prefix << 24) | (rnd.getrandbits(bits - 24) << (48 - bits))
+                octets = ':'.join('%02X' % ((value >> (40 - 8 * k)) & 255) for k in range(6))
+                out.write('%s/%d\t%s\n' % (octets, bits, vendor))
+
+
+def legacy_oui_tables(mod, path):
+    """The pre-index tables: three dicts keyed by hex-prefix strings."""
+    index = mod.OuiIndex.parse(path)
+    tables = {}
+    for bits in index.MASKS:
+        nibbles = bits // 4
+        tables[bits] = {'%0*X' % (nibbles, p): index.vendors[s]
+                        for p, s in zip(index.prefixes[bits], index.slots[bits])}
+    return tables
+
+
+def legacy_oui_lookup(mod, tables, mac):
+    digits = mod.mac_hex(mac)
+    for bits, nibbles in ((36, 9), (28, 7), (24, 6)):
+        if len(digits) >= nibbles:
+            vendor = tables[bits].get(digits[:nibbles])
+            if vendor:
+                return vendor
+    return None
+
+
+def bench_oui(mod, args):
+    rnd = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        source = args.source
+        if not os.path.exists(source):
+            source = os.path.join(tmp, 'manuf')
+            synthetic_manuf(rnd, source, args.entries)
+        cache = os.path.join(tmp, 'oui.cache')
+        print('oui: %s (%d bytes)' % (source, os.path.getsize(source)))
+        parsed, secs = timed(mod.OuiIndex.parse, source)
+        summary('parse text', [secs], '%d entries, %d vendors' % (len(parsed),
+                                                                  len(parsed.vendors)))
+        st = os.stat(source)
+        _, secs = timed(parsed.write_cache, cache, st)
+        summary('write cache', [secs], '%d bytes' % os.path.getsize(cache))
+        loads = [timed(mod.OuiIndex.read_cache, cache, st) for _ in range(20)]
+        summary('load cache', [secs for _, secs in loads])
+        cached = loads[0][0]
+
+        # Half the lookups hit a known prefix, as on a real scan.
+        known = [(p << (48 - bits)) | rnd.getrandbits(48 - bits)
+                 for bits in parsed.MASKS for p in parsed.prefixes[bits]]
+        macs = []
+        for _ in range(args.lookups):
+            value = rnd.choice(known) if rnd.random() < 0.5 else rnd.getrandbits(48)
+            value &= ~(0x02 << 40)
+            macs.append(':'.join('%02X' % ((value >> (40 - 8 * k)) & 255) for k in range(6)))
+        tables = legacy_oui_tables(mod, source)
+        reference, secs = timed(lambda: [legacy_oui_lookup(mod, tables, m) for m in macs])
+        summary('lookup (hex dicts)', [secs], '%.2f us each' % (secs / len(macs) * 1e6))
+        result, secs = timed(lambda: [cached.lookup(m) for m in macs])
+        summary('lookup (int index)', [secs], '%.2f us each, identical=%s' % (
+            secs / len(macs) * 1e6, result == reference))
+        values = [int(m.replace(':', ''), 16) for m in macs]
+        _, secs = timed(lambda: [cached.lookup_int(v) for v in values])
+        summary('lookup_int', [secs], '%.2f us each' % (secs / len(macs) * 1e6))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--plugin', default=DEFAULT_PLUGIN, help='path to snoopr.py')
+    parser.add_argument('--seed', type=int, default=1)
+    sub = parser.add_subparsers(dest='bench', required=True)
+    tri = sub.add_parser('trilaterate', help='NumPy LM solver vs Nelder-Mead')
+    tri.add_argument('--drives', type=int, default=200)
+    tri.add_argument('--samples', type=int, default=60)
+    clu = sub.add_parser('cluster', help='grid-indexed clustering and calipers diameter')
+    clu.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    clu.add_argument('--radius', type=float, default=100.0)
+    clu.add_argument('--linear-max', type=int, default=10000,
+                     help='skip the O(n*k) reference above this many fixes')
+    clu.add_argument('--ring', type=int, default=2000, help='vertices of the hull-bound case')
+    mesh = sub.add_parser('mesh', help='mesh _seal/_open throughput and replay protection')
+    mesh.add_argument('--rate', type=int, default=10000, help='frames per simulated second')
+    mesh.add_argument('--seconds', type=float, default=180.0,
+                      help='simulated send time (longer than the skew window)')
+    mesh.add_argument('--records', type=int, default=5, help='detections per frame')
+    oui = sub.add_parser('oui', help='OUI text parse vs binary cache, and lookups')
+    oui.add_argument('--source', default='/usr/share/wireshark/manuf',
+                     help='manuf or oui.txt; a synthetic one is generated if missing')
+    oui.add_argument('--entries', type=int, default=50000, help='size of the synthetic file')
+    oui.add_argument('--lookups', type=int, default=200000)
+    args = parser.parse_args()
+
+    try:
+        mod = load_plugin(args.plugin)
+    except ImportError as exc:
+        sys.exit('cannot import %s (%s); run with the pwnagotchi interpreter' % (
+            args.plugin, exc))
+    {'trilaterate': bench_trilaterate, 'cluster': bench_cluster,
+     'mesh': bench_mesh, 'oui': bench_oui}[args.bench](mod, args)
+
+
+if __name__ == '__main__':
+    main()